@@ -1,12 +1,22 @@
 import os
 import re
 import json
+import time
+import hashlib
+import asyncio
+import uuid
 import logging
+import functools
+import threading
+import contextvars
 import httpx
 import pandas as pd
 import numpy as np
+from scipy import stats
 from typing import Optional, List, Union, Dict, Any, TypedDict
 from enum import Enum
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import HTTPException
 from pydantic import BaseModel, Field, validator
 from dotenv import load_dotenv
@@ -29,6 +39,16 @@ from langgraph.checkpoint.memory import MemorySaver
 # Google Generative AI imports
 import google.generativeai as genai
 
+from llm_cache import LLMResponseCache, schema_fingerprint
+from recipes import AnalysisRecipe, RecipeStore
+from charts import CHART_MAX_POINTS, CHART_TYPES, HISTOGRAM_BINNINGS
+from code_checks import check_generated_code, code_check_stats, describe_issues
+from dataset_store import (
+    DatasetProfile, LazyDataset, PlanValidationError, describe_plan_format, describe_tables, execute_plan,
+    profile_for_frame, validate_plan
+)
+from sandbox import SandboxPool, execute_generated_code
+
 # Load environment variables
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
@@ -42,6 +62,38 @@ logger = logging.getLogger(__name__)
 # Gemini configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Upper bound on concurrent Gemini round trips per worker
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+# Number of recent request threads kept by the graph checkpointer (0 disables checkpointing)
+AGENT_CHECKPOINT_THREADS = int(os.getenv("AGENT_CHECKPOINT_THREADS", "0"))
+
+# LLM response cache settings (LLM_CACHE_MAX_ENTRIES=0 disables the cache)
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+LLM_CACHE_SQLITE_PATH = os.getenv("LLM_CACHE_SQLITE_PATH")
+LLM_CACHE_MAX_DISK_ENTRIES = int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "10000"))
+# Analysis recipe settings (RECIPE_CACHE_MAX_ENTRIES=0 disables recipes)
+RECIPE_CACHE_MAX_ENTRIES = int(os.getenv("RECIPE_CACHE_MAX_ENTRIES", "1024"))
+RECIPE_SQLITE_PATH = os.getenv("RECIPE_SQLITE_PATH")
+RECIPE_MAX_DISK_ENTRIES = int(os.getenv("RECIPE_MAX_DISK_ENTRIES", "10000"))
+# Confidence above which the local intent classifier skips the LLM intent call
+INTENT_FAST_PATH_THRESHOLD = float(os.getenv("INTENT_FAST_PATH_THRESHOLD", "0.8"))
+# Agent graph layout: "multi_node" (intent -> chart config -> code) or "planner" (one fused LLM call)
+AGENT_GRAPH_MODE = os.getenv("AGENT_GRAPH_MODE", "multi_node")
+# Answer transformations with a declarative plan run by the built-in engine when the LLM
+# can express them as one, falling back to generated code otherwise
+TRANSFORMATION_PLANS = os.getenv("TRANSFORMATION_PLANS", "true").lower() == "true"
+# Rewrite row-by-row generated code into vectorized pandas, and how often to ask the LLM
+# again for code that cannot be rewritten (0 runs it as is)
+CODE_VECTORIZE_CHECK = os.getenv("CODE_VECTORIZE_CHECK", "true").lower() == "true"
+CODE_VECTORIZE_RETRIES = int(os.getenv("CODE_VECTORIZE_RETRIES", "1"))
+# Where generated code runs: "process" (isolated worker pool) or "inline" (in the API process)
+SANDBOX_MODE = os.getenv("SANDBOX_MODE", "process")
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "2"))
+SANDBOX_TIMEOUT_SECONDS = float(os.getenv("SANDBOX_TIMEOUT_SECONDS", "30"))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "30"))
+SANDBOX_MEMORY_LIMIT_BYTES = int(os.getenv("SANDBOX_MEMORY_LIMIT_BYTES", str(4 * 1024 * 1024 * 1024)))
+SANDBOX_MAX_TASKS_PER_WORKER = int(os.getenv("SANDBOX_MAX_TASKS_PER_WORKER", "100"))
 
 # Configure Gemini
 if GEMINI_API_KEY:
@@ -61,6 +113,7 @@ class VisualizationType(str, Enum):
     PIE = "pie"
     SCATTER = "scatter"
     AREA = "area"
+    HISTOGRAM = "histogram"
 
 class TransformationType(str, Enum):
     AGGREGATE = "aggregate"
@@ -87,6 +140,157 @@ class AggregationType(str, Enum):
     MAX = "max"
     STD = "std"
 
+# Keyword rules for the local intent classifier, weighted by how decisive they are.
+# Subtype keywords map straight onto the VisualizationType/StatisticalType/TransformationType values.
+VISUALIZATION_KEYWORDS = {
+    VisualizationType.BAR: ["bar", "bars", "bar chart", "column chart"],
+    VisualizationType.LINE: ["line", "line chart", "trend", "over time"],
+    VisualizationType.PIE: ["pie", "donut", "share of", "proportion"],
+    VisualizationType.SCATTER: ["scatter", "scatterplot", "scatter plot"],
+    VisualizationType.AREA: ["area chart", "area"],
+    VisualizationType.HISTOGRAM: ["histogram", "histograms", "binned", "frequency distribution"],
+}
+# Subtype keywords that are also everyday words ("product line", "sales area", "proportion of orders");
+# on their own they only hint at a chart, a chart verb has to settle it
+AMBIGUOUS_KEYWORDS = {"line", "area", "proportion", "share of", "trend"}
+
+STATISTICAL_KEYWORDS = {
+    StatisticalType.CORRELATION: ["correlation", "correlate", "correlated", "correlations"],
+    StatisticalType.TTEST: ["t-test", "ttest", "t test", "student's t"],
+    StatisticalType.ZTEST: ["z-test", "ztest", "z test"],
+    StatisticalType.CHI_SQUARE: ["chi-square", "chi square", "chi2", "chi-squared"],
+    StatisticalType.ANOVA: ["anova", "analysis of variance"],
+    StatisticalType.REGRESSION: ["regression", "regress", "linear model"],
+}
+
+TRANSFORMATION_KEYWORDS = {
+    TransformationType.AGGREGATE: ["aggregate", "sum up"],
+    TransformationType.FILTER: ["filter", "only rows", "exclude", "remove rows"],
+    TransformationType.JOIN: ["join", "merge"],
+    TransformationType.COMPUTE: ["add a column", "add column", "new column", "derive"],
+    TransformationType.GROUP: ["group", "group by", "grouped"],
+    TransformationType.PIVOT: ["pivot", "pivot table", "reshape"],
+}
+
+# Generic verbs that hint at an intent without settling it
+GENERIC_KEYWORDS = {
+    IntentType.VISUALIZATION: ["plot", "chart", "graph", "visualize", "visualise", "draw", "show", "display"],
+    IntentType.TRANSFORMATION: ["transform", "calculate", "compute", "total", "totals", "sort", "where", "rename", "table of"],
+    IntentType.STATISTICAL: ["test", "significance", "significant", "hypothesis", "p-value", "statistic", "statistics"],
+}
+
+class IntentClassifier:
+    """Deterministic keyword/feature based intent classifier run before the LLM.
+
+    Produces the same shape as the LLM intent response (intent, reason,
+    specific_type, confidence). Callers only trust it above a confidence
+    threshold and fall back to the LLM otherwise.
+    """
+    
+    SUBTYPE_WEIGHT = 2.0
+    AMBIGUOUS_WEIGHT = 1.0
+    GENERIC_WEIGHTS = {"plot": 1.0, "chart": 1.0, "graph": 1.0, "visualize": 1.0, "visualise": 1.0}
+    DEFAULT_GENERIC_WEIGHT = 0.5
+    # Score at which keyword evidence alone is considered conclusive
+    CONCLUSIVE_SCORE = 2.0
+    
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+        self._subtype_rules = [
+            (IntentType.VISUALIZATION, VISUALIZATION_KEYWORDS),
+            (IntentType.STATISTICAL, STATISTICAL_KEYWORDS),
+            (IntentType.TRANSFORMATION, TRANSFORMATION_KEYWORDS),
+        ]
+        self._patterns = {}
+        for keywords in [*VISUALIZATION_KEYWORDS.values(), *STATISTICAL_KEYWORDS.values(),
+                         *TRANSFORMATION_KEYWORDS.values(), *GENERIC_KEYWORDS.values()]:
+            for keyword in keywords:
+                self._patterns[keyword] = re.compile(r"(?<![\w-])" + re.escape(keyword) + r"(?![\w-])")
+    
+    def _matches(self, text: str, keyword: str) -> bool:
+        return self._patterns[keyword].search(text) is not None
+    
+    def matched_columns(self, prompt: str, columns: List[str]) -> List[str]:
+        """Columns of the schema that the prompt refers to by name."""
+        text = prompt.lower()
+        matched = []
+        for col in columns:
+            name = str(col).lower()
+            candidates = {name, name.replace("_", " ")}
+            if any(re.search(r"(?<!\w)" + re.escape(c) + r"(?!\w)", text) for c in candidates if c):
+                matched.append(col)
+        return matched
+    
+    def classify(self, prompt: str, columns: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Score the prompt against the keyword rules and return intent details.
+
+        Keywords that are column names are ignored, and ambiguous keywords are looked
+        for with column names masked out, so a column called "area" or "product_line"
+        is not read as a chart type while "area chart" still is.
+        """
+        text = prompt.lower()
+        column_names = {name for col in columns or [] for name in (str(col).lower(), str(col).lower().replace("_", " "))}
+        masked = text
+        for name in sorted(column_names, key=len, reverse=True):
+            masked = re.sub(r"(?<!\w)" + re.escape(name) + r"(?!\w)", " ", masked)
+        
+        def matches(keyword: str) -> bool:
+            if keyword in column_names:
+                return False
+            return self._matches(masked if keyword in AMBIGUOUS_KEYWORDS else text, keyword)
+        
+        scores = {intent: 0.0 for intent in IntentType}
+        subtypes: Dict[IntentType, Dict[str, float]] = {intent: {} for intent in IntentType}
+        hits: List[str] = []
+        
+        for intent, rules in self._subtype_rules:
+            for subtype, keywords in rules.items():
+                matched = [k for k in keywords if matches(k)]
+                if matched:
+                    ambiguous = all(k in AMBIGUOUS_KEYWORDS for k in matched)
+                    scores[intent] += self.AMBIGUOUS_WEIGHT if ambiguous else self.SUBTYPE_WEIGHT
+                    subtypes[intent][subtype.value] = subtypes[intent].get(subtype.value, 0.0) + len(matched)
+                    hits.extend(matched)
+        
+        for intent, keywords in GENERIC_KEYWORDS.items():
+            for keyword in keywords:
+                if matches(keyword):
+                    scores[intent] += self.GENERIC_WEIGHTS.get(keyword, self.DEFAULT_GENERIC_WEIGHT)
+                    hits.append(keyword)
+        
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best_intent, best_score), (_, second_score) = ranked[0], ranked[1]
+        matched_columns = self.matched_columns(prompt, columns or [])
+        
+        if best_score == 0:
+            confidence = 0.0
+        else:
+            dominance = best_score / (best_score + second_score)
+            evidence = min(1.0, best_score / self.CONCLUSIVE_SCORE)
+            confidence = dominance * evidence
+            # Prompts grounded in the schema are more likely to be read correctly
+            if matched_columns:
+                confidence = min(0.99, confidence + 0.05)
+            elif columns:
+                confidence *= 0.9
+        
+        best_subtypes = subtypes[best_intent]
+        specific_type = max(best_subtypes, key=best_subtypes.get) if best_subtypes else None
+        
+        return {
+            "intent": best_intent.value,
+            "reason": f"Matched keywords: {', '.join(hits) or 'none'}; columns: {', '.join(map(str, matched_columns)) or 'none'}",
+            "specific_type": specific_type,
+            "confidence": round(confidence, 3),
+            "columns": matched_columns,
+            "classifier": "rules"
+        }
+    
+    def classify_confident(self, prompt: str, columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Return intent details only when the rules clear the confidence threshold."""
+        details = self.classify(prompt, columns)
+        return details if details["confidence"] >= self.threshold else None
+
 # State for LangGraph
 class AgentState(TypedDict):
     messages: List[BaseMessage]
@@ -99,6 +303,60 @@ class AgentState(TypedDict):
     generated_code: Optional[str]
     result: Optional[Any]
     error: Optional[str]
+    temperature: Optional[float]
+    schema_fingerprint: Optional[str]
+    transformation_plan: Optional[Dict[str, Any]]
+    dataset_key: Optional[str]
+    execution: Optional[Dict[str, Any]]
+
+# DataFrame (or lazy dataset) of the request currently running through the graph. Context
+# variables are copied into the tasks LangGraph spawns for each node, so concurrent requests
+# never see each other's frame and the frame never ends up in checkpointed state.
+current_dataframe: contextvars.ContextVar[Optional[Union[pd.DataFrame, LazyDataset]]] = contextvars.ContextVar(
+    "current_dataframe", default=None
+)
+# Named tables of a joined dataset, scoped to the request the same way
+current_tables: contextvars.ContextVar[Optional[Dict[str, pd.DataFrame]]] = contextvars.ContextVar(
+    "current_tables", default=None
+)
+
+class BoundedMemorySaver(MemorySaver):
+    """In-memory checkpointer that only keeps the most recent max_threads threads."""
+    
+    def __init__(self, max_threads: int):
+        super().__init__()
+        self.max_threads = max_threads
+        self._thread_order: "OrderedDict[str, None]" = OrderedDict()
+    
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        self._thread_order[thread_id] = None
+        self._thread_order.move_to_end(thread_id)
+        while len(self._thread_order) > self.max_threads:
+            evicted_thread, _ = self._thread_order.popitem(last=False)
+            self.delete_thread(evicted_thread)
+        return super().put(config, checkpoint, metadata, new_versions)
+
+# Blocking Gemini calls are offloaded here so they never stall the event loop
+llm_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY, thread_name_prefix="gemini")
+
+@functools.lru_cache(maxsize=16)
+def get_gemini_model(temperature: float, json_output: bool = False) -> genai.GenerativeModel:
+    """Return the Gemini model for a temperature, built once and reused.
+
+    The SDK shares one default client (and its HTTP/gRPC channel) across models,
+    so caching the model also keeps connections alive between calls. With
+    json_output the model is constrained to emit a JSON document.
+    """
+    return genai.GenerativeModel(
+        model_name=MODEL_NAME,
+        generation_config=genai.types.GenerationConfig(
+            temperature=temperature,
+            top_p=0.95,
+            max_output_tokens=8192,
+            response_mime_type="application/json" if json_output else None,
+        )
+    )
 
 # Custom Gemini LLM for LangChain
 class GeminiLLM(LLM):
@@ -116,8 +374,7 @@ class GeminiLLM(LLM):
         **kwargs: Any,
     ) -> str:
         """Call Gemini API synchronously."""
-        import asyncio
-        return asyncio.run(self._acall(prompt, stop, run_manager, **kwargs))
+        return self._generate(prompt, kwargs.get("temperature"), kwargs.get("json_output", False))
     
     async def _acall(
         self,
@@ -126,20 +383,23 @@ class GeminiLLM(LLM):
         run_manager: Optional[CallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> str:
-        """Call Gemini API asynchronously."""
+        """Call Gemini API asynchronously on the bounded LLM executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            llm_executor,
+            functools.partial(self._generate, prompt, kwargs.get("temperature"), kwargs.get("json_output", False))
+        )
+    
+    def _generate(self, prompt: str, temperature: Optional[float] = None, json_output: bool = False) -> str:
+        """Blocking Gemini round trip using the cached model.
+
+        A per-call temperature overrides the instance default without rebuilding anything.
+        """
         if not GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY not configured")
         
         try:
-            # Configure the model
-            model = genai.GenerativeModel(
-                model_name=MODEL_NAME,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=self.temperature,
-                    top_p=0.95,
-                    max_output_tokens=8192,
-                )
-            )
+            model = get_gemini_model(self.temperature if temperature is None else temperature, json_output)
             
             # Generate content
             response = model.generate_content(prompt)
@@ -155,62 +415,80 @@ class GeminiLLM(LLM):
             logger.error(f"Error calling Gemini API: {str(e)}")
             raise
 
+# Shared LLM response cache used by the agent nodes
+llm_response_cache = LLMResponseCache(
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    sqlite_path=LLM_CACHE_SQLITE_PATH,
+    max_disk_entries=LLM_CACHE_MAX_DISK_ENTRIES
+) if LLM_CACHE_MAX_ENTRIES > 0 else None
+
+# Validated analyses reusable against any dataset with the same schema
+analysis_recipes = RecipeStore(
+    max_entries=RECIPE_CACHE_MAX_ENTRIES,
+    sqlite_path=RECIPE_SQLITE_PATH,
+    max_disk_entries=RECIPE_MAX_DISK_ENTRIES
+) if RECIPE_CACHE_MAX_ENTRIES > 0 else None
+
+sandbox_pool: Optional[SandboxPool] = None
+sandbox_pool_lock = threading.Lock()
+
+def get_sandbox_pool() -> Optional[SandboxPool]:
+    """Return the shared sandbox pool, starting its workers on first use (None in inline mode)."""
+    global sandbox_pool
+    if SANDBOX_MODE != "process":
+        return None
+    with sandbox_pool_lock:
+        if sandbox_pool is None:
+            sandbox_pool = SandboxPool(
+                workers=SANDBOX_WORKERS,
+                timeout_seconds=SANDBOX_TIMEOUT_SECONDS,
+                cpu_seconds=SANDBOX_CPU_SECONDS,
+                memory_bytes=SANDBOX_MEMORY_LIMIT_BYTES,
+                max_tasks_per_worker=SANDBOX_MAX_TASKS_PER_WORKER
+            )
+    return sandbox_pool
+
+def sandbox_pool_stats() -> Dict[str, Any]:
+    """Execution counters of the sandbox pool, without starting it."""
+    if SANDBOX_MODE != "process":
+        return {"mode": SANDBOX_MODE}
+    if sandbox_pool is None:
+        return {"mode": SANDBOX_MODE, "started": False}
+    return {"mode": SANDBOX_MODE, "started": True, **sandbox_pool.stats()}
+
 class DataAnalysisAgents:
     """Main class containing all data analysis agents using LangChain and LangGraph."""
     
-    def __init__(self, temperature: float = 0.05):
+    def __init__(
+        self,
+        temperature: float = 0.05,
+        llm_cache: Optional[LLMResponseCache] = llm_response_cache,
+        graph_mode: str = AGENT_GRAPH_MODE,
+        recipes: Optional[RecipeStore] = analysis_recipes
+    ):
+        if graph_mode not in ("multi_node", "planner"):
+            raise ValueError(f"Unknown agent graph mode: {graph_mode}")
+        self.graph_mode = graph_mode
         self.llm = GeminiLLM(temperature=temperature)
+        self.llm_cache = llm_cache
+        self.recipes = recipes
+        self.intent_classifier = IntentClassifier(threshold=INTENT_FAST_PATH_THRESHOLD)
         self.setup_tools()
         self.setup_agents()
         self.setup_graph()
     
-    def get_data_context(self, df: pd.DataFrame, num_rows: int = 5) -> str:
-        """Generate data context from the first few rows of the DataFrame."""
+    def get_data_context(
+        self,
+        df: Union[pd.DataFrame, LazyDataset],
+        num_rows: int = 5,
+        profile: Optional[DatasetProfile] = None
+    ) -> str:
+        """Generate data context from the dataset profile, profiling the DataFrame only if needed."""
         try:
-            # Get basic info about the dataset
-            data_info = {
-                "shape": df.shape,
-                "columns": df.columns.tolist(),
-                "dtypes": df.dtypes.to_dict(),
-                "sample_data": df.head(num_rows).to_dict('records'),
-                "null_counts": df.isnull().sum().to_dict(),
-                "memory_usage": df.memory_usage(deep=True).to_dict()
-            }
-            
-            # Analyze data types for better chart recommendations
-            numeric_columns = []
-            categorical_columns = []
-            datetime_columns = []
-            
-            for col, dtype in data_info['dtypes'].items():
-                if pd.api.types.is_numeric_dtype(dtype):
-                    numeric_columns.append(col)
-                elif pd.api.types.is_datetime64_any_dtype(dtype):
-                    datetime_columns.append(col)
-                else:
-                    categorical_columns.append(col)
-            
-            # Convert to readable string format
-            context = f"""
-Dataset Overview:
-- Shape: {data_info['shape'][0]} rows × {data_info['shape'][1]} columns
-- Columns: {', '.join(data_info['columns'])}
-
-Data Types:
-{chr(10).join([f'- {col}: {dtype}' for col, dtype in data_info['dtypes'].items()])}
-
-Column Analysis:
-- Numeric columns: {', '.join(numeric_columns) if numeric_columns else 'None'}
-- Categorical columns: {', '.join(categorical_columns) if categorical_columns else 'None'}
-- Datetime columns: {', '.join(datetime_columns) if datetime_columns else 'None'}
-
-Sample Data (first {num_rows} rows):
-{pd.DataFrame(data_info['sample_data']).to_string(index=False)}
-
-Missing Values:
-{chr(10).join([f'- {col}: {count} missing' for col, count in data_info['null_counts'].items() if count > 0])}
-"""
-            return context.strip()
+            if profile is None:
+                profile = profile_for_frame(df)
+            return profile.to_context(num_rows)
             
         except Exception as e:
             logger.error(f"Error generating data context: {str(e)}")
@@ -256,19 +534,21 @@ Analyze this prompt and provide your classification as JSON.""")
         self.chart_config_agent_prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a data visualization expert. Your job is to create optimal chart configurations based on user requests and data characteristics.
 
-Your output must be compatible with the process_chart_data function in services.py, which expects these specific keys:
-- chart_type: one of "bar", "line", "pie", "scatter", "area"
+Your output must be compatible with the chart engine (render_chart in charts.py), which expects these specific keys:
+- chart_type: one of "bar", "line", "pie", "scatter", "area", "histogram"
 - x_axis: column name for x-axis (must exist in available columns)
-- y_axis: column name for y-axis (must exist in available columns)
-- aggregation: one of "none", "sum", "average", "count", "min", "max", "std"
+- y_axis: column name for y-axis (must exist in available columns), or a list of column names to plot one series per column
+- aggregation: one of "none", "sum", "average", "count", "min", "max", "std", or a list with one per y_axis column
 - chart_title: descriptive title for the chart
+- For "histogram" only, optionally binning: one of "fd", "sturges", "quantile", "log", and bins: a number of bins
 
 Guidelines for chart type selection:
 - Categorical data: use "bar" or "pie" charts
 - Time series: use "line" or "area" charts
 - Relationships between numeric variables: use "scatter" charts
 - Multiple categories: use "bar" charts with aggregation
-- Distribution analysis: use "bar" charts with count aggregation
+- Distribution of a numeric column: use "histogram" with that column as x_axis and "count" aggregation; "log" binning suits skewed values like prices or incomes
+- Frequency of categories: use "bar" charts with count aggregation
 
 Guidelines for axis selection:
 - x_axis: typically categorical or time-based columns (look for categorical or datetime columns)
@@ -276,6 +556,7 @@ Guidelines for axis selection:
 - For pie charts, use the main category as x_axis and values as y_axis
 - For scatter plots, both x_axis and y_axis should be numeric columns
 - For line charts, x_axis is often time-based and y_axis is numeric
+- To compare several measures over the same x_axis, give y_axis as a list instead of producing several charts
 
 Guidelines for aggregation:
 - "none": use raw data
@@ -287,7 +568,12 @@ Guidelines for aggregation:
 
 IMPORTANT: Always ensure the column names you specify exist in the available columns list.
 
-Always respond with valid JSON containing exactly these keys: chart_type, x_axis, y_axis, aggregation, chart_title"""),
+Always respond with valid JSON containing these keys: chart_type, x_axis, y_axis, aggregation, chart_title.
+y_axis may be a list of columns, with aggregation either one value or a list with one per y_axis column.
+Optional keys:
+- binning: for "histogram" only, one of "fd", "sturges", "quantile", "log"
+- bins: for "histogram" only, a positive number of bins
+- max_points: a positive limit on plotted points, only when the user asks for less detail"""),
             ("human", """Data Context:
 {data_context}
 
@@ -305,7 +591,13 @@ For "plot revenue over time":
 {{"chart_type": "line", "x_axis": "date", "y_axis": "revenue", "aggregation": "none", "chart_title": "Revenue Over Time"}}
 
 For "create a pie chart of product distribution":
-{{"chart_type": "pie", "x_axis": "product", "y_axis": "quantity", "aggregation": "sum", "chart_title": "Product Distribution"}}""")
+{{"chart_type": "pie", "x_axis": "product", "y_axis": "quantity", "aggregation": "sum", "chart_title": "Product Distribution"}}
+
+For "compare total sales and average profit by month":
+{{"chart_type": "bar", "x_axis": "month", "y_axis": ["sales", "profit"], "aggregation": ["sum", "average"], "chart_title": "Sales and Profit by Month"}}
+
+For "show the distribution of prices":
+{{"chart_type": "histogram", "x_axis": "price", "y_axis": "price", "aggregation": "count", "binning": "log", "chart_title": "Price Distribution"}}""")
         ])
         
         # Code Generation Agent
@@ -334,9 +626,11 @@ For VISUALIZATION tasks:
 IMPORTANT RULES:
 - Always use lists for column selection: df[['col1', 'col2']]
 - you have access to data in the variable 'df'
+- When the data context lists tables, each is also available as tables['<name>'], 'df' is their joined result, and join_tables(tables) re-joins them on the listed keys
 - Store result in 'transformed_df'
 - Handle edge cases and missing data
 - No function definitions, work directly with variables
+- 'df' is copy-on-write: never call df.copy(), and assign results back (df['col'] = df['col'].fillna(0)) instead of using inplace=True or chained assignment
 
 Generate only the code, no explanations."""),
             ("human", """Data Context:
@@ -347,9 +641,97 @@ Available Columns: {columns}
 
 Generate the appropriate Python code.""")
         ])
+        
+        # Transformation Plan Agent: typed operations instead of code for common transformations
+        plan_format = describe_plan_format().replace("{", "{{").replace("}", "}}")
+        self.transformation_plan_agent_prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are an expert data analyst. Express the requested data transformation as a plan of typed operations.
+
+Plan format:
+""" + plan_format + """
+
+Rules:
+- Only use column names from the available columns, or names created by earlier steps
+- Steps run in order; after group, aggregate or select only their output columns remain
+- If the request cannot be expressed with these operations, return {{"plan": null}}
+
+Respond with a single JSON object: {{"plan": {{"steps": [...]}}}}"""),
+            ("human", """Data Context:
+{data_context}
+
+User Prompt: {prompt}
+Available Columns: {columns}
+
+Return the plan as JSON.""")
+        ])
+        
+        # Code Fix Agent: rewrites code the vectorization check could not fix itself
+        self.code_fix_agent_prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are an expert Python programmer specializing in pandas performance.
+
+Rewrite the given code so it produces the same result without processing rows one at a time.
+Keep the same variables ('df', 'tables', 'transformed_df', 'stat_result') and rules as the original code.
+
+Generate only the code, no explanations."""),
+            ("human", """Data Context:
+{data_context}
+
+User Prompt: {prompt}
+Available Columns: {columns}
+
+Code:
+{code}
+
+Problem: {hint}
+
+Generate the rewritten Python code.""")
+        ])
+        
+        # Planner Agent: intent, chart configuration and code in a single call
+        self.planner_agent_prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are an expert data analyst. In a single step, classify the user's request, configure a chart if one is wanted, and write Python code only when the answer has to be computed.
+
+Intent classification (one of "visualization", "transformation", "statistical"):
+- Visualization: plot, chart, graph, visualize, show, display, bar, line, pie, scatter
+- Transformation: group, aggregate, filter, join, merge, pivot, transform, calculate, compute
+- Statistical: correlation, test, significance, hypothesis, regression, anova, chi-square, p-value
+
+Chart configuration (only for "visualization", otherwise null), with these keys:
+- chart_type: one of "bar", "line", "pie", "scatter", "area", "histogram"
+- x_axis / y_axis: column names that exist in the available columns; y_axis may be a list to plot one series per column
+- aggregation: one of "none", "sum", "average", "count", "min", "max", "std", or a list with one per y_axis column
+- chart_title: descriptive title for the chart
+Use categorical or datetime columns for x_axis and numeric columns for y_axis; time series suit "line"/"area", relationships between numeric columns suit "scatter", and the distribution of one numeric column (as x_axis) suits "histogram", which may add binning ("fd", "sturges", "quantile" or "log") and bins. Add max_points (a positive number) only when the user asks for fewer plotted points.
+
+Transformation plan (only for "transformation", otherwise null): when the transformation can be expressed
+with these typed operations, return it as transformation_plan and set code to null:
+""" + plan_format + """
+
+Code (only for "transformation" and "statistical" without a transformation_plan, otherwise null):
+- The data is available in the variable 'df'; use pandas, numpy ('np') and scipy.stats ('stats')
+- When the data context lists tables, each is also available as tables['<name>'] and 'df' is their joined result; merge on the listed join keys
+- Store transformation results in 'transformed_df' and statistical results in 'stat_result'
+- Always use lists for column selection: df[['col1', 'col2']]
+- Prefer vectorized pandas operations, handle missing values, no function definitions
+- 'df' is copy-on-write: never call df.copy(), assign results back instead of using inplace=True
+
+Respond with a single JSON object with the keys:
+intent, reason, specific_type, confidence, chart_config, transformation_plan, code"""),
+            ("human", """Data Context:
+{data_context}
+
+User Prompt: {prompt}
+
+Available Columns: {columns}
+
+Return the plan as JSON.""")
+        ])
     
     def setup_graph(self):
-        """Setup LangGraph workflow."""
+        """Setup LangGraph workflow for the configured graph mode."""
+        if self.graph_mode == "planner":
+            self.setup_planner_graph()
+            return
         
         # Define the workflow
         workflow = StateGraph(AgentState)
@@ -358,6 +740,7 @@ Generate the appropriate Python code.""")
         workflow.add_node("analyze_intent", self.analyze_intent_node)
         workflow.add_node("generate_chart_config", self.generate_chart_config_node)
         workflow.add_node("generate_code", self.generate_code_node)
+        workflow.add_node("check_code", self.check_code_node)
         workflow.add_node("execute_code", self.execute_code_node)
         
         # Define edges
@@ -373,22 +756,90 @@ Generate the appropriate Python code.""")
             }
         )
         
-        workflow.add_edge("generate_chart_config", "generate_code")
-        workflow.add_edge("generate_code", "execute_code")
+        # Charts are aggregated from the dataset when rendered; no generated code has to run
+        workflow.add_edge("generate_chart_config", END)
+        workflow.add_edge("generate_code", "check_code")
+        workflow.add_edge("check_code", "execute_code")
+        workflow.add_edge("execute_code", END)
+        
+        self.app = workflow.compile(checkpointer=self.make_checkpointer())
+    
+    def setup_planner_graph(self):
+        """Setup the single-call LangGraph workflow: plan, then execute code only if needed."""
+        workflow = StateGraph(AgentState)
+        
+        workflow.add_node("plan", self.plan_node)
+        workflow.add_node("check_code", self.check_code_node)
+        workflow.add_node("execute_code", self.execute_code_node)
+        
+        workflow.set_entry_point("plan")
+        workflow.add_conditional_edges(
+            "plan",
+            self.route_after_plan,
+            {
+                "execute_code": "check_code",
+                "end": END
+            }
+        )
+        workflow.add_edge("check_code", "execute_code")
         workflow.add_edge("execute_code", END)
         
-        # Compile the graph
-        self.app = workflow.compile(checkpointer=MemorySaver())
+        self.app = workflow.compile(checkpointer=self.make_checkpointer())
+    
+    def make_checkpointer(self) -> Optional[BoundedMemorySaver]:
+        """Checkpoints are only kept when explicitly enabled and are bounded."""
+        return BoundedMemorySaver(AGENT_CHECKPOINT_THREADS) if AGENT_CHECKPOINT_THREADS > 0 else None
+    
+    async def call_llm(
+        self,
+        state: AgentState,
+        prompt_template: ChatPromptTemplate,
+        json_output: bool = False,
+        **fields: Any
+    ) -> str:
+        """Format a node prompt and call the LLM, going through the response cache.
+
+        The cache key is the same prompt formatted with the schema fingerprint in
+        place of the data context, so differing sample rows still hit the cache.
+        """
+        prompt = prompt_template.format(data_context=state["data_sample"], **fields)
+        temperature = state.get("temperature")
+        if temperature is None:
+            temperature = self.llm.temperature
+        if self.llm_cache is None or not state.get("schema_fingerprint"):
+            return await self.llm._acall(prompt, temperature=temperature, json_output=json_output)
+        
+        cache_key = self.llm_cache.make_key(
+            prompt_template.format(data_context=state["schema_fingerprint"], **fields),
+            MODEL_NAME,
+            temperature,
+            json_output
+        )
+        cached_response = self.llm_cache.get(cache_key)
+        if cached_response is not None:
+            logger.info(f"LLM cache hit ({self.llm_cache.stats()['hit_rate']:.0%} hit rate)")
+            return cached_response
+        
+        start = time.perf_counter()
+        response = await self.llm._acall(prompt, temperature=temperature, json_output=json_output)
+        self.llm_cache.put(cache_key, response, time.perf_counter() - start)
+        return response
     
     async def analyze_intent_node(self, state: AgentState) -> AgentState:
-        """Node to analyze user intent."""
+        """Node to analyze user intent, using the local classifier when it is confident."""
         try:
-            prompt = self.intent_agent_prompt.format(
-                data_context=state["data_sample"],
+            fast_intent = self.intent_classifier.classify_confident(state["prompt"], state["columns"])
+            if fast_intent is not None:
+                state["intent"] = fast_intent["intent"]
+                state["intent_details"] = fast_intent
+                logger.info(f"Intent classified locally: {fast_intent}")
+                return state
+            
+            response = await self.call_llm(
+                state,
+                self.intent_agent_prompt,
                 prompt=state["prompt"]
             )
-            
-            response = await self.llm._acall(prompt)
             intent_data = self.extract_json_from_response(response)
             
             state["intent"] = intent_data.get("intent")
@@ -405,18 +856,21 @@ Generate the appropriate Python code.""")
     async def generate_chart_config_node(self, state: AgentState) -> AgentState:
         """Node to generate chart configuration."""
         try:
-            prompt = self.chart_config_agent_prompt.format(
-                data_context=state["data_sample"],
+            response = await self.call_llm(
+                state,
+                self.chart_config_agent_prompt,
                 prompt=state["prompt"],
                 columns=", ".join(state["columns"])
             )
-            
-            response = await self.llm._acall(prompt)
             chart_config = self.extract_json_from_response(response)
             
             # Validate and sanitize the chart configuration
             validated_config = self.validate_chart_config(chart_config, state["columns"])
             state["chart_config"] = validated_config
+            state["result"] = {
+                "intent": state["intent"],
+                "chart_config": validated_config
+            }
             
             logger.info(f"Chart config generated: {validated_config}")
             
@@ -427,120 +881,229 @@ Generate the appropriate Python code.""")
         return state
     
     async def generate_code_node(self, state: AgentState) -> AgentState:
-        """Node to generate Python code."""
+        """Node to generate a transformation plan, or Python code when no plan fits."""
+        if state["intent"] == IntentType.TRANSFORMATION.value and TRANSFORMATION_PLANS:
+            try:
+                response = await self.call_llm(
+                    state,
+                    self.transformation_plan_agent_prompt,
+                    json_output=True,
+                    prompt=state["prompt"],
+                    columns=", ".join(state["columns"])
+                )
+                plan = self.validate_transformation_plan(
+                    self.extract_json_from_response(response).get("plan"), state["columns"]
+                )
+                if plan is not None:
+                    state["transformation_plan"] = plan
+                    logger.info(f"Transformation plan generated: {plan}")
+                    return state
+                
+            except Exception as e:
+                logger.error(f"Error generating transformation plan: {str(e)}")
+        
+        return await self.generate_free_form_code(state)
+    
+    async def generate_free_form_code(self, state: AgentState) -> AgentState:
+        """Generate Python code for the request."""
         try:
-            prompt = self.code_generation_agent_prompt.format(
-                data_context=state["data_sample"],
+            response = await self.call_llm(
+                state,
+                self.code_generation_agent_prompt,
                 intent=state["intent"],
                 prompt=state["prompt"],
                 columns=", ".join(state["columns"])
             )
             
-            response = await self.llm._acall(prompt)
+            code = self.finalize_code(response, state["intent"])
+            state["generated_code"] = code
             
-            # Extract code from response
-            code_match = re.search(r"```python\n(.*?)\n```", response, re.DOTALL)
-            code = code_match.group(1) if code_match else response
-            code = code.strip()
+            logger.info(f"Code generated for {state['intent']}: {code[:200]}...")
             
-            # Ensure proper result variable based on intent
-            if state["intent"] == "transformation":
-                if "transformed_df" not in code:
-                    code += "\n#transformed_df exists\ntransformed_df = df.copy()"
+        except Exception as e:
+            logger.error(f"Error in generate_code_node: {str(e)}")
+            state["error"] = str(e)
+        
+        return state
+    
+    def validate_transformation_plan(self, plan: Optional[Dict[str, Any]], columns: List[str]) -> Optional[Dict[str, Any]]:
+        """The plan if it is valid against the dataset columns, otherwise None (use code instead)."""
+        if not plan:
+            return None
+        try:
+            return {"steps": validate_plan(plan, columns)}
+        except PlanValidationError as e:
+            logger.warning(f"Rejected transformation plan, falling back to code: {str(e)}")
+            return None
+    
+    def finalize_code(self, response: str, intent: Optional[str]) -> str:
+        """Extract code from an LLM response and make sure it sets the result variable."""
+        code_match = re.search(r"```python\n(.*?)\n```", response, re.DOTALL)
+        code = code_match.group(1) if code_match else response
+        code = code.strip()
+        
+        # Ensure proper result variable based on intent
+        if intent == "transformation":
+            if "transformed_df" not in code:
+                code += "\n#transformed_df exists\ntransformed_df = df"
 
-            elif state["intent"] == "statistical":
-                if "stat_result" not in code:
-                    code += "\n# stat_result exists\nstat_result = df.describe()"
+        elif intent == "statistical":
+            if "stat_result" not in code:
+                code += "\n# stat_result exists\nstat_result = df.describe()"
+        
+        return code
+    
+    async def plan_node(self, state: AgentState) -> AgentState:
+        """Node producing intent, chart configuration and code with one LLM call."""
+        try:
+            response = await self.call_llm(
+                state,
+                self.planner_agent_prompt,
+                json_output=True,
+                prompt=state["prompt"],
+                columns=", ".join(state["columns"])
+            )
+            plan = self.extract_json_from_response(response)
             
-            state["generated_code"] = code
+            intent = plan.get("intent")
+            if intent not in [i.value for i in IntentType]:
+                intent = self.intent_classifier.classify(state["prompt"], state["columns"])["intent"]
+            state["intent"] = intent
+            state["intent_details"] = {
+                key: plan.get(key) for key in ("intent", "reason", "specific_type", "confidence")
+            }
+            state["intent_details"]["intent"] = intent
             
-            logger.info(f"Code generated for {state['intent']}: {code[:200]}...")
+            if intent == IntentType.VISUALIZATION.value:
+                state["chart_config"] = self.validate_chart_config(plan.get("chart_config") or {}, state["columns"])
+                # Charts are rendered from the dataset directly, no code needs to run
+                state["result"] = {
+                    "intent": intent,
+                    "chart_config": state["chart_config"]
+                }
+            elif intent == IntentType.TRANSFORMATION.value and TRANSFORMATION_PLANS and (
+                transformation_plan := self.validate_transformation_plan(plan.get("transformation_plan"), state["columns"])
+            ):
+                state["transformation_plan"] = transformation_plan
+            elif plan.get("code"):
+                state["generated_code"] = self.finalize_code(plan["code"], intent)
+            else:
+                # Neither usable plan nor code, ask for code on its own
+                state = await self.generate_free_form_code(state)
+            
+            logger.info(f"Plan generated: intent={intent}, chart_config={state.get('chart_config')}")
             
         except Exception as e:
-            logger.error(f"Error in generate_code_node: {str(e)}")
+            logger.error(f"Error in plan_node: {str(e)}")
             state["error"] = str(e)
         
         return state
     
+    async def check_code_node(self, state: AgentState) -> AgentState:
+        """Node rewriting row-by-row code into vectorized pandas before it is executed.
+
+        iterrows/itertuples/index loops and apply(..., axis=1) doing row-wise arithmetic
+        or conditional assignment are rewritten locally; code that still processes rows
+        afterwards goes back to the LLM with a hint, up to CODE_VECTORIZE_RETRIES times.
+        """
+        code = state.get("generated_code")
+        if not code or not CODE_VECTORIZE_CHECK:
+            return state
+        try:
+            code, report = check_generated_code(code, state["columns"])
+            retries = 0
+            while report["issues"] and retries < CODE_VECTORIZE_RETRIES:
+                retries += 1
+                code_check_stats.record_sent_back()
+                hint = describe_issues(report["issues"])
+                logger.info(f"Sending row-wise code back to the LLM: {hint}")
+                response = await self.call_llm(
+                    state,
+                    self.code_fix_agent_prompt,
+                    prompt=state["prompt"],
+                    columns=", ".join(state["columns"]),
+                    code=code,
+                    hint=hint
+                )
+                code, report = check_generated_code(self.finalize_code(response, state["intent"]), state["columns"])
+            if report["issues"]:
+                code_check_stats.record_unresolved()
+                logger.warning(f"Executing code that still processes rows one at a time: {report['issues']}")
+            state["generated_code"] = code
+            
+        except Exception as e:
+            # The check is an optimisation; the original code still runs
+            logger.error(f"Error in check_code_node: {str(e)}")
+        
+        return state
+    
+    def route_after_plan(self, state: AgentState) -> str:
+        """Only run the executor when the plan produced code or a transformation plan."""
+        return "execute_code" if state.get("generated_code") or state.get("transformation_plan") else "end"
+    
+    def run_transformation_plan(self, state: AgentState, df: Union[pd.DataFrame, LazyDataset]) -> bool:
+        """Execute the state's transformation plan in-process; False if it failed at runtime.
+
+        On a lazy dataset the plan's projection, filters and first aggregation run in the scan.
+        """
+        try:
+            start = time.perf_counter()
+            result = execute_plan(state["transformation_plan"], df)
+            state["result"] = result.to_dict('records')
+            state["execution"] = {
+                "engine": "plan",
+                "elapsed_seconds": round(time.perf_counter() - start, 4),
+                "rows": len(result)
+            }
+            logger.info(f"Transformation plan executed: {state['execution']}")
+            return True
+        except Exception as e:
+            logger.warning(f"Transformation plan failed, falling back to generated code: {str(e)}")
+            state["transformation_plan"] = None
+            return False
+    
     async def execute_code_node(self, state: AgentState) -> AgentState:
-        """Node to safely execute generated code."""
+        """Node to execute a transformation plan or generated code.
+
+        Plans run in-process on the built-in engine. Code runs in the sandbox pool unless
+        running inline; the sandbox bounds the run's wall-clock time, CPU time and memory,
+        and its timing and peak memory are kept in state["execution"].
+        """
         try:
-            if not state.get("generated_code"):
-                state["error"] = "No code to execute"
+            # Get the DataFrame of the current request
+            df = current_dataframe.get()
+            if df is None:
+                state["error"] = "No DataFrame available for execution"
                 return state
             
-            # Create a safe execution environment
-            import pandas as pd
-            import numpy as np
-            from scipy import stats
+            if state.get("transformation_plan"):
+                if self.run_transformation_plan(state, df):
+                    return state
+                state = await self.generate_free_form_code(state)
+                state = await self.check_code_node(state)
             
-            # Get the DataFrame from state
-            df = self.current_df
-            if df is None:
-                state["error"] = "No DataFrame available for execution"
+            if not state.get("generated_code"):
+                state["error"] = state.get("error") or "No code to execute"
                 return state
+            tables = current_tables.get() or {}
             
-            # Execute the generated code in a safe environment
-            local_vars = {
-                'pd': pd,
-                'np': np,
-                'stats': stats,
-                'df': df.copy()  # Use a copy to avoid modifying original
-            }
+            pool = get_sandbox_pool()
+            if pool is None:
+                start = time.perf_counter()
+                frame = df.collect() if isinstance(df, LazyDataset) else df
+                outcome = execute_generated_code(state["generated_code"], state["intent"], frame, tables)
+                outcome["elapsed_seconds"] = round(time.perf_counter() - start, 4)
+            else:
+                key = state.get("dataset_key") or uuid.uuid4().hex
+                data_path = await pool.apublish(key, df)
+                table_paths = {name: await pool.apublish(f"{key}_{name}", table) for name, table in tables.items()}
+                outcome = await pool.aexecute(state["generated_code"], state["intent"], data_path, table_paths)
             
-            # Execute the code
-            exec(state["generated_code"], {}, local_vars)
-            
-            # Extract the result based on intent
-            if state["intent"] == "transformation":
-                if "transformed_df" in local_vars:
-                    transformed_df = local_vars["transformed_df"]
-                    # Ensure it's a DataFrame
-                    if isinstance(transformed_df, pd.DataFrame):
-                        # Convert DataFrame to dict for serialization
-                        state["result"] = transformed_df.to_dict('records')
-                    else:
-                        # If it's not a DataFrame, try to convert it
-                        try:
-                            df_result = pd.DataFrame(transformed_df)
-                            state["result"] = df_result.to_dict('records')
-                        except:
-                            state["error"] = "Transformation result is not a valid DataFrame"
-                else:
-                    # Fallback: create a simple transformation
-                    logger.warning("Transformation code did not create 'transformed_df', using fallback")
-                    try:
-                        # Create a simple transformation as fallback
-                        fallback_code = "transformed_df = df.copy()"
-                        exec(fallback_code, {}, local_vars)
-                        fallback_df = local_vars["transformed_df"]
-                        state["result"] = fallback_df.to_dict('records')
-                    except Exception as fallback_error:
-                        state["error"] = f"Transformation failed and fallback also failed: {str(fallback_error)}"
-                        
-            elif state["intent"] == "statistical":
-                if "stat_result" in local_vars:
-                    stat_result = local_vars["stat_result"]
-                    # Handle different types of statistical results
-                    if isinstance(stat_result, pd.DataFrame):
-                        state["result"] = stat_result.to_dict('records')
-                    elif isinstance(stat_result, dict):
-                        state["result"] = stat_result
-                    else:
-                        state["result"] = str(stat_result)
-                else:
-                    # Fallback: create basic statistics
-                    logger.warning("Statistical code did not create 'stat_result', using fallback")
-                    try:
-                        fallback_code = "stat_result = df.describe()"
-                        exec(fallback_code, {}, local_vars)
-                        fallback_result = local_vars["stat_result"]
-                        if isinstance(fallback_result, pd.DataFrame):
-                            state["result"] = fallback_result.to_dict('records')
-                        else:
-                            state["result"] = str(fallback_result)
-                    except Exception as fallback_error:
-                        state["error"] = f"Statistical analysis failed and fallback also failed: {str(fallback_error)}"
+            state["execution"] = {k: v for k, v in outcome.items() if k not in ("result", "error")}
+            if outcome.get("error"):
+                state["error"] = outcome["error"]
+            elif state["intent"] in ("transformation", "statistical"):
+                state["result"] = outcome["result"]
             else:
                 # For visualization, store the chart config
                 state["result"] = {
@@ -548,7 +1111,7 @@ Generate the appropriate Python code.""")
                     "chart_config": state.get("chart_config")
                 }
             
-            logger.info(f"Code execution completed for {state['intent']}")
+            logger.info(f"Code execution completed for {state['intent']}: {state['execution']}")
             
         except Exception as e:
             logger.error(f"Error in execute_code_node: {str(e)}")
@@ -562,7 +1125,7 @@ Generate the appropriate Python code.""")
         return intent
     
     def validate_chart_config(self, chart_config: Dict[str, Any], available_columns: List[str]) -> Dict[str, Any]:
-        """Validate and sanitize chart configuration to ensure compatibility with process_chart_data."""
+        """Validate and sanitize chart configuration to ensure compatibility with the chart engine."""
         try:
             # Ensure all required keys exist
             required_keys = ['chart_type', 'x_axis', 'y_axis', 'aggregation', 'chart_title']
@@ -570,7 +1133,7 @@ Generate the appropriate Python code.""")
             
             # Set defaults and validate chart_type
             validated_config['chart_type'] = chart_config.get('chart_type', 'bar')
-            if validated_config['chart_type'] not in ['bar', 'line', 'pie', 'scatter', 'area']:
+            if validated_config['chart_type'] not in CHART_TYPES:
                 validated_config['chart_type'] = 'bar'
             
             # Validate and set x_axis
@@ -581,9 +1144,26 @@ Generate the appropriate Python code.""")
                 # Fallback to first available column
                 validated_config['x_axis'] = available_columns[0] if available_columns else 'x'
             
-            # Validate and set y_axis
+            # Validate and set y_axis; a list plots one series per column
             y_axis = chart_config.get('y_axis', '')
-            if y_axis in available_columns:
+            aggregation = chart_config.get('aggregation', 'none')
+            valid_aggregations = ['none', 'sum', 'average', 'count', 'min', 'max', 'std']
+            if isinstance(y_axis, list):
+                # Keep each aggregation next to its column when invalid columns are dropped
+                aggregations = aggregation if isinstance(aggregation, list) else [aggregation] * len(y_axis)
+                pairs = [
+                    (column, aggregations[i] if i < len(aggregations) else aggregations[0] if aggregations else 'none')
+                    for i, column in enumerate(y_axis) if column in available_columns
+                ]
+                if len(pairs) > 1:
+                    y_axis = [column for column, _ in pairs]
+                    aggregation = [value if value in valid_aggregations else 'none' for _, value in pairs]
+                else:
+                    y_axis, aggregation = pairs[0] if pairs else ('', 'none')
+            elif isinstance(aggregation, list):
+                aggregation = aggregation[0] if aggregation else 'none'
+
+            if isinstance(y_axis, list) or y_axis in available_columns:
                 validated_config['y_axis'] = y_axis
             else:
                 # Fallback to second column if available, otherwise first
@@ -592,10 +1172,11 @@ Generate the appropriate Python code.""")
                 else:
                     validated_config['y_axis'] = available_columns[0] if available_columns else 'y'
             
-            # Validate aggregation
-            aggregation = chart_config.get('aggregation', 'none')
-            valid_aggregations = ['none', 'sum', 'average', 'count', 'min', 'max', 'std']
-            validated_config['aggregation'] = aggregation if aggregation in valid_aggregations else 'none'
+            # Validate aggregation, one per y column when y_axis is a list
+            if isinstance(aggregation, list):
+                validated_config['aggregation'] = aggregation
+            else:
+                validated_config['aggregation'] = aggregation if aggregation in valid_aggregations else 'none'
             
             # Set chart title
             validated_config['chart_title'] = chart_config.get('chart_title', 'Chart')
@@ -603,9 +1184,26 @@ Generate the appropriate Python code.""")
             # Special handling for pie charts - ensure we have appropriate data
             if validated_config['chart_type'] == 'pie':
                 # For pie charts, aggregation is often needed to avoid too many slices
-                if validated_config['aggregation'] == 'none':
+                if isinstance(validated_config['aggregation'], list):
+                    validated_config['aggregation'] = [
+                        'sum' if value == 'none' else value for value in validated_config['aggregation']
+                    ]
+                elif validated_config['aggregation'] == 'none':
                     validated_config['aggregation'] = 'sum'
             
+            # Special handling for histograms - keep the binning options
+            if validated_config['chart_type'] == 'histogram':
+                if chart_config.get('binning') in HISTOGRAM_BINNINGS:
+                    validated_config['binning'] = chart_config['binning']
+                bins = chart_config.get('bins')
+                if isinstance(bins, int) and not isinstance(bins, bool) and bins > 0:
+                    validated_config['bins'] = bins
+            
+            # An explicit point budget may only lower the server-side limit
+            max_points = chart_config.get('max_points')
+            if isinstance(max_points, int) and not isinstance(max_points, bool) and 0 < max_points:
+                validated_config['max_points'] = min(max_points, CHART_MAX_POINTS)
+            
             # Special handling for scatter plots - ensure both axes are numeric
             if validated_config['chart_type'] == 'scatter':
                 # For scatter plots, aggregation should typically be 'none'
@@ -644,17 +1242,37 @@ Generate the appropriate Python code.""")
                 return json.loads(json_obj_match.group(1))
             raise ValueError(f"Could not parse JSON from response: {response_text}")
     
-    async def process_request(self, prompt: str, df: pd.DataFrame, columns: List[str]) -> Dict[str, Any]:
-        """Process a data analysis request through the agent workflow."""
-        
+    def prepare_request(
+        self,
+        prompt: str,
+        df: Union[pd.DataFrame, LazyDataset],
+        columns: List[str],
+        temperature: Optional[float] = None,
+        profile: Optional[DatasetProfile] = None,
+        tables: Optional[Dict[str, pd.DataFrame]] = None,
+        join_plan: Optional[List[Dict[str, Any]]] = None
+    ) -> AgentState:
+        """Build the initial graph state and scope the request's data for execution.
+
+        For joined datasets, df is the joined result and tables holds the named source
+        tables, which are described in the data context and exposed to generated code.
+        A lazy dataset is only read when a step needs its rows.
+        """
+        lazy = isinstance(df, LazyDataset)
         # Generate data context
-        data_sample = self.get_data_context(df)
+        profile = profile or profile_for_frame(df)
+        data_sample = self.get_data_context(df, profile=profile)
+        fingerprint = schema_fingerprint(df.empty_frame() if lazy else df)
+        if tables:
+            tables_context = describe_tables(tables, join_plan)
+            data_sample = f"{data_sample}\n\n{tables_context}"
+            fingerprint = hashlib.sha256(f"{fingerprint}\n{tables_context}".encode("utf-8")).hexdigest()
         
-        # Store DataFrame in the agent instance for use in execution
-        self.current_df = df
+        # Scope the DataFrame to this request for use in execution
+        current_dataframe.set(df)
+        current_tables.set(tables or {})
         
-        # Initial state
-        initial_state = {
+        return {
             "messages": [HumanMessage(content=prompt)],
             "prompt": prompt,
             "columns": columns,
@@ -664,22 +1282,126 @@ Generate the appropriate Python code.""")
             "chart_config": None,
             "generated_code": None,
             "result": None,
-            "error": None
+            "error": None,
+            "temperature": temperature,
+            "schema_fingerprint": fingerprint,
+            "transformation_plan": None,
+            "dataset_key": profile.content_hash,
+            "execution": None
         }
+    
+    async def run_recipe(self, recipe: AnalysisRecipe, state: AgentState) -> AgentState:
+        """Replay a stored recipe: reuse its intent, chart configuration and code, no LLM calls."""
+        state["intent"] = recipe.intent
+        state["intent_details"] = recipe.intent_details
+        state["chart_config"] = recipe.chart_config
+        state["generated_code"] = recipe.code
+        state["transformation_plan"] = recipe.transformation_plan
+        if recipe.intent == IntentType.VISUALIZATION.value:
+            state["result"] = {
+                "intent": recipe.intent,
+                "chart_config": recipe.chart_config
+            }
+        else:
+            state = await self.execute_code_node(state)
+        if self.recipes is not None:
+            self.recipes.record_run(recipe)
+        logger.info(f"Recipe {recipe.key[:12]} re-run for {recipe.intent}")
+        return state
+    
+    def save_recipe(self, key: str, state: AgentState, user_id: Optional[str] = None) -> bool:
+        """Store the outcome of a workflow run as a recipe if it completed without error."""
+        intent = state.get("intent")
+        if state.get("error") or intent not in [i.value for i in IntentType]:
+            return False
+        if intent == IntentType.VISUALIZATION.value:
+            if not state.get("chart_config"):
+                return False
+        elif not (state.get("generated_code") or state.get("transformation_plan")) or state.get("result") is None:
+            return False
+        self.recipes.put(AnalysisRecipe(
+            key=key,
+            schema_fingerprint=state["schema_fingerprint"],
+            prompt=state["prompt"],
+            intent=intent,
+            intent_details=state.get("intent_details"),
+            chart_config=state.get("chart_config"),
+            code=state.get("generated_code"),
+            transformation_plan=state.get("transformation_plan"),
+            user_id=user_id
+        ))
+        return True
+    
+    def format_output(self, state: AgentState, recipe_key: Optional[str], recipe_reused: bool) -> Dict[str, Any]:
+        return {
+            "intent": state.get("intent"),
+            "intent_details": state.get("intent_details"),
+            "chart_config": state.get("chart_config"),
+            "generated_code": state.get("generated_code"),
+            "transformation_plan": state.get("transformation_plan"),
+            "result": state.get("result"),
+            "error": state.get("error"),
+            "execution": state.get("execution"),
+            "recipe_key": recipe_key,
+            "recipe_reused": recipe_reused,
+            "data_context": state["data_sample"]
+        }
+    
+    async def process_request(
+        self,
+        prompt: str,
+        df: Union[pd.DataFrame, LazyDataset],
+        columns: List[str],
+        temperature: Optional[float] = None,
+        profile: Optional[DatasetProfile] = None,
+        tables: Optional[Dict[str, pd.DataFrame]] = None,
+        join_plan: Optional[List[Dict[str, Any]]] = None,
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Process a data analysis request through the agent workflow.
+
+        A recipe the user stored for the same schema and normalised prompt is replayed
+        instead of running the workflow; successful workflow runs are stored as recipes.
+        """
+        initial_state = self.prepare_request(prompt, df, columns, temperature, profile, tables, join_plan)
+        
+        recipe_key = None
+        if self.recipes is not None:
+            recipe_key = self.recipes.make_key(user_id, initial_state["schema_fingerprint"], prompt)
+            recipe = self.recipes.get(recipe_key, user_id=user_id)
+            if recipe is not None:
+                final_state = await self.run_recipe(recipe, initial_state)
+                return self.format_output(final_state, recipe_key, recipe_reused=True)
         
-        # Run the workflow
-        config = {"configurable": {"thread_id": "test"}}
+        # Run the workflow under a thread id of its own
+        config = {"configurable": {"thread_id": uuid.uuid4().hex}}
         final_state = await self.app.ainvoke(initial_state, config=config)
         
-        return {
-            "intent": final_state.get("intent"),
-            "intent_details": final_state.get("intent_details"),
-            "chart_config": final_state.get("chart_config"),
-            "generated_code": final_state.get("generated_code"),
-            "result": final_state.get("result"),
-            "error": final_state.get("error"),
-            "data_context": data_sample
-        }
+        if recipe_key is not None and not self.save_recipe(recipe_key, final_state, user_id=user_id):
+            recipe_key = None
+        return self.format_output(final_state, recipe_key, recipe_reused=False)
+    
+    async def process_recipe(
+        self,
+        recipe_key: str,
+        df: Union[pd.DataFrame, LazyDataset],
+        profile: Optional[DatasetProfile] = None,
+        tables: Optional[Dict[str, pd.DataFrame]] = None,
+        join_plan: Optional[List[Dict[str, Any]]] = None,
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Re-run one of the user's recipes against a dataset, which must have the recipe's schema."""
+        recipe = self.recipes.get(recipe_key, user_id=user_id, count=False) if self.recipes is not None else None
+        if recipe is None:
+            raise HTTPException(status_code=404, detail="Recipe not found")
+        
+        initial_state = self.prepare_request(
+            recipe.prompt, df, list(df.columns), profile=profile, tables=tables, join_plan=join_plan
+        )
+        if initial_state["schema_fingerprint"] != recipe.schema_fingerprint:
+            raise HTTPException(status_code=409, detail="Dataset schema does not match the recipe")
+        final_state = await self.run_recipe(recipe, initial_state)
+        return self.format_output(final_state, recipe_key, recipe_reused=True)
 
 # Main API functions using the new agent system
 class GenerationRequest(BaseModel):
@@ -703,23 +1425,57 @@ class GenerationRequest(BaseModel):
 data_agents = None
 
 def get_data_agents(temperature: float = 0.5) -> DataAnalysisAgents:
-    """Get or create the data analysis agents instance."""
+    """Get or create the data analysis agents instance.
+
+    The temperature only sets the default of the first instance; per-request
+    temperatures are passed to process_request instead.
+    """
     global data_agents
     if data_agents is None:
         data_agents = DataAnalysisAgents(temperature=temperature)
     return data_agents
 
-async def analyze_with_agents(request: GenerationRequest, df: pd.DataFrame) -> Dict[str, Any]:
-    """Main function to analyze data using the agent workflow."""
+async def analyze_with_agents(
+    request: GenerationRequest,
+    df: Union[pd.DataFrame, LazyDataset],
+    profile: Optional[DatasetProfile] = None,
+    tables: Optional[Dict[str, pd.DataFrame]] = None,
+    join_plan: Optional[List[Dict[str, Any]]] = None,
+    user_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Main function to analyze data using the agent workflow; recipes are stored per user_id."""
     try:
         agents = get_data_agents(request.temperature)
-        result = await agents.process_request(request.prompt, df, request.columns)
+        result = await agents.process_request(
+            request.prompt, df, request.columns, request.temperature, profile=profile,
+            tables=tables, join_plan=join_plan, user_id=user_id
+        )
         return result
         
     except Exception as e:
         logger.error(f"Error in agent analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error in agent analysis: {str(e)}")
 
+async def run_analysis_recipe(
+    recipe_key: str,
+    df: Union[pd.DataFrame, LazyDataset],
+    profile: Optional[DatasetProfile] = None,
+    tables: Optional[Dict[str, pd.DataFrame]] = None,
+    join_plan: Optional[List[Dict[str, Any]]] = None,
+    user_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Re-run one of the user's stored analysis recipes against a compatible dataset without LLM calls."""
+    try:
+        return await get_data_agents().process_recipe(
+            recipe_key, df, profile=profile, tables=tables, join_plan=join_plan, user_id=user_id
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error re-running recipe: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error re-running recipe: {str(e)}")
+
 # Test function
 async def test_agent_workflow():
     """Test function for the agent workflow."""
@@ -744,9 +1500,9 @@ async def test_agent_workflow():
         # Test the chart configuration integration
         if result.get("intent") == "visualization" and result.get("chart_config"):
             print("\nTesting chart configuration integration...")
-            from api.services import process_chart_data
+            from charts import render_chart
             
-            chart_result = process_chart_data(sample_data.to_dict('records'), result["chart_config"])
+            chart_result = render_chart(sample_data, result["chart_config"])
             print("Chart processing result:", json.dumps(chart_result, indent=2, default=str))
         
     except Exception as e:
@@ -780,9 +1536,9 @@ async def test_chart_config_integration():
             if result.get("chart_config"):
                 print(f"Generated chart config: {result['chart_config']}")
                 
-                # Test integration with process_chart_data
-                from api.services import process_chart_data
-                chart_result = process_chart_data(sample_data.to_dict('records'), result["chart_config"])
+                # Test integration with the chart engine
+                from charts import render_chart
+                chart_result = render_chart(sample_data, result["chart_config"])
                 print(f"Chart type: {chart_result['type']}")
                 print(f"Number of data points: {len(chart_result['data']['labels'])}")
             else:
@@ -791,12 +1547,84 @@ async def test_chart_config_integration():
         except Exception as e:
             print(f"Error: {str(e)}")
 
+def test_intent_classifier_ambiguous_words():
+    """Everyday words that double as chart types must not settle the intent without the LLM."""
+    classifier = IntentClassifier()
+    columns = ["product_line", "area", "region", "sales", "orders", "date"]
+    for prompt in (
+        "sum of sales per product line",
+        "What proportion of orders came from the North region?",
+        "total sales by area",
+        "show line items",
+    ):
+        for cols in (columns, None):
+            details = classifier.classify(prompt, cols)
+            assert classifier.classify_confident(prompt, cols) is None, f"{prompt!r} ({cols}): {details}"
+    for prompt, specific_type in (
+        ("plot a line chart of sales over time", "line"),
+        ("draw a pie chart of the share of sales by region", "pie"),
+        ("plot sales by area as an area chart", "area"),
+    ):
+        details = classifier.classify_confident(prompt, columns)
+        assert details is not None and details["specific_type"] == specific_type, f"{prompt!r}: {details}"
+        assert details["intent"] == "visualization"
+    print("Intent classifier ignores ambiguous words and column names")
+
+async def test_concurrent_requests(num_requests: int = 8, llm_latency: float = 1.0):
+    """Check that concurrent requests overlap their LLM round trips instead of queueing."""
+    sample_data = pd.DataFrame({
+        "region": ["North", "South", "East", "West"],
+        "sales": [1000, 1500, 800, 1200]
+    })
+    calls = []
+    
+    def fake_generate(self, prompt: str, temperature: Optional[float] = None, json_output: bool = False) -> str:
+        # Simulate a slow Gemini round trip without touching the network
+        calls.append(prompt)
+        time.sleep(llm_latency)
+        if "classify" in prompt:
+            return '{"intent": "visualization", "confidence": 0.9}'
+        if "chart configuration" in prompt:
+            return '{"chart_type": "bar", "x_axis": "region", "y_axis": "sales", "aggregation": "sum", "chart_title": "Sales"}'
+        return "```python\nchart_config = {}\n```"
+    
+    original_generate = GeminiLLM._generate
+    GeminiLLM._generate = fake_generate
+    try:
+        # Distinct prompts, so no request is answered from the LLM cache or a stored recipe
+        requests = [
+            GenerationRequest(prompt=f"bar chart of sales by region ({i})", columns=list(sample_data.columns))
+            for i in range(num_requests)
+        ]
+        start = time.perf_counter()
+        results = await asyncio.gather(*[analyze_with_agents(request, sample_data) for request in requests])
+        elapsed = time.perf_counter() - start
+    finally:
+        GeminiLLM._generate = original_generate
+    
+    # Node failures are recorded in the result instead of raised
+    errors = [result.get("error") for result in results if result.get("error")]
+    assert not errors, f"Requests failed: {errors}"
+    assert len(calls) >= num_requests, f"Expected at least one LLM call per request, got {len(calls)}"
+    serialized = len(calls) * llm_latency
+    per_request = serialized / num_requests
+    print(f"{num_requests} concurrent requests took {elapsed:.2f}s "
+          f"(one request's LLM latency: {per_request:.2f}s, serialized: {serialized:.2f}s)")
+    assert elapsed < max(2 * per_request, serialized / 2), "Concurrent requests were serialized"
+
 # Run the test
 if __name__ == "__main__":
-    import asyncio
+    print("Running intent classifier test...")
+    test_intent_classifier_ambiguous_words()
+    
+    print("\n" + "="*50)
     print("Running basic agent workflow test...")
     asyncio.run(test_agent_workflow())
     
     print("\n" + "="*50)
     print("Running chart configuration integration test...")
-    asyncio.run(test_chart_config_integration())
\ No newline at end of file
+    asyncio.run(test_chart_config_integration())
+    
+    print("\n" + "="*50)
+    print("Running concurrent request test...")
+    asyncio.run(test_concurrent_requests())
\ No newline at end of file
@@ -2,7 +2,7 @@ import logging
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, APIRouter, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Union
 import pandas as pd
 import numpy as np
 from scipy import stats
@@ -18,11 +18,23 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from agents import (
-    GenerationRequest, IntentType, analyze_with_agents
+    GenerationRequest, IntentType, analysis_recipes, analyze_with_agents, llm_response_cache,
+    run_analysis_recipe, sandbox_pool_stats
 )
 import uuid
 import json
+import asyncio
+import tempfile
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from auth.dependencies import get_current_user
+from charts import render_chart
+from code_checks import code_check_stats
+from dataset_store import (
+    SCHEMA_MODES, SUPPORTED_EXTENSIONS, DataFrameCache, DatasetProfile, DatasetRegistry, LazyDataset,
+    combine_parquet_files, file_to_parquet, join_parquet_files, list_excel_sheets, narrow_parquet_file,
+    profile_for_frame, spool_upload, table_names
+)
 
 # Configure logging
 logging.basicConfig(
@@ -37,124 +49,55 @@ load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 # Local filesystem base path for storing files
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Uploads are spooled here before parsing; kept on the same filesystem so parquet can be moved into place
+UPLOAD_TMP_FOLDER = os.path.join(UPLOAD_FOLDER, "tmp")
 
-router = APIRouter()
+# Streaming ingest limits
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(2 * 1024 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+CSV_BLOCK_BYTES = int(os.getenv("CSV_BLOCK_BYTES", str(2 * 1024 * 1024)))
 
+# Uploaded files are parsed concurrently here; pyarrow's CSV reader releases the GIL
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 4)))
+ingest_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
 
+# Memory budget for parsed DataFrames kept hot between prompts (default 512 MB)
+DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
 
-def process_chart_data(data: List[Dict], config: Dict) -> Dict:
-    """Process data according to chart configuration, handling large numbers."""
-    logger.info(f"Processing chart data with config: {config}")
-    df = pd.DataFrame(data)
+# How files with different columns are combined: union, intersection or strict
+SCHEMA_ALIGNMENT_MODE = os.getenv("SCHEMA_ALIGNMENT_MODE", "union")
 
-    # Validate that we have data
-    if df.empty:
-        logger.warning("Empty DataFrame provided to process_chart_data")
-        return {
-            'type': 'bar',
-            'data': {'labels': [], 'datasets': [{'label': 'No Data', 'data': []}]},
-            'options': {'plugins': {'title': {'text': 'No Data Available'}}}
-        }
+# How multi-file uploads become one dataset: "stack" rows, or "join" them as named tables
+COMBINE_MODES = ("stack", "join")
+MULTI_FILE_COMBINE = os.getenv("MULTI_FILE_COMBINE", "stack")
 
-    # Map agent config keys to expected keys
-    chart_type = config.get('chart_type', 'bar')
-    x_axis = config.get('x_axis', df.columns[0] if len(df.columns) > 0 else 'x')
-    y_axis = config.get('y_axis', df.columns[1] if len(df.columns) > 1 else df.columns[0])
-    aggregation = config.get('aggregation', 'none')
-    title = config.get('chart_title', config.get('title', 'Chart'))  # Handle both chart_title and title
-
-    # Validate that the specified columns exist
-    if x_axis not in df.columns:
-        logger.warning(f"X-axis column '{x_axis}' not found, using first column")
-        x_axis = df.columns[0] if len(df.columns) > 0 else 'x'
-    
-    if y_axis not in df.columns:
-        logger.warning(f"Y-axis column '{y_axis}' not found, using second column")
-        y_axis = df.columns[1] if len(df.columns) > 1 else df.columns[0] if len(df.columns) > 0 else 'y'
-
-    # Apply aggregation if specified
-    if aggregation != 'none':
-        try:
-            if aggregation == 'sum':
-                df = df.groupby(x_axis)[y_axis].sum().reset_index()
-            elif aggregation == 'average':
-                df = df.groupby(x_axis)[y_axis].mean().reset_index()
-            elif aggregation == 'count':
-                df = df.groupby(x_axis).size().reset_index(name=y_axis)
-            elif aggregation == 'min':
-                df = df.groupby(x_axis)[y_axis].min().reset_index()
-            elif aggregation == 'max':
-                df = df.groupby(x_axis)[y_axis].max().reset_index()
-            elif aggregation == 'std':
-                df = df.groupby(x_axis)[y_axis].std().reset_index()
-        except Exception as e:
-            logger.warning(f"Aggregation failed: {str(e)}, using original data")
-            # If aggregation fails, use the original data
-            pass
-
-    logger.debug(f"Aggregated data: {df}")
-
-    # Convert categorical values to string (Avoid converting numeric y-axis to string)
-    df[x_axis] = df[x_axis].astype(str)
-
-    # Ensure y-axis data is numeric for proper chart rendering
-    try:
-        df[y_axis] = pd.to_numeric(df[y_axis], errors='coerce')
-        # Remove rows with NaN values in y-axis
-        df = df.dropna(subset=[y_axis])
-    except Exception as e:
-        logger.warning(f"Could not convert y-axis to numeric: {str(e)}")
-
-    # Prepare data for chart
-    labels = df[x_axis].tolist()
-    data_values = df[y_axis].tolist()
-
-    chart_config = {
-        'type': chart_type,
-        'data': {
-            'labels': labels,
-            'datasets': [{
-                'label': y_axis,
-                'data': data_values,
-                'backgroundColor': [
-                    '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF',
-                    '#FF9F40', '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0'
-                ],
-                'borderColor': '#36A2EB',
-                'fill': True
-            }]
-        },
-        'options': {
-            'responsive': True,
-            'plugins': {
-                'title': {
-                    'display': True,
-                    'text': title
-                },
-                'legend': {
-                    'display': True
-                }
-            },
-            'scales': {
-                'y': {
-                    'beginAtZero': True,
-                    'title': {
-                        'display': True,
-                        'text': y_axis
-                    }
-                },
-                'x': {
-                    'title': {
-                        'display': True,
-                        'text': x_axis
-                    }
-                }
-            }
-        }
-    }
+# Narrow dtypes at ingest (downcast numerics, low-cardinality strings to category)
+INGEST_NARROW_DTYPES = os.getenv("INGEST_NARROW_DTYPES", "true").lower() == "true"
+# Also parse string columns holding ISO or full dates into datetimes while narrowing (opt-in)
+INGEST_PARSE_DATES = os.getenv("INGEST_PARSE_DATES", "false").lower() == "true"
+# Load datasets into Arrow-backed pandas dtypes with "pyarrow" (default: NumPy dtypes)
+DATASET_DTYPE_BACKEND = os.getenv("DATASET_DTYPE_BACKEND") or None
+
+# Rows of the dataset returned with a chart response; the chart itself is aggregated from every row
+CHART_DATA_PREVIEW_ROWS = int(os.getenv("CHART_DATA_PREVIEW_ROWS", "1000"))
+
+# Datasets kept per user; registering more deletes the oldest (0 keeps every dataset)
+DATASET_MAX_PER_USER = int(os.getenv("DATASET_MAX_PER_USER", "50"))
+
+# Parsed uploads are stored once per user and referenced by dataset_id afterwards
+dataset_registry = DatasetRegistry(
+    UPLOAD_FOLDER, cache=DataFrameCache(DATASET_CACHE_MAX_BYTES), dtype_backend=DATASET_DTYPE_BACKEND,
+    max_datasets=DATASET_MAX_PER_USER
+)
+
+router = APIRouter()
+
+
+
+def process_chart_data(data: List[Dict], config: Dict) -> Dict:
+    """Render a chart from a list of records; see charts.render_chart for frames and datasets."""
+    return render_chart(pd.DataFrame(data), config)
 
-    logger.info(f"Chart configuration generated: {chart_config}")
-    return chart_config
 
 def save_user_data(user_id: str, file_name: str, data: pd.DataFrame) -> str:
     """Save user data locally with user ID for future cloud migration.
@@ -167,144 +110,456 @@ def save_user_data(user_id: str, file_name: str, data: pd.DataFrame) -> str:
     Returns:
         str: Path where the data was saved
     """
-    # Create user directory if it doesn't exist
-    user_dir = os.path.join(UPLOAD_FOLDER, user_id)
-    os.makedirs(user_dir, exist_ok=True)
-    
-    # Create a unique filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_base = os.path.splitext(file_name)[0]
-    save_path = os.path.join(user_dir, f"{file_base}_{timestamp}.parquet")
-    
-    # Save as parquet for efficient storage
-    data.to_parquet(save_path, index=False)
+    dataset = dataset_registry.register(user_id, data, file_name)
+    save_path = dataset_registry.data_path(user_id, dataset["dataset_id"])
     logger.info(f"Saved user data to: {save_path}")
     return save_path
 
-@router.post("/process")
-async def process_data(
-    files: List[UploadFile] = File(...),
-    prompt: str = Form(...),
-    current_user: Dict[str, Any] = Depends(get_current_user)
+async def ingest_uploaded_files(
+    files: List[UploadFile],
+    user_id: str,
+    sheet: Optional[str] = None,
+    schema_mode: Optional[str] = None,
+    combine: Optional[str] = None,
+    fuzzy_columns: bool = False
 ) -> Dict[str, Any]:
+    """Stream uploaded files to parquet and register them as one dataset.
+
+    Each upload is spooled to a unique temp file in fixed-size chunks and parsed
+    batch by batch, so peak memory is bounded by the chunk size rather than the
+    file size. Files are parsed concurrently on the ingest thread pool, keeping
+    the event loop free, and then stacked into a single dataset after their
+    schemas are reconciled according to schema_mode (union, intersection or
+    strict); columns with merely similar names are only merged with
+    fuzzy_columns. With combine="join" the files are instead kept as named
+    tables and joined on inferred keys. For Excel uploads, sheet selects the
+    sheet to ingest ("*" for all).
+
+    Returns:
+        dict: Metadata of the registered dataset
     """
-    Process multiple files and a prompt, storing files locally.
-    Requires authentication.
-    """
+    spooled_paths = []
+    parquet_paths = []
+    loop = asyncio.get_running_loop()
+    schema_mode = schema_mode or SCHEMA_ALIGNMENT_MODE
+    if schema_mode not in SCHEMA_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid schema mode: {schema_mode}, expected one of {list(SCHEMA_MODES)}")
+    combine = combine or MULTI_FILE_COMBINE
+    if combine not in COMBINE_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid combine mode: {combine}, expected one of {list(COMBINE_MODES)}")
     try:
-        # Get user ID from authenticated user
-        user_id = current_user.get("uid", "anonymous")
-        logger.info(f"Processing data for authenticated user: {user_id}")
-        
-        if not files:
-            raise HTTPException(status_code=400, detail="No files provided")
-
-        df_list = []
-        # Process each uploaded file
+        extensions = []
         for file in files:
             extension = os.path.splitext(file.filename)[-1].lower()
             logger.info(f"Processing file: {file.filename} with extension: {extension}")
+            if extension not in SUPPORTED_EXTENSIONS:
+                raise HTTPException(status_code=400, detail=f"Unsupported file type: {extension}")
+            extensions.append(extension)
 
-            # Read file content
-            file_content = await file.read()
-            
-            # Save file locally temporarily
-            file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-            with open(file_path, 'wb') as f:
-                f.write(file_content)
-            
+            file_path = await spool_upload(file, UPLOAD_TMP_FOLDER, MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES)
+            spooled_paths.append(file_path)
+            parquet_paths.append(os.path.splitext(file_path)[0] + ".parquet")
+
+        async def parse(file: UploadFile, file_path: str, extension: str, parquet_path: str) -> None:
             try:
-                # Read file into pandas DataFrame based on extension
-                if extension == '.csv':
-                    part_df = pd.read_csv(file_path)
-                elif extension in ['.xlsx', '.xls']:
-                    part_df = pd.read_excel(file_path)
-                elif extension == '.json':
-                    part_df = pd.read_json(file_path)
-                else:
-                    raise HTTPException(status_code=400, detail=f"Unsupported file type: {extension}")
-                
-                logger.info(f"Loaded DataFrame from {file.filename} with columns: {part_df.columns.tolist()}")
-
-                # Clean column names
-                clean_columns = {}
-                for col in part_df.columns:
-                    clean_col = re.sub(r'[^\w\s]', '', str(col)).strip().lower().replace(' ', '_')
-                    clean_columns[col] = clean_col
-                
-                part_df = part_df.rename(columns=clean_columns)
-                logger.info(f"Cleaned columns for {file.filename}: {part_df.columns.tolist()}")
-                
-                df_list.append(part_df)
-                
+                part = await loop.run_in_executor(
+                    ingest_executor,
+                    functools.partial(
+                        file_to_parquet, file_path, extension, parquet_path, block_size=CSV_BLOCK_BYTES, sheet=sheet
+                    )
+                )
+                logger.info(f"Ingested {file.filename}: {part['rows']} rows, columns: {part['columns']}")
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"Error processing file {file.filename}: {str(e)}")
                 raise HTTPException(status_code=400, detail=f"Error processing file {file.filename}: {str(e)}")
-            
-            finally:
-                # Clean up the temporary file
-                if os.path.exists(file_path):
-                    os.remove(file_path)
 
-        # Combine all DataFrames
-        if not df_list:
+        await asyncio.gather(*[
+            parse(file, file_path, extension, parquet_path)
+            for file, file_path, extension, parquet_path in zip(files, spooled_paths, extensions, parquet_paths)
+        ])
+
+        if not parquet_paths:
             raise HTTPException(status_code=400, detail="No valid data found in any file")
-            
-        # Combine DataFrames with different columns
-        combined_df = pd.concat(df_list, ignore_index=True)
-        logger.info(f"Combined DataFrame shape: {combined_df.shape}, columns: {combined_df.columns.tolist()}")
 
-        if len(files) > 1:
-            prompt = f"(Combined multiple files) {prompt}"
+        file_names = [file.filename for file in files]
+        reconciliation = None
+        table_paths = None
+        join_plan = None
+        if len(parquet_paths) == 1:
+            dataset_path = parquet_paths[0]
+        elif combine == "join":
+            # Keep each file as a named table and join them on inferred keys
+            table_paths = dict(zip(table_names(file_names), parquet_paths))
+            fd, dataset_path = tempfile.mkstemp(suffix=".parquet", dir=UPLOAD_TMP_FOLDER)
+            os.close(fd)
+            parquet_paths.append(dataset_path)
+            if INGEST_NARROW_DTYPES:
+                await asyncio.gather(*[
+                    loop.run_in_executor(
+                        ingest_executor, functools.partial(narrow_parquet_file, path, parse_dates=INGEST_PARSE_DATES)
+                    )
+                    for path in table_paths.values()
+                ])
+            joined = await loop.run_in_executor(ingest_executor, join_parquet_files, table_paths, dataset_path)
+            join_plan = {"joins": joined["joins"], "unjoined": joined["unjoined"], "skipped": joined["skipped"]}
+            logger.info(f"Joined {len(files)} files: {joined['rows']} rows, columns: {joined['columns']}")
+        else:
+            # Combine files with different columns
+            fd, dataset_path = tempfile.mkstemp(suffix=".parquet", dir=UPLOAD_TMP_FOLDER)
+            os.close(fd)
+            parquet_paths.append(dataset_path)
+            combined = await loop.run_in_executor(
+                ingest_executor,
+                functools.partial(
+                    combine_parquet_files, parquet_paths[:-1], dataset_path, mode=schema_mode, fuzzy_columns=fuzzy_columns
+                )
+            )
+            reconciliation = combined["reconciliation"]
+            logger.info(f"Combined {len(files)} files: {combined['rows']} rows, columns: {combined['columns']}")
+
+        dtype_report = None
+        if INGEST_NARROW_DTYPES:
+            dtype_report = await loop.run_in_executor(
+                ingest_executor, functools.partial(narrow_parquet_file, dataset_path, parse_dates=INGEST_PARSE_DATES)
+            )
+
+        return await loop.run_in_executor(
+            ingest_executor,
+            functools.partial(
+                dataset_registry.register_parquet, user_id, dataset_path, file_names[0],
+                source_files=file_names, dtype_report=dtype_report, reconciliation=reconciliation,
+                tables=table_paths, join_plan=join_plan
+            )
+        )
 
-        # Use the new agent workflow
-        generation_request = GenerationRequest(prompt=prompt, columns=combined_df.columns.tolist())
-        agent_result = await analyze_with_agents(generation_request, combined_df)
+    finally:
+        # Clean up the temporary files
+        for path in spooled_paths + parquet_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+async def open_dataset(
+    user_id: str,
+    dataset_id: str,
+    with_tables: bool = True
+) -> Tuple[LazyDataset, DatasetProfile, Dict[str, pd.DataFrame]]:
+    """Open a registered dataset for a request: its lazy source, profile and joined tables.
+
+    Profiling and loading tables read parquet, so they run on the ingest executor
+    instead of blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    source = await loop.run_in_executor(ingest_executor, dataset_registry.lazy, user_id, dataset_id)
+    profile = await loop.run_in_executor(ingest_executor, dataset_registry.get_profile, user_id, dataset_id)
+    tables = {}
+    if with_tables:
+        tables = await loop.run_in_executor(ingest_executor, dataset_registry.load_tables, user_id, dataset_id)
+    return source, profile, tables
+
+@router.post("/datasets")
+async def upload_dataset(
+    files: List[UploadFile] = File(...),
+    sheet: Optional[str] = Form(None),
+    schema_mode: Optional[str] = Form(None),
+    combine: Optional[str] = Form(None),
+    fuzzy_columns: bool = Form(False),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """
+    Upload and parse files once, returning a dataset_id for later
+    /process and /generate-dashboard calls. For Excel files, sheet picks
+    the sheet to ingest (default: the first, "*" for all). Multiple files are
+    stacked (combine="stack", with schema_mode union, intersection or strict;
+    similarly named columns are reported, and merged only with fuzzy_columns=true)
+    or kept as named tables and joined on inferred keys (combine="join").
+    Requires authentication.
+    """
+    try:
+        user_id = current_user.get("uid", "anonymous")
+        if not files:
+            raise HTTPException(status_code=400, detail="No files provided")
 
-        logger.info(f"Agent result: {agent_result}")
+        return await ingest_uploaded_files(
+            files, user_id, sheet=sheet, schema_mode=schema_mode, combine=combine, fuzzy_columns=fuzzy_columns
+        )
 
-        # Parse the result and return appropriate response
-        intent = agent_result.get("intent")
-        if intent == IntentType.VISUALIZATION or intent == "visualization":
-            chart_config = agent_result.get("chart_config")
-            processed_chart_data = process_chart_data(combined_df.to_dict('records'), chart_config)
-            return {
-                "type": "chart",
-                "config": processed_chart_data,
-                "data": combined_df.to_dict('records')
-            }
-        elif intent == IntentType.TRANSFORMATION or intent == "transformation":
-            result = agent_result.get("result")
-            # result is expected to be a DataFrame or list of dicts
-            if isinstance(result, pd.DataFrame):
-                data = result.to_dict('records')
-            else:
-                data = result
-            return {
-                "type": "table",
-                "data": data,
-                "message": "Data transformed successfully."
-            }
-        elif intent == IntentType.STATISTICAL or intent == "statistical":
-            result = agent_result.get("result")
-            # Convert result to a JSON-serializable format
-            if isinstance(result, pd.DataFrame):
-                result_data = result.to_dict('records')
-            elif isinstance(result, dict):
-                result_data = {k: (v.tolist() if isinstance(v, np.ndarray) else v) for k, v in result.items()}
-            elif isinstance(result, (np.ndarray, list)):
-                result_data = result.tolist() if isinstance(result, np.ndarray) else result
-            else:
-                result_data = str(result)
-            return {
-                "type": "statistical_result",
-                "result": result_data,
-                "message": "Statistical analysis completed."
-            }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error uploading dataset: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error uploading dataset: {str(e)}")
+
+@router.post("/datasets/sheets")
+async def list_dataset_sheets(
+    file: UploadFile = File(...),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """
+    List the sheets of an uploaded Excel workbook so the client can choose
+    which one to ingest. Requires authentication.
+    """
+    extension = os.path.splitext(file.filename or "")[-1].lower()
+    if extension not in ('.xlsx', '.xls'):
+        raise HTTPException(status_code=400, detail=f"Not an Excel file: {file.filename}")
+
+    file_path = await spool_upload(file, UPLOAD_TMP_FOLDER, MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES)
+    try:
+        loop = asyncio.get_running_loop()
+        sheets = await loop.run_in_executor(ingest_executor, list_excel_sheets, file_path, extension)
+        return {"file": file.filename, "sheets": sheets}
+    except Exception as e:
+        logger.error(f"Error reading sheets of {file.filename}: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Error reading sheets of {file.filename}: {str(e)}")
+    finally:
+        os.remove(file_path)
+
+@router.get("/datasets")
+async def list_datasets(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    List the datasets registered by the authenticated user.
+    """
+    user_id = current_user.get("uid", "anonymous")
+    return {"datasets": dataset_registry.list(user_id), "user_id": user_id}
+
+@router.get("/datasets/cache-stats")
+async def get_dataset_cache_stats(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Hit/miss/eviction counters of the in-memory dataset cache.
+    """
+    return dataset_registry.cache.stats()
+
+@router.get("/llm/cache-stats")
+async def get_llm_cache_stats(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Hit rate and saved latency of the LLM response cache.
+    """
+    if llm_response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_response_cache.stats()}
+
+@router.get("/sandbox/stats")
+async def get_sandbox_stats(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Execution, timeout and worker recycling counters of the code sandbox, and how
+    often generated code was vectorized or sent back to the LLM before running there.
+    """
+    return {**sandbox_pool_stats(), "code_checks": code_check_stats.stats()}
+
+@router.get("/recipes/stats")
+async def get_recipe_stats(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Hit rate of the analysis recipe store.
+    """
+    if analysis_recipes is None:
+        return {"enabled": False}
+    return {"enabled": True, **analysis_recipes.stats()}
+
+@router.post("/recipes/{recipe_key}/run")
+async def run_recipe(
+    recipe_key: str,
+    dataset_id: str = Form(...),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """
+    Re-run one of the user's analysis recipes (the recipe_key of an earlier /process
+    response) against one of the user's datasets with the same schema, without calling the LLM.
+    """
+    try:
+        user_id = current_user.get("uid", "anonymous")
+        dataset = dataset_registry.get_info(user_id, dataset_id)
+        source, profile, tables = await open_dataset(user_id, dataset_id)
+
+        agent_result = await run_analysis_recipe(
+            recipe_key, source, profile=profile,
+            tables=tables, join_plan=(dataset.get("join_plan") or {}).get("joins"), user_id=user_id
+        )
+        return format_agent_response(agent_result, dataset_id, source, profile=profile)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error re-running recipe: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/recipes/{recipe_key}")
+async def delete_recipe(
+    recipe_key: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Forget one of the user's analysis recipes, so the next matching prompt goes to the LLM again.
+    """
+    user_id = current_user.get("uid", "anonymous")
+    if analysis_recipes is None or not analysis_recipes.delete(recipe_key, user_id=user_id):
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    return {"recipe_key": recipe_key, "message": "Recipe deleted successfully."}
+
+@router.post("/datasets/{dataset_id}/rows")
+async def append_dataset_rows(
+    dataset_id: str,
+    rows: List[Dict[str, Any]],
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """
+    Append rows to one of the authenticated user's datasets.
+    The dataset profile is updated from the new rows instead of being recomputed.
+    """
+    if not rows:
+        raise HTTPException(status_code=400, detail="No rows provided")
+    user_id = current_user.get("uid", "anonymous")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        ingest_executor, dataset_registry.append_rows, user_id, dataset_id, pd.DataFrame(rows)
+    )
+
+@router.delete("/datasets/{dataset_id}")
+async def delete_dataset(
+    dataset_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Delete one of the authenticated user's datasets.
+    """
+    user_id = current_user.get("uid", "anonymous")
+    dataset_registry.delete(user_id, dataset_id)
+    return {"dataset_id": dataset_id, "message": "Dataset deleted successfully."}
+
+def format_agent_response(
+    agent_result: Dict[str, Any],
+    dataset_id: str,
+    dataset: Union[pd.DataFrame, LazyDataset],
+    profile: Optional[DatasetProfile] = None
+) -> Dict[str, Any]:
+    """Turn an agent result into the /process response for its intent.
+
+    Charts come with the first CHART_DATA_PREVIEW_ROWS rows of the dataset and its row count.
+    """
+    intent = agent_result.get("intent")
+    if intent == IntentType.VISUALIZATION or intent == "visualization":
+        chart_config = agent_result.get("chart_config")
+        processed_chart_data = render_chart(dataset, chart_config, profile=profile)
+        # Row counts and downsampling details go with the response, not the Chart.js config
+        metadata = processed_chart_data.pop("metadata", None)
+        if isinstance(dataset, LazyDataset):
+            preview, rows = dataset.head(CHART_DATA_PREVIEW_ROWS).collect(), dataset.count_rows()
         else:
-            logger.error(f"Unknown or unsupported intent: {intent}")
-            raise HTTPException(status_code=400, detail="Could not determine the intent of the prompt.")
+            preview, rows = dataset.head(CHART_DATA_PREVIEW_ROWS), len(dataset)
+        return {
+            "type": "chart",
+            "dataset_id": dataset_id,
+            "recipe_key": agent_result.get("recipe_key"),
+            "recipe_reused": agent_result.get("recipe_reused"),
+            "config": processed_chart_data,
+            "data": preview.to_dict('records'),
+            "rows": rows,
+            "metadata": metadata
+        }
+    elif intent == IntentType.TRANSFORMATION or intent == "transformation":
+        result = agent_result.get("result")
+        # result is expected to be a DataFrame or list of dicts
+        if isinstance(result, pd.DataFrame):
+            data = result.to_dict('records')
+        else:
+            data = result
+        return {
+            "type": "table",
+            "dataset_id": dataset_id,
+            "recipe_key": agent_result.get("recipe_key"),
+            "data": data,
+            "execution": agent_result.get("execution"),
+            "recipe_reused": agent_result.get("recipe_reused"),
+            "message": "Data transformed successfully."
+        }
+    elif intent == IntentType.STATISTICAL or intent == "statistical":
+        result = agent_result.get("result")
+        # Convert result to a JSON-serializable format
+        if isinstance(result, pd.DataFrame):
+            result_data = result.to_dict('records')
+        elif isinstance(result, dict):
+            result_data = {k: (v.tolist() if isinstance(v, np.ndarray) else v) for k, v in result.items()}
+        elif isinstance(result, (np.ndarray, list)):
+            result_data = result.tolist() if isinstance(result, np.ndarray) else result
+        else:
+            result_data = str(result)
+        return {
+            "type": "statistical_result",
+            "dataset_id": dataset_id,
+            "recipe_key": agent_result.get("recipe_key"),
+            "result": result_data,
+            "execution": agent_result.get("execution"),
+            "recipe_reused": agent_result.get("recipe_reused"),
+            "message": "Statistical analysis completed."
+        }
+    else:
+        logger.error(f"Unknown or unsupported intent: {intent}")
+        raise HTTPException(status_code=400, detail="Could not determine the intent of the prompt.")
 
+@router.post("/process")
+async def process_data(
+    prompt: str = Form(...),
+    files: Optional[List[UploadFile]] = File(None),
+    dataset_id: Optional[str] = Form(None),
+    sheet: Optional[str] = Form(None),
+    schema_mode: Optional[str] = Form(None),
+    combine: Optional[str] = Form(None),
+    fuzzy_columns: bool = Form(False),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """
+    Process a prompt against a registered dataset or newly uploaded files.
+    Uploaded files are registered so follow-up prompts can pass the returned dataset_id.
+    Requires authentication.
+    """
+    try:
+        # Get user ID from authenticated user
+        user_id = current_user.get("uid", "anonymous")
+        logger.info(f"Processing data for authenticated user: {user_id}")
+        
+        if dataset_id:
+            dataset = dataset_registry.get_info(user_id, dataset_id)
+            source_files = dataset.get("source_files", [])
+        elif files:
+            dataset = await ingest_uploaded_files(
+                files, user_id, sheet=sheet, schema_mode=schema_mode, combine=combine, fuzzy_columns=fuzzy_columns
+            )
+            dataset_id = dataset["dataset_id"]
+            source_files = dataset["source_files"]
+        else:
+            raise HTTPException(status_code=400, detail="No files or dataset_id provided")
+        # Rows are only read when a step needs them, and then only the columns it uses
+        source, profile, tables = await open_dataset(user_id, dataset_id)
+
+        if len(source_files) > 1 and not tables:
+            prompt = f"(Combined multiple files) {prompt}"
+
+        # Use the new agent workflow
+        generation_request = GenerationRequest(prompt=prompt, columns=source.columns)
+        agent_result = await analyze_with_agents(
+            generation_request, source, profile=profile,
+            tables=tables, join_plan=(dataset.get("join_plan") or {}).get("joins"), user_id=user_id
+        )
+
+        logger.info(f"Agent result: {agent_result}")
+        response = format_agent_response(agent_result, dataset_id, source, profile=profile)
+        if dataset.get("join_plan"):
+            # Tables that could not be joined are not in df, so say which ones were left out
+            response["join_plan"] = dataset["join_plan"]
+        return response
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during processing: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -312,23 +567,42 @@ async def process_data(
         # Cleanup any temporary files if needed
         pass
 
+def numeric_column_indices(profile: DatasetProfile, columns: List[str]) -> List[int]:
+    """Indices into columns of the dataset columns the profile identified as numeric."""
+    numeric = set(profile.numeric_columns)
+    return [i for i, col in enumerate(columns) if col in numeric]
+
 @router.post("/generate-dashboard")
 async def generate_dashboard(
     prompt: str, 
-    columns: List[str], 
-    data: List[Dict[str, Any]],
+    columns: Optional[List[str]] = None, 
+    data: Optional[List[Dict[str, Any]]] = None,
+    dataset_id: Optional[str] = None,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Generate dashboard widgets based on natural language prompt. Requires authentication."""
+    """
+    Generate dashboard widgets based on natural language prompt.
+    Uses the registered dataset when dataset_id is given, otherwise the posted rows.
+    Requires authentication.
+    """
     user_id = current_user.get("uid", "anonymous")
     logger.info(f"Generating dashboard for user {user_id} with prompt: {prompt}")
     try:
-        # Convert data to DataFrame for agent processing
-        df = pd.DataFrame(data)
+        if dataset_id:
+            df, profile, _ = await open_dataset(user_id, dataset_id, with_tables=False)
+        elif data is not None:
+            # Convert data to DataFrame for agent processing
+            df = pd.DataFrame(data)
+            profile = profile_for_frame(df)
+        else:
+            raise HTTPException(status_code=400, detail="No data or dataset_id provided")
+
+        if not columns:
+            columns = [str(col) for col in df.columns]
         
         # Use the new agent workflow
         generation_request = GenerationRequest(prompt=prompt, columns=columns)
-        agent_result = await analyze_with_agents(generation_request, df)
+        agent_result = await analyze_with_agents(generation_request, df, profile=profile, user_id=user_id)
         
         logger.info(f"Agent result for dashboard: {agent_result}")
         
@@ -341,14 +615,17 @@ async def generate_dashboard(
             # Generate visualization widget(s)
             chart_config = agent_result.get("chart_config", {})
             if chart_config:
+                y_axis = chart_config.get("y_axis")
+                y_columns = [column for column in (y_axis if isinstance(y_axis, list) else [y_axis]) if column in columns]
                 widgets.append({
                     "type": "chart",
                     "id": f"chart_{len(widgets)+1}",
                     "config": {
                         "title": chart_config.get("chart_title", chart_config.get("title", "Chart")),
-                        "chartType": chart_config.get("chart_type", "bar"),
+                        # Widgets chart the raw rows, so histograms are shown as bars
+                        "chartType": "bar" if chart_config.get("chart_type") == "histogram" else chart_config.get("chart_type", "bar"),
                         "xColumn": columns.index(chart_config.get("x_axis", columns[0])) if chart_config.get("x_axis") in columns else 0,
-                        "yColumns": [columns.index(chart_config.get("y_axis", columns[1] if len(columns) > 1 else columns[0]))] if chart_config.get("y_axis") in columns else [1 if len(columns) > 1 else 0],
+                        "yColumns": [columns.index(column) for column in y_columns] or [1 if len(columns) > 1 else 0],
                         "size": 2  # Medium size as default
                     }
                 })
@@ -369,10 +646,7 @@ async def generate_dashboard(
         if intent == "statistical" or "stat" in prompt.lower() or "statistic" in prompt.lower():
             # Generate stat widget(s)
             # Attempt to find a numeric column for statistics
-            numeric_columns = []
-            for i, col in enumerate(columns):
-                if any(isinstance(row.get(col), (int, float)) for row in data if row.get(col) is not None):
-                    numeric_columns.append(i)
+            numeric_columns = numeric_column_indices(profile, columns)
             
             if numeric_columns:
                 widgets.append({
@@ -434,10 +708,7 @@ async def generate_dashboard(
             ]
             
             # Add stat widget if we have numeric columns
-            numeric_columns = []
-            for i, col in enumerate(columns):
-                if any(isinstance(row.get(col), (int, float)) for row in data if row.get(col) is not None):
-                    numeric_columns.append(i)
+            numeric_columns = numeric_column_indices(profile, columns)
             
             if numeric_columns:
                 widgets.append({
@@ -477,6 +748,8 @@ async def generate_dashboard(
             "layout": layout
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating dashboard: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating dashboard: {str(e)}")
@@ -0,0 +1,87 @@
+"""Benchmark Excel ingest: pandas.read_excel (the previous path) vs the streaming Arrow path.
+
+Each path runs in a fresh process and reports its own peak RSS (VmHWM, Linux only).
+
+Usage:
+    python benchmarks/excel_ingest.py --rows 200000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_store import file_to_parquet
+
+
+def make_workbook(path: str, rows: int) -> None:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "order_id": np.arange(rows),
+        "region": rng.choice(["North", "South", "East", "West"], rows),
+        "product": rng.choice([f"Product {i}" for i in range(50)], rows),
+        "quantity": rng.integers(1, 100, rows),
+        "price": rng.random(rows) * 100,
+        "order_date": pd.date_range("2020-01-01", periods=rows, freq="min"),
+    })
+    df.to_excel(path, index=False, engine="openpyxl")
+
+
+def pandas_path(path: str, out_path: str) -> int:
+    df = pd.read_excel(path)
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), out_path)
+    return len(df)
+
+
+def streaming_path(path: str, out_path: str) -> int:
+    return file_to_parquet(path, ".xlsx", out_path)["rows"]
+
+
+def peak_rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+
+def run(func, path: str, out_path: str, results) -> None:
+    start = time.perf_counter()
+    rows = func(path, out_path)
+    results.put((rows, time.perf_counter() - start, peak_rss_kb()))
+
+
+def measure(name: str, func, path: str, out_path: str) -> None:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run, args=(func, path, out_path, results))
+    process.start()
+    rows, elapsed, peak_kb = results.get()
+    process.join()
+    print(f"{name:<10} rows={rows:<8} time={elapsed:7.2f}s  peak_rss={peak_kb / 1024:8.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bench.xlsx")
+        print(f"Writing {args.rows} row workbook...")
+        make_workbook(path, args.rows)
+        print(f"Workbook size: {os.path.getsize(path) / 1024 ** 2:.1f} MB")
+        measure("pandas", pandas_path, path, os.path.join(tmp_dir, "pandas.parquet"))
+        measure("streaming", streaming_path, path, os.path.join(tmp_dir, "streaming.parquet"))
+
+
+if __name__ == "__main__":
+    main()
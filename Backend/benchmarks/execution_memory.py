@@ -0,0 +1,103 @@
+"""Benchmark peak memory of executing generated code: a deep df.copy() per request (the previous
+behaviour) vs copy-on-write shallow copies.
+
+Each mode runs in a fresh process. The reported number is the peak RSS of one request above
+the RSS after the dataset is loaded (VmHWM, Linux only).
+
+Usage:
+    python benchmarks/execution_memory.py --rows 2000000
+"""
+import os
+import sys
+import argparse
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sandbox import execute_generated_code
+
+# Typical generated snippets: (label, intent, code)
+SNIPPETS = [
+    ("groupby", "transformation", "transformed_df = df.groupby('region', as_index=False)['price'].sum()"),
+    ("filter", "transformation", "transformed_df = df[df['quantity'] > 95]"),
+    ("new column", "transformation", "df['revenue'] = df['price'] * df['quantity']\ntransformed_df = df.head(100)"),
+    ("fillna", "transformation", "df['discount'] = df['discount'].fillna(0)\ntransformed_df = df.head(100)"),
+    ("describe", "statistical", "stat_result = df[['price', 'quantity']].describe()"),
+]
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    discount = rng.random(rows)
+    discount[rng.random(rows) < 0.1] = np.nan
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "region": pd.Categorical(rng.choice(["North", "South", "East", "West"], rows)),
+        "quantity": rng.integers(1, 100, rows),
+        "price": rng.random(rows) * 100,
+        "discount": discount,
+        "cost": rng.random(rows) * 50,
+        "weight": rng.random(rows) * 10,
+        "score": rng.random(rows),
+    })
+
+
+def reset_peak_rss() -> None:
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+def rss_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1])
+    return 0
+
+
+def deep_copy_execute(code: str, intent: str, df: pd.DataFrame):
+    return execute_generated_code(code, intent, df.copy())
+
+
+def run(mode: str, rows: int, results) -> None:
+    df = make_frame(rows)
+    execute = deep_copy_execute if mode == "df.copy()" else execute_generated_code
+    peaks = []
+    for label, intent, code in SNIPPETS:
+        baseline = rss_kb("VmRSS")
+        reset_peak_rss()
+        outcome = execute(code, intent, df)
+        assert outcome["error"] is None, outcome["error"]
+        # Memory freed by an earlier snippet can be reused without raising RSS
+        peaks.append((label, max(rss_kb("VmHWM") - baseline, 0)))
+        # The source frame must be untouched whichever mode ran
+        assert "revenue" not in df.columns and df["discount"].isna().any()
+    results.put((df.memory_usage(deep=True).sum(), peaks))
+
+
+def measure(mode: str, rows: int) -> None:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run, args=(mode, rows, results))
+    process.start()
+    frame_bytes, peaks = results.get()
+    process.join()
+    print(f"{mode} (frame {frame_bytes / 1024 ** 2:.1f} MB)")
+    for label, peak_kb in peaks:
+        print(f"  {label:<12} peak_rss_increase={peak_kb / 1024:8.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000000)
+    args = parser.parse_args()
+
+    measure("df.copy()", args.rows)
+    measure("copy-on-write", args.rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark a chart aggregation (sum of sales by region) on a wide parquet file: loading the
+full dataset and grouping in pandas vs a lazy dataset that reads only the columns it needs.
+
+Each mode runs in a fresh process. Reported are the wall time, the columns read and the
+peak RSS (VmHWM, Linux only).
+
+Usage:
+    python benchmarks/lazy_scan.py --rows 2000000 --columns 50
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_store import LazyDataset
+
+
+def write_dataset(path: str, rows: int, columns: int) -> None:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({f"metric_{i}": rng.random(rows) for i in range(columns - 2)})
+    df["region"] = pd.Categorical(rng.choice(["North", "South", "East", "West"], rows))
+    df["sales"] = rng.random(rows) * 1000
+    df.to_parquet(path, index=False, row_group_size=256 * 1024)
+
+
+def rss_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1])
+    return 0
+
+
+def run(mode: str, path: str, results) -> None:
+    start = time.perf_counter()
+    if mode == "eager":
+        df = pd.read_parquet(path)
+        columns_read = len(df.columns)
+        result = df.groupby("region", observed=True)["sales"].sum().reset_index()
+    else:
+        dataset = LazyDataset(path).group_by(["region"], [("sales", "sales", "sum")])
+        columns_read = len(dataset._scan()[0])
+        result = dataset.collect()
+    elapsed = time.perf_counter() - start
+    results.put((elapsed, columns_read, rss_kb("VmHWM"), result.set_index("region")["sales"].to_dict()))
+
+
+def measure(mode: str, path: str):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run, args=(mode, path, results))
+    process.start()
+    elapsed, columns_read, peak_kb, totals = results.get()
+    process.join()
+    print(f"{mode:<6} time={elapsed:7.3f}s columns_read={columns_read:3d} peak_rss={peak_kb / 1024:8.1f} MB")
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--columns", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "wide.parquet")
+        write_dataset(path, args.rows, args.columns)
+        print(f"{args.rows} rows x {args.columns} columns, {os.path.getsize(path) / 1024 ** 2:.1f} MB parquet")
+        eager = measure("eager", path)
+        lazy = measure("lazy", path)
+        # Both modes must produce the same chart, up to floating point summation order
+        assert eager.keys() == lazy.keys() and all(np.isclose(eager[k], lazy[k]) for k in eager), (eager, lazy)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,649 @@
+import os
+import math
+import logging
+from typing import Optional, List, Dict, Any, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from dataset_store import DatasetProfile, LazyDataset, date_format
+
+logger = logging.getLogger(__name__)
+
+CHART_TYPES = ('bar', 'line', 'pie', 'scatter', 'area', 'histogram')
+# Chart aggregations and the pandas functions that compute them
+CHART_AGGREGATIONS = {"sum": "sum", "average": "mean", "count": "size", "min": "min", "max": "max", "std": "std"}
+CHART_COLORS = [
+    '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF',
+    '#FF9F40', '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0'
+]
+
+# Most points drawn for line, area and scatter charts; longer series are downsampled
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "2000"))
+# Line and area downsampling: "lttb" keeps the visual shape, "minmax" keeps each bucket's extremes
+CHART_LINE_DOWNSAMPLING = os.getenv("CHART_LINE_DOWNSAMPLING", "lttb")
+# Most bars and pie slices; the smallest categories beyond them are combined into "Other"
+CHART_MAX_BARS = int(os.getenv("CHART_MAX_BARS", "50"))
+CHART_MAX_PIE_SLICES = int(os.getenv("CHART_MAX_PIE_SLICES", "12"))
+
+# Histogram bin edge rules; "fd" (Freedman-Diaconis) is the default
+HISTOGRAM_BINNINGS = ('fd', 'sturges', 'quantile', 'log')
+# Most histogram bins, whatever the rule or the requested bin count
+CHART_MAX_BINS = int(os.getenv("CHART_MAX_BINS", "100"))
+# Histogram aggregations of y values per bin; any other aggregation counts the rows
+HISTOGRAM_AGGREGATIONS = ('sum', 'average')
+
+# Chart types whose datetime x-axis is sorted and resampled into time buckets
+TIME_CHART_TYPES = ('line', 'area')
+# Resample frequencies from finest to coarsest: pandas alias, name and approximate length
+RESAMPLE_FREQUENCIES = [
+    ("D", "day", pd.Timedelta(days=1)),
+    ("W-MON", "week", pd.Timedelta(weeks=1)),
+    ("MS", "month", pd.Timedelta(days=30.44))
+]
+# Values sampled from a text x column to decide whether it holds dates
+DATE_SAMPLE_SIZE = 100
+
+OTHER_LABEL = "Other"
+# How the "Other" bucket combines the values of the categories it replaces
+OTHER_COMBINE = {"none": "sum", "sum": "sum", "count": "sum", "min": "min", "max": "max"}
+
+ChartSource = Union[pd.DataFrame, pa.Table, LazyDataset]
+# (label, column, aggregation) of one plotted series
+Series = Tuple[str, str, str]
+
+
+def empty_chart() -> Dict[str, Any]:
+    return {
+        'type': 'bar',
+        'data': {'labels': [], 'datasets': [{'label': 'No Data', 'data': []}]},
+        'options': {'plugins': {'title': {'text': 'No Data Available'}}}
+    }
+
+
+def source_columns(source: ChartSource) -> List[str]:
+    return source.column_names if isinstance(source, pa.Table) else list(source.columns)
+
+
+def source_rows(source: ChartSource) -> int:
+    if isinstance(source, LazyDataset):
+        return source.count_rows()
+    return source.num_rows if isinstance(source, pa.Table) else len(source)
+
+
+def as_list(value: Any) -> List[Any]:
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def resolve_series(columns: List[str], config: Dict[str, Any]) -> Tuple[str, List[Series]]:
+    """The chart's x column and its series, one (label, column, aggregation) per y column.
+
+    y_axis is one column or a list of them, and aggregation one name or a list with one
+    per y column. Missing columns fall back to the first and second column. Series are
+    grouped in one pass, so either all of them aggregate or none do.
+    """
+    x_axis = config.get('x_axis', columns[0] if columns else 'x')
+    if x_axis not in columns:
+        logger.warning(f"X-axis column '{x_axis}' not found, using first column")
+        x_axis = columns[0] if columns else 'x'
+
+    y_columns = [column for column in as_list(config.get('y_axis')) if column in columns]
+    if not y_columns:
+        if config.get('y_axis') is not None:
+            logger.warning(f"Y-axis column '{config.get('y_axis')}' not found, using second column")
+        y_columns = [columns[1] if len(columns) > 1 else columns[0] if columns else 'y']
+
+    aggregations = as_list(config.get('aggregation', 'none'))
+    aggregations = [aggregations[i] if i < len(aggregations) else aggregations[0] for i in range(len(y_columns))]
+    grouped = next((aggregation for aggregation in aggregations if aggregation in CHART_AGGREGATIONS), None)
+    aggregations = [aggregation if aggregation in CHART_AGGREGATIONS else grouped or 'none' for aggregation in aggregations]
+
+    pairs = list(dict.fromkeys(zip(y_columns, aggregations)))
+    series = []
+    for column, aggregation in pairs:
+        # Label by column, unless the column appears twice or is the x column itself
+        repeated = sum(1 for other, _ in pairs if other == column) > 1
+        grouping_key = column == x_axis and aggregation != 'none'
+        label = f"{aggregation} of {column}" if repeated or grouping_key else column
+        series.append((label, column, aggregation))
+    return x_axis, series
+
+
+def raw_frame(df: pd.DataFrame, x_axis: str, series: List[Series]) -> pd.DataFrame:
+    """The x column next to one column of raw values per series."""
+    data = {x_axis: df[x_axis]}
+    data.update({label: df[column] for label, column, _ in series})
+    return pd.DataFrame(data)
+
+
+def aggregate_frame(df: pd.DataFrame, x_axis: str, series: List[Series]) -> pd.DataFrame:
+    """Group by the x column and compute every series in one grouped agg call.
+
+    Falls back to the raw values when the series do not aggregate or cannot be aggregated.
+    """
+    if series[0][2] not in CHART_AGGREGATIONS:
+        return raw_frame(df, x_axis, series)
+    # Named aggregation; "size" counts the rows of each group whatever column it is given
+    named = {label: (column, CHART_AGGREGATIONS[aggregation]) for label, column, aggregation in series}
+    try:
+        return df.groupby(x_axis, observed=True).agg(**named).reset_index()
+    except Exception as e:
+        logger.warning(f"Aggregation failed: {str(e)}, using original data")
+        return raw_frame(df, x_axis, series)
+
+
+def read_columns(source: ChartSource, columns: List[str]) -> pd.DataFrame:
+    if isinstance(source, LazyDataset):
+        return source.select(columns).collect()
+    if isinstance(source, pa.Table):
+        return source.select(columns).to_pandas()
+    return source[columns]
+
+
+def chart_frame(source: ChartSource, x_axis: str, series: List[Series]) -> pd.DataFrame:
+    """The frame a chart plots: the x column and one column per series label.
+
+    Only the x and y columns are read. Lazy datasets aggregate in the scan; DataFrames
+    and Arrow tables in pandas.
+    """
+    columns = list(dict.fromkeys([x_axis] + [column for _, column, _ in series]))
+
+    if isinstance(source, LazyDataset) and series[0][2] in CHART_AGGREGATIONS:
+        aggregations = [
+            (label, None if CHART_AGGREGATIONS[aggregation] == 'size' else column, CHART_AGGREGATIONS[aggregation])
+            for label, column, aggregation in series
+        ]
+        try:
+            return source.group_by([x_axis], aggregations).collect()
+        except Exception as e:
+            logger.warning(f"Chart aggregation in the scan failed: {str(e)}, aggregating in pandas")
+    return aggregate_frame(read_columns(source, columns), x_axis, series)
+
+
+def looks_like_dates(values: pd.Series) -> bool:
+    """Whether every value of a text column sample is a date in one of the ingest date formats."""
+    return date_format(values) is not None
+
+
+def is_datetime_axis(source: ChartSource, x_axis: str, profile: Optional[DatasetProfile] = None) -> bool:
+    """Whether the x column holds dates: per the dataset profile, its dtype or a parse attempt."""
+    if profile is not None and x_axis in profile.datetime_columns:
+        return True
+    if isinstance(source, LazyDataset):
+        sample = source.select([x_axis]).head(DATE_SAMPLE_SIZE).collect()[x_axis]
+    elif isinstance(source, pa.Table):
+        sample = source.select([x_axis]).slice(0, DATE_SAMPLE_SIZE).to_pandas()[x_axis]
+    else:
+        sample = source[x_axis].head(DATE_SAMPLE_SIZE)
+    if pd.api.types.is_datetime64_any_dtype(sample):
+        return True
+    if pd.api.types.is_numeric_dtype(sample) or pd.api.types.is_bool_dtype(sample):
+        return False
+    return looks_like_dates(sample)
+
+
+def resample_frequency(start: pd.Timestamp, end: pd.Timestamp, max_points: int) -> Tuple[str, str]:
+    """The finest of day, week and month whose buckets over start..end fit in max_points.
+
+    Returns:
+        tuple: The pandas frequency alias and its name
+    """
+    for alias, name, length in RESAMPLE_FREQUENCIES:
+        if (end - start) / length + 1 <= max_points:
+            return alias, name
+    alias, name, _ = RESAMPLE_FREQUENCIES[-1]
+    return alias, name
+
+
+def time_frame(
+    source: ChartSource,
+    x_axis: str,
+    series: List[Series],
+    max_points: int
+) -> Tuple[pd.DataFrame, Optional[str]]:
+    """chart_frame for a datetime x column, resampled into time buckets when it has too many points.
+
+    Series without an aggregation are summed per bucket. Empty buckets are dropped.
+
+    Returns:
+        tuple: The frame with a datetime x column, and the resample frequency name or None
+    """
+    columns = list(dict.fromkeys([x_axis] + [column for _, column, _ in series]))
+    df = read_columns(source, columns)
+    x = df[x_axis]
+    if not pd.api.types.is_datetime64_any_dtype(x):
+        # Text dates are read with the one format the sample matched, as at ingest
+        text = x.astype("string").str.strip()
+        x = pd.to_datetime(text, errors="coerce", format=date_format(text.head(DATE_SAMPLE_SIZE)))
+    elif isinstance(x.dtype, pd.ArrowDtype):
+        x = pd.to_datetime(x.astype(object), errors="coerce")
+    df = df.assign(**{x_axis: x}).dropna(subset=[x_axis])
+
+    grouped = series[0][2] in CHART_AGGREGATIONS
+    points = df[x_axis].nunique() if grouped else len(df)
+    if points <= max_points:
+        return aggregate_frame(df, x_axis, series), None
+
+    alias, name = resample_frequency(df[x_axis].min(), df[x_axis].max(), max_points)
+    named = {
+        label: (column, CHART_AGGREGATIONS.get(aggregation, "sum"))
+        for label, column, aggregation in series
+    }
+    rows = "__rows"
+    named[rows] = (series[0][1], "size")
+    # Buckets start on the first day of the period, weeks on Mondays
+    bins = pd.Grouper(key=x_axis, freq=alias, label="left", closed="left")
+    try:
+        resampled = df.groupby(bins).agg(**named)
+    except Exception as e:
+        logger.warning(f"Resampling failed: {str(e)}, using timestamps as they are")
+        return aggregate_frame(df, x_axis, series), None
+    resampled = resampled[resampled[rows] > 0].drop(columns=rows).reset_index()
+    logger.info(f"Resampled {points} points of '{x_axis}' into {len(resampled)} {name} buckets")
+    return resampled, name
+
+
+def date_labels(x: pd.Series, resample: Optional[str]) -> pd.Series:
+    """Dates as chart labels: months as YYYY-MM, dates without a time as YYYY-MM-DD."""
+    if resample == "month":
+        return x.dt.strftime("%Y-%m")
+    if resample is not None or (x == x.dt.normalize()).all():
+        return x.dt.strftime("%Y-%m-%d")
+    return x.astype(str)
+
+
+def sturges_bins(n: int) -> int:
+    return int(np.ceil(np.log2(n))) + 1 if n > 0 else 1
+
+
+def histogram_edges(values: np.ndarray, binning: str = 'fd', bins: Optional[int] = None) -> Tuple[np.ndarray, str]:
+    """Bin edges for finite values, as np.histogram takes them.
+
+    "fd" uses the Freedman-Diaconis width (2 IQR / n^(1/3)), falling back to Sturges'
+    ceil(log2 n) + 1 bins when the IQR is zero; "sturges" uses Sturges' count; both
+    give equal-width bins. "quantile" gives bins holding about the same number of
+    values and "log" bins of equal width in log scale over the positive values. An
+    explicit bin count replaces the rule's count. No rule makes more than CHART_MAX_BINS.
+
+    Returns:
+        tuple: The edges and the rule used
+    """
+    lo, hi = values.min(), values.max()
+    if lo == hi:
+        return np.array([lo - 0.5, hi + 0.5]), binning
+
+    if binning == 'log':
+        positive = values[values > 0]
+        if len(positive) > 1 and positive.min() < positive.max():
+            count = min(bins or sturges_bins(len(positive)), CHART_MAX_BINS)
+            edges = np.logspace(np.log10(positive.min()), np.log10(positive.max()), count + 1)
+            # Pin the outer edges so rounding in the logs cannot leave the extremes out
+            edges[0], edges[-1] = positive.min(), positive.max()
+            return edges, binning
+        logger.warning("Log bins need at least two distinct positive values, using Freedman-Diaconis bins")
+        binning = 'fd'
+
+    if binning == 'quantile':
+        count = min(bins or sturges_bins(len(values)), CHART_MAX_BINS)
+        # Repeated values can make quantiles coincide; their bins are merged
+        return np.unique(np.quantile(values, np.linspace(0, 1, count + 1))), binning
+
+    if bins:
+        count = bins
+    elif binning == 'sturges':
+        count = sturges_bins(len(values))
+    else:
+        q25, q75 = np.percentile(values, [25, 75])
+        width = 2 * (q75 - q25) / np.cbrt(len(values))
+        count = int(np.ceil((hi - lo) / width)) if width > 0 else sturges_bins(len(values))
+    return np.linspace(lo, hi, max(1, min(count, CHART_MAX_BINS)) + 1), binning
+
+
+def bin_labels(edges: np.ndarray) -> List[str]:
+    """Interval labels for bins; the last bin includes its upper edge, as in np.histogram."""
+    labels = [f"[{lo:.6g}, {hi:.6g})" for lo, hi in zip(edges[:-1], edges[1:])]
+    labels[-1] = labels[-1][:-1] + "]"
+    return labels
+
+
+def histogram_frame(
+    source: ChartSource,
+    x_axis: str,
+    series: List[Series],
+    binning: str = 'fd',
+    bins: Optional[int] = None
+) -> Optional[Tuple[pd.DataFrame, List[Series], str]]:
+    """Bin a numeric x column: one row per bin with its label and a value per series.
+
+    Bins count rows, or sum or average a y column per bin for series with those
+    aggregations. Values outside the bins (non-positive values for log bins) are left out.
+
+    Returns:
+        tuple: The frame, its series and the binning rule used, or None when x is not numeric
+    """
+    weighted = [item for item in series if item[2] in HISTOGRAM_AGGREGATIONS]
+    columns = list(dict.fromkeys([x_axis] + [column for _, column, _ in weighted]))
+    df = read_columns(source, columns)
+    if pd.api.types.is_bool_dtype(df[x_axis]) or not pd.api.types.is_numeric_dtype(df[x_axis]):
+        return None
+
+    x = pd.to_numeric(df[x_axis], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    finite = np.isfinite(x)
+    if not finite.any():
+        return pd.DataFrame(columns=[x_axis, "count"]), [("count", x_axis, "count")], binning
+    edges, binning = histogram_edges(x[finite], binning, bins)
+
+    data = {x_axis: bin_labels(edges)}
+    if not weighted:
+        series = [("count", x_axis, "count")]
+        data["count"] = np.histogram(x[finite], edges)[0]
+    else:
+        series = weighted
+        for label, column, aggregation in weighted:
+            y = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            valid = finite & np.isfinite(y)
+            totals = np.histogram(x[valid], edges, weights=y[valid])[0]
+            if aggregation == 'average':
+                counts = np.histogram(x[valid], edges)[0]
+                totals = np.divide(totals, counts, out=np.full(len(totals), np.nan), where=counts > 0)
+            data[label] = totals
+    return pd.DataFrame(data), series, binning
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the points Largest-Triangle-Three-Buckets keeps out of a series.
+
+    The first and last points are always kept. Between them, each of threshold - 2
+    buckets contributes the point forming the largest triangle with the point kept
+    from the previous bucket and the mean of the next one.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_indices(y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the minimum and maximum of each of threshold / 2 equal-width buckets, in order."""
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n)
+    buckets = pd.Series(y).groupby(np.arange(n) * max(threshold // 2, 1) // n)
+    return np.union1d(buckets.idxmin().to_numpy(), buckets.idxmax().to_numpy())
+
+
+def grid_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of one point per occupied cell of a grid of about threshold cells, in order."""
+    cells_per_axis = max(int(math.sqrt(threshold)), 1)
+
+    def cell(values: np.ndarray) -> np.ndarray:
+        low, high = values.min(), values.max()
+        if high == low:
+            return np.zeros(len(values), dtype=np.int64)
+        return np.minimum(((values - low) / (high - low) * cells_per_axis).astype(np.int64), cells_per_axis - 1)
+
+    _, first = np.unique(cell(x) * cells_per_axis + cell(y), return_index=True)
+    return np.sort(first)
+
+
+def top_categories(labels: pd.Series, values: pd.DataFrame, limit: int, series: List[Series]) -> Tuple[pd.Series, pd.DataFrame]:
+    """The limit - 1 largest categories by the first series, in their original order, plus "Other".
+
+    "Other" combines the remaining categories of each series. Averages and deviations
+    cannot be combined from per-category values, so when a series has one of those the
+    limit largest categories are kept and the rest dropped.
+    """
+    combines = [OTHER_COMBINE.get(aggregation) for _, _, aggregation in series]
+    combinable = all(combines)
+    ranking = values.iloc[:, 0].fillna(-np.inf).to_numpy()
+    keep = np.zeros(len(values), dtype=bool)
+    keep[np.argsort(-ranking, kind="stable")[:limit - 1 if combinable else limit]] = True
+    kept_labels, kept_values = labels[keep], values[keep]
+    if not combinable:
+        return kept_labels, kept_values
+    rest = values[~keep]
+    other = pd.DataFrame([[getattr(rest[label], combine)() for label, combine in zip(values.columns, combines)]], columns=values.columns)
+    return (
+        pd.concat([kept_labels.astype(str), pd.Series([OTHER_LABEL])], ignore_index=True),
+        pd.concat([kept_values, other], ignore_index=True)
+    )
+
+
+def axis_positions(x: pd.Series) -> np.ndarray:
+    """x values as numbers for distance computations: datetimes as nanoseconds, others by position."""
+    if pd.api.types.is_datetime64_any_dtype(x):
+        return x.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+    if pd.api.types.is_numeric_dtype(x) and not pd.api.types.is_bool_dtype(x):
+        return x.to_numpy(dtype=np.float64)
+    return np.arange(len(x), dtype=np.float64)
+
+
+def union_indices(select, positions: np.ndarray, values: pd.DataFrame, max_points: int) -> np.ndarray:
+    """Indices selected for any series, splitting the point budget between the series."""
+    # Gaps in one series must not stop points being picked for the others
+    filled = values.ffill().bfill().fillna(0)
+    budget = max(max_points // len(values.columns), 3)
+    return np.unique(np.concatenate([
+        select(positions, filled[label].to_numpy(dtype=np.float64), budget) for label in values.columns
+    ]))
+
+
+def reduce_points(
+    x: pd.Series,
+    values: pd.DataFrame,
+    chart_type: str,
+    series: List[Series],
+    max_points: int
+) -> Tuple[pd.Series, pd.DataFrame, Optional[str]]:
+    """Cut the series down to what the chart type can show.
+
+    Line and area charts over numbers or dates are sorted by x, then downsampled with
+    LTTB or min/max buckets; scatter charts keep one point per grid cell; bar and pie
+    charts keep their largest categories plus "Other"; histograms are left as they are.
+
+    Returns:
+        tuple: The reduced x and values and the reduction applied, or None
+    """
+    if chart_type == 'histogram':
+        # Bins are already capped by CHART_MAX_BINS
+        return x, values, None
+    if chart_type in ('line', 'area'):
+        positions = axis_positions(x)
+        if pd.api.types.is_datetime64_any_dtype(x) or pd.api.types.is_numeric_dtype(x):
+            order = np.argsort(positions, kind="stable")
+            x, values, positions = x.iloc[order], values.iloc[order], positions[order]
+        if len(values) <= max_points:
+            return x, values, None
+        if CHART_LINE_DOWNSAMPLING == "minmax":
+            indices = union_indices(lambda _, y, budget: minmax_indices(y, budget), positions, values, max_points)
+            method = "minmax"
+        else:
+            indices, method = union_indices(lttb_indices, positions, values, max_points), "lttb"
+        return x.iloc[indices], values.iloc[indices], method
+
+    if chart_type == 'scatter':
+        if len(values) <= max_points:
+            return x, values, None
+        positions = axis_positions(x)
+        if not (pd.api.types.is_datetime64_any_dtype(x) or pd.api.types.is_numeric_dtype(x)):
+            positions = pd.factorize(x)[0].astype(np.float64)
+        indices = union_indices(grid_indices, positions, values, max_points)
+        return x.iloc[indices], values.iloc[indices], "grid"
+
+    limit = CHART_MAX_PIE_SLICES if chart_type == 'pie' else CHART_MAX_BARS
+    if len(values) <= limit:
+        return x, values, None
+    x, values = top_categories(x, values, limit, series)
+    return x, values, "top_n"
+
+
+def chart_dataset(label: str, values: pd.Series, index: int, chart_type: str, multiple: bool) -> Dict[str, Any]:
+    """One Chart.js dataset; missing values become gaps."""
+    data = values.tolist() if values.notna().all() else values.astype(object).where(values.notna(), None).tolist()
+    color = CHART_COLORS[index % len(CHART_COLORS)]
+    if chart_type == 'histogram':
+        # Adjacent bars of one color per series
+        color = color if multiple else '#36A2EB'
+        return {
+            'label': label,
+            'data': data,
+            'backgroundColor': color,
+            'borderColor': color,
+            'barPercentage': 1.0,
+            'categoryPercentage': 1.0
+        }
+    if not multiple:
+        return {'label': label, 'data': data, 'backgroundColor': CHART_COLORS, 'borderColor': '#36A2EB', 'fill': True}
+    return {
+        'label': label,
+        'data': data,
+        # Pie slices need a color each; other series get one color per series
+        'backgroundColor': CHART_COLORS if chart_type == 'pie' else color,
+        'borderColor': color,
+        'fill': chart_type == 'area'
+    }
+
+
+def build_chart(labels: pd.Series, values: pd.DataFrame, x_axis: str, chart_type: str, title: str) -> Dict[str, Any]:
+    """Chart.js configuration plotting each value column against labels, one dataset per column.
+
+    Histograms are drawn as bar charts.
+    """
+    multiple = len(values.columns) > 1
+    return {
+        'type': 'bar' if chart_type == 'histogram' else chart_type,
+        'data': {
+            'labels': labels.astype(str).tolist(),
+            'datasets': [
+                chart_dataset(label, values[label], i, chart_type, multiple)
+                for i, label in enumerate(values.columns)
+            ]
+        },
+        'options': {
+            'responsive': True,
+            'plugins': {
+                'title': {
+                    'display': True,
+                    'text': title
+                },
+                'legend': {
+                    'display': True
+                }
+            },
+            'scales': {
+                'y': {
+                    'beginAtZero': True,
+                    'title': {
+                        'display': True,
+                        'text': ", ".join(str(label) for label in values.columns)
+                    }
+                },
+                'x': {
+                    'title': {
+                        'display': True,
+                        'text': x_axis
+                    }
+                }
+            }
+        }
+    }
+
+
+def render_chart(
+    source: ChartSource,
+    config: Dict[str, Any],
+    max_points: Optional[int] = None,
+    profile: Optional[DatasetProfile] = None
+) -> Dict[str, Any]:
+    """Render a chart configuration (as produced by the agents) into a Chart.js config.
+
+    Line and area charts over dates are sorted by date and resampled into day, week or
+    month buckets when they have more points than the budget (see time_frame); histograms
+    bin a numeric x column (see histogram_frame). Series
+    longer than the chart type can show are then reduced (see reduce_points). The
+    returned config carries a "metadata" entry with the source row count, the number
+    of points before and after reduction, the resample frequency, the histogram binning
+    rule and the reduction applied.
+
+    Args:
+        source: The data as a DataFrame, an Arrow table or a lazy dataset
+        config: chart_type, x_axis, y_axis, aggregation and chart_title, and optionally
+            max_points, and for histograms binning (one of HISTOGRAM_BINNINGS) and bins
+        max_points: Point budget for line, area and scatter charts (default CHART_MAX_POINTS)
+        profile: Profile of the dataset, used to recognise datetime columns
+    """
+    logger.info(f"Rendering chart with config: {config}")
+    columns = source_columns(source)
+    if not columns:
+        logger.warning("Chart requested for data without columns")
+        return empty_chart()
+
+    x_axis, series = resolve_series(columns, config)
+    chart_type = config.get('chart_type', 'bar')
+    budget = max_points or config.get('max_points') or CHART_MAX_POINTS
+    dates = chart_type in TIME_CHART_TYPES and is_datetime_axis(source, x_axis, profile)
+    resample, binning = None, None
+    histogram = histogram_frame(
+        source, x_axis, series, config.get('binning', 'fd'), config.get('bins')
+    ) if chart_type == 'histogram' else None
+    if histogram is not None:
+        df, series, binning = histogram
+    elif chart_type == 'histogram':
+        # Categories cannot be binned; count each one instead
+        logger.warning(f"Histogram of non-numeric column '{x_axis}', counting its values")
+        chart_type, series = 'bar', [(label, column, 'count') for label, column, _ in series[:1]]
+        df = chart_frame(source, x_axis, series)
+    elif dates:
+        df, resample = time_frame(source, x_axis, series, budget)
+    else:
+        df = chart_frame(source, x_axis, series)
+    if df.empty:
+        logger.warning("Empty data provided for chart")
+        return empty_chart()
+
+    # Values must be numeric to be drawn; rows without any value are dropped, except empty bins
+    labels = [label for label, _, _ in series]
+    values = pd.DataFrame({label: pd.to_numeric(df[label], errors='coerce') for label in labels})
+    keep = values.notna().any(axis=1)
+    x = df[x_axis]
+    if chart_type != 'histogram' and not keep.all():
+        x, values = x[keep], values[keep]
+    points = len(values)
+
+    x, values, reduction = reduce_points(x, values, chart_type, series, budget)
+    if dates:
+        x = date_labels(x, resample)
+
+    title = config.get('chart_title', config.get('title', 'Chart'))
+    chart = build_chart(x, values, x_axis, chart_type, title)
+    chart['metadata'] = {
+        'source_rows': source_rows(source),
+        'points': points,
+        'rendered_points': len(values),
+        'series': len(series),
+        'resample': resample,
+        'binning': binning,
+        'reduction': reduction
+    }
+    logger.info(
+        f"Chart generated: {chart_type} with {len(series)} series, {len(values)} of {points} points, "
+        f"resample {resample}, reduction {reduction}"
+    )
+    return chart
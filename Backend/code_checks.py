@@ -0,0 +1,556 @@
+import ast
+import logging
+import threading
+from collections import Counter
+from typing import Optional, List, Dict, Any, Tuple, Callable
+
+logger = logging.getLogger(__name__)
+
+# Element-wise numpy functions that accept a Series unchanged
+VECTORIZED_NUMPY_FUNCTIONS = {
+    "abs", "sqrt", "log", "log1p", "log2", "log10", "exp", "floor", "ceil", "round",
+    "sign", "minimum", "maximum", "where", "isnan", "clip"
+}
+# Methods of a pandas row that must not be mistaken for column names in row.<name>
+ROW_ATTRIBUTE_BLOCKLIST = {"name", "index", "values", "get", "keys", "items", "sum", "mean", "min", "max", "count"}
+
+BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+COMPARE_OPERATORS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+HINT = (
+    "Avoid iterrows(), itertuples(), apply(..., axis=1) and loops over rows; use whole-column "
+    "operations instead, e.g. df['c'] = df['a'] * df['b'], np.where(cond, a, b), "
+    "df.loc[mask, 'c'] = value, groupby aggregations or merges."
+)
+
+
+class CodeCheckStats:
+    """Counters of the vectorization check, shared across requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rewrites: Counter = Counter()
+        self.sent_back = 0
+        self.unresolved = 0
+
+    def record(self, report: Dict[str, Any]) -> None:
+        with self._lock:
+            self.checked += 1
+            self.rewrites.update(rewrite["pattern"] for rewrite in report["rewrites"])
+
+    def record_sent_back(self) -> None:
+        with self._lock:
+            self.sent_back += 1
+
+    def record_unresolved(self) -> None:
+        with self._lock:
+            self.unresolved += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "rewrites": dict(self.rewrites),
+                "sent_back": self.sent_back,
+                "unresolved": self.unresolved
+            }
+
+
+code_check_stats = CodeCheckStats()
+
+
+def _string_constant(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def _column(frame: str, column: str) -> ast.expr:
+    return ast.Subscript(value=ast.Name(id=frame, ctx=ast.Load()), slice=ast.Constant(value=column), ctx=ast.Load())
+
+
+def _has_keyword(call: ast.Call, name: str, values: Tuple[Any, ...]) -> bool:
+    return any(
+        keyword.arg == name and isinstance(keyword.value, ast.Constant) and keyword.value.value in values
+        for keyword in call.keywords
+    )
+
+
+def _method_call(node: ast.AST, method: str) -> Optional[ast.Call]:
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == method:
+        return node
+    return None
+
+
+def _is_boolean(node: ast.AST) -> bool:
+    """Whether a per-row expression is known to give a bool: comparisons and logic over them.
+
+    Python's not/and/or and bare if tests use truthiness, which ~, &, | and boolean
+    masks only reproduce for bool values, so other operands are not translated.
+    """
+    if isinstance(node, ast.Compare):
+        return True
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, bool)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return _is_boolean(node.operand)
+    if isinstance(node, ast.BoolOp):
+        return all(_is_boolean(value) for value in node.values)
+    return False
+
+
+def _is_row_apply(node: ast.AST) -> bool:
+    call = _method_call(node, "apply")
+    return call is not None and _has_keyword(call, "axis", (1, "columns"))
+
+
+class _Vectorizer:
+    """Turns a per-row scalar expression into the equivalent whole-column expression.
+
+    column_of maps a node to the column it reads for the current row (row['a'],
+    df.at[i, 'a'], ...), or returns None. Expressions using anything that cannot be
+    translated, such as function calls or the row index itself, are left alone.
+    """
+
+    def __init__(self, frame: str, column_of: Callable[[ast.AST], Optional[str]], loop_names: List[str]):
+        self.frame = frame
+        self.column_of = column_of
+        self.loop_names = set(loop_names)
+        self.columns_read: List[str] = []
+
+    def convert(self, node: ast.AST) -> Optional[ast.expr]:
+        column = self.column_of(node)
+        if column is not None:
+            self.columns_read.append(column)
+            return _column(self.frame, column)
+        if isinstance(node, ast.Constant):
+            return node
+        if isinstance(node, ast.Name):
+            # Outer scalars are fine, the loop variables themselves are not
+            return None if node.id in self.loop_names else node
+        if isinstance(node, ast.BinOp) and isinstance(node.op, BINARY_OPERATORS):
+            left, right = self.convert(node.left), self.convert(node.right)
+            return None if left is None or right is None else ast.BinOp(left=left, op=node.op, right=right)
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not) and not _is_boolean(node.operand):
+                return None
+            operand = self.convert(node.operand)
+            if operand is None:
+                return None
+            op = ast.Invert() if isinstance(node.op, ast.Not) else node.op
+            return ast.UnaryOp(op=op, operand=operand)
+        if isinstance(node, ast.Compare) and all(isinstance(op, COMPARE_OPERATORS) for op in node.ops):
+            operands = [self.convert(operand) for operand in [node.left, *node.comparators]]
+            if any(operand is None for operand in operands):
+                return None
+            # a < b < c becomes (a < b) & (b < c)
+            parts = [
+                ast.Compare(left=operands[i], ops=[op], comparators=[operands[i + 1]])
+                for i, op in enumerate(node.ops)
+            ]
+            return self._combine(parts, ast.BitAnd())
+        if isinstance(node, ast.BoolOp):
+            # `a and b` returns one of its operands; only for bools is that a & b
+            if not _is_boolean(node):
+                return None
+            values = [self.convert(value) for value in node.values]
+            if any(value is None for value in values):
+                return None
+            return self._combine(values, ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr())
+        if isinstance(node, ast.IfExp):
+            if not _is_boolean(node.test):
+                return None
+            parts = [self.convert(part) for part in (node.test, node.body, node.orelse)]
+            if any(part is None for part in parts):
+                return None
+            return self._where(*parts)
+        if (
+            isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and isinstance(node.func.value, ast.Name) and node.func.value.id == "np"
+            and node.func.attr in VECTORIZED_NUMPY_FUNCTIONS and not node.keywords
+        ):
+            args = [self.convert(arg) for arg in node.args]
+            if any(arg is None for arg in args):
+                return None
+            return ast.Call(func=node.func, args=args, keywords=[])
+        return None
+
+    def _combine(self, parts: List[ast.expr], op: ast.operator) -> ast.expr:
+        combined = parts[0]
+        for part in parts[1:]:
+            combined = ast.BinOp(left=combined, op=op, right=part)
+        return combined
+
+    def _where(self, test: ast.expr, body: ast.expr, orelse: ast.expr) -> ast.expr:
+        # pd.Series keeps the frame's index, which np.where alone would drop
+        where = ast.Call(
+            func=ast.Attribute(value=ast.Name(id="np", ctx=ast.Load()), attr="where", ctx=ast.Load()),
+            args=[test, body, orelse], keywords=[]
+        )
+        index = ast.Attribute(value=ast.Name(id=self.frame, ctx=ast.Load()), attr="index", ctx=ast.Load())
+        return ast.Call(
+            func=ast.Attribute(value=ast.Name(id="pd", ctx=ast.Load()), attr="Series", ctx=ast.Load()),
+            args=[where], keywords=[ast.keyword(arg="index", value=index)]
+        )
+
+
+def _row_reader(row: str, columns: List[str], tuples: bool = False) -> Callable[[ast.AST], Optional[str]]:
+    """Matches row['a'] and row.a for a row variable of iterrows, itertuples or apply."""
+    def column_of(node: ast.AST) -> Optional[str]:
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == row and not tuples:
+            return _string_constant(node.slice)
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == row:
+            if tuples:
+                return node.attr if node.attr != "Index" else None
+            if node.attr in columns and node.attr not in ROW_ATTRIBUTE_BLOCKLIST:
+                return node.attr
+        return None
+    return column_of
+
+
+def _cell_reader(frame: str, is_index: Callable[[ast.AST], bool]) -> Callable[[ast.AST], Optional[str]]:
+    """Matches df.at[i, 'a'], df.loc[i, 'a'] and df['a'][i] for the current row label i."""
+    def column_of(node: ast.AST) -> Optional[str]:
+        if not isinstance(node, ast.Subscript):
+            return None
+        target = node.value
+        if (
+            isinstance(target, ast.Attribute) and target.attr in ("at", "loc")
+            and isinstance(target.value, ast.Name) and target.value.id == frame
+            and isinstance(node.slice, ast.Tuple) and len(node.slice.elts) == 2
+            and is_index(node.slice.elts[0])
+        ):
+            return _string_constant(node.slice.elts[1])
+        if (
+            isinstance(target, ast.Subscript) and isinstance(target.value, ast.Name)
+            and target.value.id == frame and is_index(node.slice)
+        ):
+            return _string_constant(target.slice)
+        return None
+    return column_of
+
+
+class _RowLoop:
+    """A for loop over the rows of a frame, with the readers for its loop variables."""
+
+    def __init__(self, frame: str, pattern: str, loop_names: List[str], readers: List[Callable], is_index: Callable):
+        self.frame = frame
+        self.pattern = pattern
+        self.loop_names = loop_names
+        self.readers = readers
+        self.is_index = is_index
+
+    def column_of(self, node: ast.AST) -> Optional[str]:
+        for reader in self.readers:
+            column = reader(node)
+            if column is not None:
+                return column
+        return None
+
+
+def _name_matcher(name: str) -> Callable[[ast.AST], bool]:
+    return lambda node: isinstance(node, ast.Name) and node.id == name
+
+
+def _match_row_loop(node: ast.For, columns: List[str]) -> Optional[_RowLoop]:
+    """Recognise `for i, row in df.iterrows()`, `for row in df.itertuples()` and `for i in df.index`."""
+    iterator = node.iter
+    call = _method_call(iterator, "iterrows") or _method_call(iterator, "itertuples")
+    if call is not None and isinstance(call.func.value, ast.Name):
+        frame = call.func.value.id
+        if call.func.attr == "iterrows":
+            if not (isinstance(node.target, ast.Tuple) and len(node.target.elts) == 2
+                    and all(isinstance(elt, ast.Name) for elt in node.target.elts)):
+                return None
+            index, row = node.target.elts[0].id, node.target.elts[1].id
+            is_index = _name_matcher(index)
+            readers = [_row_reader(row, columns), _cell_reader(frame, is_index)]
+            return _RowLoop(frame, "iterrows", [index, row], readers, is_index)
+        if call.args or call.keywords or not isinstance(node.target, ast.Name):
+            return None
+        row = node.target.id
+
+        def is_row_index(index_node: ast.AST) -> bool:
+            return (isinstance(index_node, ast.Attribute) and index_node.attr == "Index"
+                    and isinstance(index_node.value, ast.Name) and index_node.value.id == row)
+        readers = [_row_reader(row, columns, tuples=True), _cell_reader(frame, is_row_index)]
+        return _RowLoop(frame, "itertuples", [row], readers, is_row_index)
+
+    if (
+        isinstance(iterator, ast.Attribute) and iterator.attr == "index"
+        and isinstance(iterator.value, ast.Name) and isinstance(node.target, ast.Name)
+    ):
+        frame, index = iterator.value.id, node.target.id
+        is_index = _name_matcher(index)
+        return _RowLoop(frame, "index_loop", [index], [_cell_reader(frame, is_index)], is_index)
+    return None
+
+
+class _LoopRewriter:
+    """Rewrites the body of a row loop into whole-column statements, or gives up with None.
+
+    Supported bodies are cell assignments (df.at[i, 'c'] = expr), accumulators
+    (total += expr), list appends and if/else blocks of those.
+    """
+
+    def __init__(self, loop: _RowLoop):
+        self.loop = loop
+        self.written: set = set()
+        self.masks = 0
+        self.statements: List[ast.stmt] = []
+
+    def vectorize(self, node: ast.AST) -> Tuple[Optional[ast.expr], bool]:
+        """Whole-column version of a per-row expression and whether it reads any column."""
+        vectorizer = _Vectorizer(self.loop.frame, self.loop.column_of, self.loop.loop_names)
+        converted = vectorizer.convert(node)
+        # Reading a column the loop already wrote would see different values per row
+        if converted is None or self.written.intersection(vectorizer.columns_read):
+            return None, False
+        return converted, bool(vectorizer.columns_read)
+
+    @staticmethod
+    def reads_accumulator(body: List[ast.stmt]) -> bool:
+        """Whether the loop reads a name it also accumulates into, e.g. a running total.
+
+        The rewrite adds every row at once, so such reads would see the final total.
+        """
+        nodes = [node for stmt in body for node in ast.walk(stmt)]
+        accumulated = {
+            node.target.id for node in nodes
+            if isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name)
+        }
+        return any(isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id in accumulated for node in nodes)
+
+    def assigned_column(self, target: ast.AST) -> Optional[str]:
+        if (
+            isinstance(target, ast.Subscript) and isinstance(target.value, ast.Attribute)
+            and target.value.attr in ("at", "loc") and isinstance(target.value.value, ast.Name)
+            and target.value.value.id == self.loop.frame
+            and isinstance(target.slice, ast.Tuple) and len(target.slice.elts) == 2
+            and self.loop.is_index(target.slice.elts[0])
+        ):
+            return _string_constant(target.slice.elts[1])
+        return None
+
+    def rewrite(self, body: List[ast.stmt], mask: Optional[ast.expr] = None) -> bool:
+        if mask is None and self.reads_accumulator(body):
+            return False
+        for stmt in body:
+            if not self.rewrite_statement(stmt, mask):
+                return False
+        return True
+
+    def rewrite_statement(self, stmt: ast.stmt, mask: Optional[ast.expr]) -> bool:
+        frame = self.loop.frame
+        if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1:
+            column = self.assigned_column(stmt.targets[0])
+            value, _ = self.vectorize(stmt.value)
+            if column is None or value is None:
+                return False
+            if mask is None:
+                target = ast.Subscript(value=ast.Name(id=frame, ctx=ast.Load()), slice=ast.Constant(value=column), ctx=ast.Store())
+            else:
+                target = ast.Subscript(
+                    value=ast.Attribute(value=ast.Name(id=frame, ctx=ast.Load()), attr="loc", ctx=ast.Load()),
+                    slice=ast.Tuple(elts=[mask, ast.Constant(value=column)], ctx=ast.Load()),
+                    ctx=ast.Store()
+                )
+            self.statements.append(ast.Assign(targets=[target], value=value))
+            self.written.add(column)
+            return True
+
+        if isinstance(stmt, ast.AugAssign) and isinstance(stmt.op, ast.Add) and isinstance(stmt.target, ast.Name):
+            if stmt.target.id in self.loop.loop_names:
+                return False
+            value, reads_columns = self.vectorize(stmt.value)
+            if value is None:
+                return False
+            if reads_columns:
+                selected = value if mask is None else ast.Subscript(value=value, slice=mask, ctx=ast.Load())
+                total = ast.Call(func=ast.Attribute(value=selected, attr="sum", ctx=ast.Load()), args=[], keywords=[])
+            else:
+                # A constant added once per (matching) row
+                rows = (
+                    ast.Call(func=ast.Name(id="len", ctx=ast.Load()), args=[ast.Name(id=frame, ctx=ast.Load())], keywords=[])
+                    if mask is None else
+                    ast.Call(func=ast.Name(id="int", ctx=ast.Load()), args=[
+                        ast.Call(func=ast.Attribute(value=mask, attr="sum", ctx=ast.Load()), args=[], keywords=[])
+                    ], keywords=[])
+                )
+                total = ast.BinOp(left=value, op=ast.Mult(), right=rows)
+            self.statements.append(ast.AugAssign(target=stmt.target, op=ast.Add(), value=total))
+            return True
+
+        append = _method_call(getattr(stmt, "value", None), "append") if isinstance(stmt, ast.Expr) else None
+        if append is not None and isinstance(append.func.value, ast.Name) and len(append.args) == 1:
+            value, reads_columns = self.vectorize(append.args[0])
+            if value is None or not reads_columns:
+                return False
+            selected = value if mask is None else ast.Subscript(value=value, slice=mask, ctx=ast.Load())
+            values = ast.Call(func=ast.Attribute(value=selected, attr="tolist", ctx=ast.Load()), args=[], keywords=[])
+            self.statements.append(ast.Expr(value=ast.Call(
+                func=ast.Attribute(value=append.func.value, attr="extend", ctx=ast.Load()), args=[values], keywords=[]
+            )))
+            return True
+
+        if isinstance(stmt, ast.If):
+            # A non-bool column used as a mask would select rows by label
+            if not _is_boolean(stmt.test):
+                return False
+            test, reads_columns = self.vectorize(stmt.test)
+            if test is None or not reads_columns:
+                return False
+            # The condition is evaluated once, before the branches modify any column
+            mask_name = f"_row_mask_{self.masks}"
+            self.masks += 1
+            if mask is not None:
+                test = ast.BinOp(left=mask, op=ast.BitAnd(), right=test)
+            self.statements.append(ast.Assign(targets=[ast.Name(id=mask_name, ctx=ast.Store())], value=test))
+            branch_mask = ast.Name(id=mask_name, ctx=ast.Load())
+            if not self.rewrite(stmt.body, branch_mask):
+                return False
+            if stmt.orelse:
+                inverse = ast.UnaryOp(op=ast.Invert(), operand=ast.Name(id=mask_name, ctx=ast.Load()))
+                if mask is not None:
+                    inverse = ast.BinOp(left=mask, op=ast.BitAnd(), right=inverse)
+                return self.rewrite(stmt.orelse, inverse)
+            return True
+
+        if isinstance(stmt, ast.Pass):
+            return True
+        return False
+
+
+class _Rewriter(ast.NodeTransformer):
+    """Applies the vectorizing rewrites and records what it changed."""
+
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+        self.rewrites: List[Dict[str, Any]] = []
+
+    def visit_For(self, node: ast.For):
+        self.generic_visit(node)
+        loop = _match_row_loop(node, self.columns)
+        if loop is None or node.orelse:
+            return node
+        rewriter = _LoopRewriter(loop)
+        if not rewriter.rewrite(node.body) or not rewriter.statements:
+            return node
+        self.rewrites.append({"pattern": loop.pattern, "line": node.lineno})
+        return rewriter.statements
+
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        if not _is_row_apply(node) or not isinstance(node.func.value, ast.Name):
+            return node
+        if len(node.args) != 1 or not isinstance(node.args[0], ast.Lambda):
+            return node
+        function = node.args[0]
+        if len(function.args.args) != 1:
+            return node
+        frame, row = node.func.value.id, function.args.args[0].arg
+        converted = _Vectorizer(frame, _row_reader(row, self.columns), [row]).convert(function.body)
+        if converted is None:
+            return node
+        self.rewrites.append({"pattern": "apply_axis_1", "line": node.lineno})
+        return converted
+
+
+def find_row_wise_code(tree: ast.AST) -> List[Dict[str, Any]]:
+    """Row-by-row constructs left in the code: iterrows, itertuples, row-wise apply, index loops."""
+    issues = []
+    for node in ast.walk(tree):
+        if _method_call(node, "iterrows") or _method_call(node, "itertuples"):
+            issues.append({"pattern": node.func.attr, "line": node.lineno})
+        elif _is_row_apply(node):
+            issues.append({"pattern": "apply_axis_1", "line": node.lineno})
+        elif isinstance(node, ast.For):
+            iterator = node.iter
+            over_index = isinstance(iterator, ast.Attribute) and iterator.attr == "index"
+            over_range = (
+                isinstance(iterator, ast.Call) and isinstance(iterator.func, ast.Name) and iterator.func.id == "range"
+                and len(iterator.args) == 1 and isinstance(iterator.args[0], ast.Call)
+                and isinstance(iterator.args[0].func, ast.Name) and iterator.args[0].func.id == "len"
+            )
+            if over_index or over_range:
+                issues.append({"pattern": "index_loop", "line": node.lineno})
+    return sorted(issues, key=lambda issue: issue["line"])
+
+
+def check_generated_code(code: str, columns: List[str]) -> Tuple[str, Dict[str, Any]]:
+    """Rewrite common row-by-row patterns in generated code into vectorized pandas.
+
+    Row-wise arithmetic and conditional assignment in iterrows/itertuples/index loops
+    and in apply(lambda row: ..., axis=1) are rewritten to whole-column expressions.
+    Whatever cannot be rewritten is reported, so the caller can ask the LLM again.
+
+    Returns:
+        tuple: The (possibly rewritten) code and a report with the rewrites made and the
+        row-wise constructs that remain
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        # Left to the executor, which reports the syntax error
+        return code, {"rewrites": [], "issues": []}
+
+    rewriter = _Rewriter(columns)
+    tree = rewriter.visit(tree)
+    if rewriter.rewrites:
+        code = ast.unparse(ast.fix_missing_locations(tree))
+    report = {"rewrites": rewriter.rewrites, "issues": find_row_wise_code(tree)}
+    code_check_stats.record(report)
+    if rewriter.rewrites:
+        logger.info(f"Vectorized {len(rewriter.rewrites)} row-wise constructs: {rewriter.rewrites}")
+    return code, report
+
+
+def describe_issues(issues: List[Dict[str, Any]]) -> str:
+    """Targeted hint listing the row-wise constructs the LLM should replace."""
+    names = {
+        "iterrows": "iterrows() loop",
+        "itertuples": "itertuples() loop",
+        "apply_axis_1": "apply(..., axis=1)",
+        "index_loop": "loop over the row index"
+    }
+    found = "; ".join(f"line {issue['line']}: {names.get(issue['pattern'], issue['pattern'])}" for issue in issues)
+    return f"The code processes rows one at a time ({found}). {HINT}"
+
+
+def test_rewrites_preserve_results():
+    """Run generated-code samples before and after the rewrite and compare what they produce."""
+    import numpy as np
+    import pandas as pd
+
+    sample = pd.DataFrame({"a": [0, 3, 1, 2], "b": [5, 6, 7, 8], "price": [1.5, 2.0, 0.5, 4.0]})
+    cases = [
+        # Rewritten
+        "for i, row in df.iterrows():\n    df.at[i, 'c'] = row['a'] * row['b']",
+        "for i, row in df.iterrows():\n    if row['a'] > 1 and row['b'] < 8:\n        df.at[i, 'flag'] = 1\n    else:\n        df.at[i, 'flag'] = 0",
+        "total = 0\nfor row in df.itertuples():\n    total += row.price",
+        "result = []\nfor i in df.index:\n    if not df.at[i, 'a'] > 1:\n        result.append(df.at[i, 'b'])",
+        "df['d'] = df.apply(lambda r: r['a'] if r['b'] > 6 else -r['a'], axis=1)",
+        # Left unchanged: running totals, and truthiness of non-bool values
+        "total = 0\nfor i, row in df.iterrows():\n    total += row['a']\n    df.at[i, 'running'] = total",
+        "df['n'] = df.apply(lambda r: not r['a'], axis=1)",
+        "df['n'] = df.apply(lambda r: r['a'] and r['b'], axis=1)",
+        "for i, row in df.iterrows():\n    if row['a']:\n        df.at[i, 'c'] = row['b']",
+    ]
+    for code in cases:
+        rewritten, report = check_generated_code(code, list(sample.columns))
+        results = []
+        for version in (code, rewritten):
+            namespace = {"df": sample.copy(), "pd": pd, "np": np}
+            exec(version, namespace)
+            results.append(namespace)
+        original, vectorized = results
+        pd.testing.assert_frame_equal(original["df"], vectorized["df"], check_dtype=False)
+        for name in ("total", "result"):
+            if name in original:
+                assert np.allclose(original[name], vectorized[name]), (code, original[name], vectorized[name])
+        print(f"{'rewritten' if report['rewrites'] else 'unchanged'}: {code.splitlines()[-1].strip()}")
+
+
+if __name__ == "__main__":
+    test_rewrites_preserve_results()
@@ -0,0 +1,46 @@
+from .cache import DataFrameCache, frame_nbytes
+from .dtypes import date_format, narrow_parquet_file, narrow_table
+from .excel import ALL_SHEETS, list_excel_sheets, read_excel_table
+from .ingest import SUPPORTED_EXTENSIONS, combine_parquet_files, file_to_parquet, spool_upload
+from .joins import describe_tables, infer_join_keys, join_parquet_files, join_tables, plan_joins, table_names
+from .lazy import LazyDataset
+from .plans import PLAN_OPERATIONS, PlanValidationError, describe_plan_format, execute_plan, validate_plan
+from .profile import DatasetProfile, frame_content_hash, profile_for_frame
+from .registry import DatasetRegistry, hash_file
+from .schema import SCHEMA_MODES, clean_column_name, clean_column_names, reconcile_tables
+
+__all__ = [
+    "ALL_SHEETS",
+    "PLAN_OPERATIONS",
+    "SCHEMA_MODES",
+    "SUPPORTED_EXTENSIONS",
+    "DataFrameCache",
+    "DatasetProfile",
+    "DatasetRegistry",
+    "LazyDataset",
+    "PlanValidationError",
+    "clean_column_name",
+    "clean_column_names",
+    "combine_parquet_files",
+    "date_format",
+    "describe_plan_format",
+    "describe_tables",
+    "execute_plan",
+    "file_to_parquet",
+    "frame_content_hash",
+    "frame_nbytes",
+    "hash_file",
+    "infer_join_keys",
+    "join_parquet_files",
+    "join_tables",
+    "list_excel_sheets",
+    "narrow_parquet_file",
+    "narrow_table",
+    "plan_joins",
+    "profile_for_frame",
+    "read_excel_table",
+    "reconcile_tables",
+    "spool_upload",
+    "table_names",
+    "validate_plan",
+]
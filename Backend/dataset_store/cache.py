@@ -0,0 +1,93 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Hashable, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Deep in-memory size of a DataFrame, including object/string payloads."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class DataFrameCache:
+    """Thread-safe LRU cache of parsed DataFrames bounded by a byte budget.
+
+    Entries are keyed by (dataset_id, content_hash) so a re-registered dataset never
+    serves a stale frame. Cached frames are shared between requests and must be
+    treated as read-only by callers.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        """Return the cached frame for key, marking it most recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, df: pd.DataFrame) -> None:
+        """Insert a frame, evicting least recently used entries until it fits the budget."""
+        size = frame_nbytes(df)
+        if size > self.max_bytes:
+            logger.info(f"Not caching {key}: {size} bytes exceeds cache budget of {self.max_bytes}")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                evicted_key, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+                logger.info(f"Evicted {evicted_key} from DataFrame cache ({evicted_size} bytes)")
+            self._entries[key] = (df, size)
+            self.current_bytes += size
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Return the cached frame or build it with loader and cache the result."""
+        df = self.get(key)
+        if df is None:
+            df = loader()
+            self.put(key, df)
+        return df
+
+    def invalidate(self, dataset_id: str) -> None:
+        """Drop every cached version of a dataset."""
+        with self._lock:
+            for key in [k for k in self._entries if isinstance(k, tuple) and k[0] == dataset_id]:
+                self.current_bytes -= self._entries.pop(key)[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and current memory usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,136 @@
+import logging
+from typing import Optional, Tuple, List, Dict, Any
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+# Strings become categories when at most this share of values is distinct...
+CATEGORY_MAX_RATIO = 0.5
+# ...and there are at most this many distinct values
+CATEGORY_MAX_VALUES = 10000
+# Non-null values sampled to decide whether a string column holds dates
+DATE_SAMPLE_SIZE = 200
+# Date formats recognised in string columns: ISO 8601 and full dates whose day and month cannot be swapped
+DATE_FORMATS = [
+    "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M",
+    "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S.%f", "%Y/%m/%d",
+    "%d %B %Y", "%d %b %Y", "%B %d, %Y", "%b %d, %Y"
+]
+
+INTEGER_TYPES = [pa.int8(), pa.int16(), pa.int32(), pa.int64()]
+
+
+def _narrow_integer(column: pa.ChunkedArray) -> pa.DataType:
+    bounds = pc.min_max(column).as_py()
+    if bounds["min"] is None:
+        return column.type
+    for candidate in INTEGER_TYPES:
+        info = np.iinfo(candidate.to_pandas_dtype())
+        if info.min <= bounds["min"] and bounds["max"] <= info.max:
+            return candidate
+    return column.type
+
+
+def _narrow_float(column: pa.ChunkedArray) -> pa.DataType:
+    if column.type != pa.float64():
+        return column.type
+    # Only downcast when every value survives the round trip through float32
+    narrowed = pc.cast(column, pa.float32(), safe=False)
+    restored = pc.cast(narrowed, pa.float64())
+    equal = pc.equal(restored, column)
+    both_nan = pc.and_(pc.is_nan(restored), pc.is_nan(column))
+    if pc.all(pc.or_kleene(equal, both_nan)).as_py() in (True, None):
+        return pa.float32()
+    return column.type
+
+
+def date_format(values: pd.Series) -> Optional[str]:
+    """The first of DATE_FORMATS that every value parses with exactly, or None.
+
+    Formats are tried one at a time, so ranges like 1-2, ratios like 1/2 and bare
+    times like 10:30 are never read as dates.
+    """
+    values = values.dropna().astype(str).str.strip()
+    if values.empty:
+        return None
+    for candidate in DATE_FORMATS:
+        if pd.to_datetime(values, format=candidate, exact=True, errors="coerce").notna().all():
+            return candidate
+    return None
+
+
+def _parse_dates(column: pa.ChunkedArray) -> Optional[pa.ChunkedArray]:
+    """Parse a string column into timestamps when all its values are dates in one of DATE_FORMATS, else None."""
+    non_null = pc.drop_null(column)
+    if len(non_null) == 0:
+        return None
+    found = date_format(non_null.slice(0, DATE_SAMPLE_SIZE).to_pandas())
+    if found is None:
+        return None
+    parsed = pd.to_datetime(column.to_pandas().str.strip(), format=found, exact=True, errors="coerce")
+    if parsed.isna().sum() > column.null_count:
+        return None
+    return pa.chunked_array([pa.array(parsed, type=pa.timestamp("us"))])
+
+
+def narrow_table(table: pa.Table, parse_dates: bool = False) -> Tuple[pa.Table, List[Dict[str, Any]]]:
+    """Downcast numerics, dictionary-encode low-cardinality strings and, with parse_dates, parse date strings.
+
+    Dictionary-encoded columns load into pandas as ``category``. All conversions are
+    lossless: integers only shrink to a type that holds their range and floats only
+    become float32 when every value survives the round trip.
+
+    Returns:
+        tuple: The narrowed table and a per-column report of the byte savings
+    """
+    columns = []
+    report = []
+    rows = table.num_rows
+    for name, column in zip(table.column_names, table.columns):
+        original_type = column.type
+        narrowed = column
+        try:
+            if pa.types.is_integer(original_type):
+                narrowed = column.cast(_narrow_integer(column))
+            elif pa.types.is_floating(original_type):
+                narrowed = column.cast(_narrow_float(column))
+            elif pa.types.is_string(original_type) or pa.types.is_large_string(original_type):
+                dates = _parse_dates(column) if parse_dates else None
+                if dates is not None:
+                    narrowed = dates
+                elif rows:
+                    distinct = pc.count_distinct(column).as_py()
+                    if distinct <= CATEGORY_MAX_VALUES and distinct / rows <= CATEGORY_MAX_RATIO:
+                        index_type = _narrow_integer(pa.chunked_array([pa.array([0, distinct], pa.int32())]))
+                        narrowed = pc.dictionary_encode(column).cast(pa.dictionary(index_type, original_type))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError, TypeError) as e:
+            logger.warning(f"Could not narrow column '{name}': {e}")
+            narrowed = column
+
+        columns.append(narrowed)
+        before, after = column.nbytes, narrowed.nbytes
+        report.append({
+            "column": name,
+            "from": str(original_type),
+            "to": str(narrowed.type),
+            "bytes_before": before,
+            "bytes_after": after,
+            "saved_bytes": before - after
+        })
+
+    return pa.Table.from_arrays(columns, names=table.column_names), report
+
+
+def narrow_parquet_file(path: str, parse_dates: bool = False) -> List[Dict[str, Any]]:
+    """Rewrite a parquet file with narrowed column types and return the savings report."""
+    table, report = narrow_table(pq.read_table(path), parse_dates=parse_dates)
+    pq.write_table(table, path)
+    total_before = sum(entry["bytes_before"] for entry in report)
+    total_after = sum(entry["bytes_after"] for entry in report)
+    logger.info(f"Narrowed dtypes of {path}: {total_before} -> {total_after} bytes")
+    return report
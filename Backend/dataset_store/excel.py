@@ -0,0 +1,203 @@
+import logging
+from datetime import date, datetime
+from collections import defaultdict
+from typing import Optional, List, Dict, Any, Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from fastapi import HTTPException
+from openpyxl import load_workbook
+
+from .schema import ColumnTypeError, batch_schema, conform_table
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+logger = logging.getLogger(__name__)
+
+# Passing this as the sheet ingests every sheet of the workbook
+ALL_SHEETS = "*"
+# Column added when several sheets are stacked into one dataset
+SHEET_COLUMN = "sheet_name"
+# Rows converted to an Arrow batch at a time while streaming a sheet
+EXCEL_BATCH_ROWS = 50000
+
+
+def list_excel_sheets(path: str, extension: str) -> List[str]:
+    """Sheet names of a workbook, without loading any cell data."""
+    if CalamineWorkbook is not None:
+        workbook = CalamineWorkbook.from_path(path)
+        try:
+            return workbook.sheet_names
+        finally:
+            workbook.close()
+    if extension == '.xls':
+        return pd.ExcelFile(path).sheet_names
+    workbook = load_workbook(path, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+def _header_names(header: tuple) -> List[str]:
+    """Column names from the header row; blanks become column_<n> and duplicates get a suffix."""
+    names, seen = [], defaultdict(int)
+    for i, value in enumerate(header):
+        base = str(value) if value is not None else f"column_{i}"
+        names.append(f"{base}_{seen[base]}" if seen[base] else base)
+        seen[base] += 1
+    return names
+
+
+def _column_array(values: List[Any], column_type: Optional[pa.DataType] = None) -> pa.Array:
+    """Arrow array of a column's cells, falling back to strings for mixed-type columns.
+
+    Excel stores every number as a float, so float columns holding only whole numbers
+    become integers, as pandas.read_excel does. A string column_type skips inference.
+    """
+    if column_type is None or not (pa.types.is_string(column_type) or pa.types.is_large_string(column_type)):
+        try:
+            array = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+            array = None
+        if array is not None:
+            if pa.types.is_floating(array.type) and array.null_count < len(array):
+                valid = pc.drop_null(array)
+                if pc.all(pc.equal(pc.floor(valid), valid)).as_py() and pc.max(pc.abs(valid)).as_py() < 2 ** 53:
+                    array = array.cast(pa.int64())
+            return array
+    return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def _calamine_value(value: Any) -> Any:
+    # Calamine reports empty cells as empty strings and midnight datetimes as dates
+    if value == "":
+        return None
+    if type(value) is date:
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+def _sheet_rows(workbook, name: str) -> Iterator[tuple]:
+    if CalamineWorkbook is not None:
+        for row in workbook.get_sheet_by_name(name).iter_rows():
+            yield tuple(_calamine_value(value) for value in row)
+    else:
+        yield from workbook[name].iter_rows(values_only=True)
+
+
+def _sheet_batches(
+    rows: Iterator[tuple],
+    batch_rows: int,
+    column_types: Optional[Dict[str, pa.DataType]] = None
+) -> Iterator[pa.Table]:
+    header = next(rows, None)
+    if header is None:
+        return
+    names = _header_names(header)
+    column_types = column_types or {}
+    buffer: List[tuple] = []
+
+    def flush() -> pa.Table:
+        columns = [[row[i] if i < len(row) else None for row in buffer] for i in range(len(names))]
+        arrays = [_column_array(values, column_types.get(name)) for name, values in zip(names, columns)]
+        return pa.Table.from_arrays(arrays, names=names)
+
+    for row in rows:
+        # Read-only worksheets often report trailing empty rows
+        if all(value is None for value in row):
+            continue
+        buffer.append(row)
+        if len(buffer) >= batch_rows:
+            yield flush()
+            buffer = []
+    if buffer:
+        yield flush()
+
+
+def _select_sheets(path: str, extension: str, sheet: Optional[str]) -> List[str]:
+    sheets = list_excel_sheets(path, extension)
+    if sheet == ALL_SHEETS:
+        return sheets
+    if sheet is None:
+        return sheets[:1]
+    if sheet in sheets:
+        return [sheet]
+    raise HTTPException(status_code=400, detail=f"Sheet '{sheet}' not found, available sheets: {sheets}")
+
+
+def excel_batches(
+    path: str,
+    extension: str,
+    sheet: Optional[str] = None,
+    batch_rows: int = EXCEL_BATCH_ROWS,
+    column_types: Optional[Dict[str, pa.DataType]] = None
+) -> Iterator[pa.RecordBatch]:
+    """Stream one sheet (default: the first) or every sheet of a workbook as Arrow record batches.
+
+    Rows are streamed with the Rust calamine reader when python-calamine is installed,
+    otherwise ``.xlsx`` workbooks are streamed in openpyxl's read-only mode and legacy
+    ``.xls`` files are read a sheet at a time through pandas. When several sheets are
+    read they are stacked with a ``sheet_name`` column naming the source sheet.
+
+    Every batch has the schema of the first one, with column_types overriding inferred
+    types. A later batch that needs a wider type or adds a column raises
+    ColumnTypeError; the caller then streams again with those types.
+    """
+    selected = _select_sheets(path, extension, sheet)
+    column_types = column_types or {}
+    workbook = None
+    if CalamineWorkbook is not None:
+        workbook = CalamineWorkbook.from_path(path)
+    elif extension != '.xls':
+        workbook = load_workbook(path, read_only=True, data_only=True)
+
+    schema = None
+    try:
+        for name in selected:
+            if workbook is None:
+                df = pd.read_excel(path, sheet_name=name)
+                tables = iter([pa.Table.from_pandas(df, preserve_index=False)] if len(df) else [])
+            else:
+                tables = _sheet_batches(_sheet_rows(workbook, name), batch_rows, column_types)
+
+            empty = True
+            for table in tables:
+                empty = False
+                if len(selected) > 1:
+                    table = table.append_column(SHEET_COLUMN, pa.array([name] * table.num_rows, type=pa.string()))
+                if schema is None:
+                    schema = batch_schema(table.schema, column_types)
+                yield from conform_table(table, schema).to_batches()
+            if empty:
+                logger.warning(f"Skipping empty sheet '{name}'")
+    finally:
+        if workbook is not None:
+            workbook.close()
+
+
+def read_excel_table(
+    path: str,
+    extension: str,
+    sheet: Optional[str] = None,
+    batch_rows: int = EXCEL_BATCH_ROWS
+) -> pa.Table:
+    """Read one sheet (default: the first) or every sheet of a workbook into an Arrow table.
+
+    See excel_batches for how sheets are read; ingest streams those batches to parquet
+    instead of collecting them.
+    """
+    column_types: Dict[str, pa.DataType] = {}
+    while True:
+        try:
+            batches = list(excel_batches(path, extension, sheet, batch_rows, column_types))
+        except ColumnTypeError as e:
+            column_types.update(e.columns)
+            continue
+        if not batches:
+            raise ValueError("File contains no data")
+        return pa.Table.from_batches(batches)
@@ -0,0 +1,265 @@
+import os
+import re
+import json
+import logging
+import tempfile
+from typing import Optional, List, Dict, Any, Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from fastapi import UploadFile, HTTPException
+
+from .excel import excel_batches
+from .schema import ColumnTypeError, align_table, batch_schema, clean_column_names, conform_table, reconcile_schemas
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ['.csv', '.xlsx', '.xls', '.json', '.jsonl', '.ndjson']
+
+# Rows buffered per parquet row group while streaming
+ROW_GROUP_ROWS = 128 * 1024
+
+
+async def spool_upload(
+    file: UploadFile,
+    tmp_dir: str,
+    max_bytes: int,
+    chunk_size: int = 1024 * 1024
+) -> str:
+    """Copy an upload to a unique temp file in fixed-size chunks.
+
+    The size limit is enforced from the declared size when available and otherwise
+    as soon as the copied bytes exceed it, so oversized uploads fail early.
+
+    Returns:
+        str: Path of the spooled temp file (the caller removes it)
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File {file.filename} exceeds the {max_bytes} byte upload limit")
+
+    os.makedirs(tmp_dir, exist_ok=True)
+    extension = os.path.splitext(file.filename or "")[-1].lower()
+    fd, path = tempfile.mkstemp(suffix=extension, dir=tmp_dir)
+    written = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise HTTPException(
+                        status_code=413, detail=f"File {file.filename} exceeds the {max_bytes} byte upload limit"
+                    )
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    logger.info(f"Spooled {file.filename} ({written} bytes) to {path}")
+    return path
+
+
+def _clean_schema(schema: pa.Schema) -> pa.Schema:
+    return pa.schema([field.with_name(name) for field, name in zip(schema, clean_column_names(schema.names))])
+
+
+def _csv_batches(path: str, block_size: int, column_types: Optional[Dict[str, pa.DataType]] = None) -> Iterator[pa.RecordBatch]:
+    reader = pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(column_types=column_types or {})
+    )
+    for batch in reader:
+        yield batch
+
+
+def _json_column(values: pd.Series, column_type: Optional[pa.DataType] = None) -> pa.Array:
+    """Arrow array of a JSON key's values, falling back to strings for mixed-type keys."""
+    if column_type is None or not (pa.types.is_string(column_type) or pa.types.is_large_string(column_type)):
+        try:
+            return pa.array(values, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    return pa.array([None if v is None or v is pd.NaT or (isinstance(v, float) and v != v) else str(v) for v in values], type=pa.string())
+
+
+def _ndjson_batches(
+    path: str,
+    chunk_rows: int,
+    column_types: Optional[Dict[str, pa.DataType]] = None
+) -> Iterator[pa.RecordBatch]:
+    """Stream line-delimited JSON as record batches with the schema of the first chunk.
+
+    column_types overrides inferred types. A later chunk that needs a wider type or
+    adds a key raises ColumnTypeError; keys a chunk lacks are filled with nulls.
+    """
+    column_types = column_types or {}
+    schema = None
+    for chunk in pd.read_json(path, lines=True, chunksize=chunk_rows):
+        names = [str(name) for name in chunk.columns]
+        arrays = [_json_column(chunk[col], column_types.get(name)) for col, name in zip(chunk.columns, names)]
+        table = pa.Table.from_arrays(arrays, names=names)
+        if schema is None:
+            schema = batch_schema(table.schema, column_types)
+        yield from conform_table(table, schema).to_batches()
+
+
+def _write_batches(batches: Iterator[pa.RecordBatch], out_path: str, row_group_rows: int = ROW_GROUP_ROWS) -> Dict[str, Any]:
+    """Write record batches to parquet as they arrive, cleaning column names.
+
+    Small batches are buffered up to row_group_rows so the parquet file does not end
+    up with thousands of tiny row groups.
+    """
+    writer = None
+    pending: List[pa.RecordBatch] = []
+    pending_rows = 0
+    rows = 0
+    try:
+        for batch in batches:
+            if writer is None:
+                schema = _clean_schema(batch.schema)
+                writer = pq.ParquetWriter(out_path, schema)
+            pending.append(pa.RecordBatch.from_arrays(batch.columns, schema=schema))
+            pending_rows += batch.num_rows
+            if pending_rows >= row_group_rows:
+                writer.write_table(pa.Table.from_batches(pending))
+                rows += pending_rows
+                pending, pending_rows = [], 0
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending))
+            rows += pending_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError("File contains no data")
+    return {"rows": rows, "columns": schema.names}
+
+
+CSV_COLUMN_ERROR = re.compile(r"In CSV column #(\d+)")
+
+
+def _csv_to_parquet(path: str, out_path: str, block_size: int) -> Dict[str, Any]:
+    column_types: Dict[str, pa.DataType] = {}
+    inferred = None
+    while True:
+        try:
+            return _write_batches(_csv_batches(path, block_size, column_types), out_path)
+        except pa.ArrowInvalid as e:
+            match = CSV_COLUMN_ERROR.search(str(e))
+            if inferred is None:
+                inferred = next(_csv_batches(path, block_size)).schema
+            if match is None or int(match.group(1)) >= len(inferred):
+                raise
+            field = inferred.field(int(match.group(1)))
+            current = column_types.get(field.name, field.type)
+            if pa.types.is_string(current):
+                raise
+            column_types[field.name] = pa.float64() if pa.types.is_integer(current) else pa.string()
+            logger.warning(f"CSV column '{field.name}' changed type after the first block, reading it as {column_types[field.name]}")
+
+
+def _excel_to_parquet(path: str, extension: str, out_path: str, sheet: Optional[str]) -> Dict[str, Any]:
+    column_types: Dict[str, pa.DataType] = {}
+    while True:
+        try:
+            return _write_batches(excel_batches(path, extension, sheet, column_types=column_types), out_path)
+        except ColumnTypeError as e:
+            column_types.update(e.columns)
+            logger.warning(f"Excel columns changed type after the first batch, reading them as {e.columns}")
+
+
+def _ndjson_to_parquet(path: str, out_path: str, chunk_rows: int) -> Dict[str, Any]:
+    column_types: Dict[str, pa.DataType] = {}
+    while True:
+        try:
+            return _write_batches(_ndjson_batches(path, chunk_rows, column_types), out_path)
+        except ColumnTypeError as e:
+            column_types.update(e.columns)
+            logger.warning(f"JSON keys changed type after the first chunk, reading them as {e.columns}")
+
+
+def _is_ndjson(path: str, extension: str) -> bool:
+    """Line-delimited JSON has one complete object per line over more than one line."""
+    if extension in ('.jsonl', '.ndjson'):
+        return True
+    lines = []
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                lines.append(line)
+                if len(lines) == 2:
+                    break
+    if len(lines) < 2:
+        return False
+    try:
+        return isinstance(json.loads(lines[0]), dict)
+    except ValueError:
+        return False
+
+
+def file_to_parquet(
+    path: str,
+    extension: str,
+    out_path: str,
+    block_size: int = 2 * 1024 * 1024,
+    sheet: Optional[str] = None
+) -> Dict[str, Any]:
+    """Parse an uploaded file into parquet, streaming CSV and NDJSON in record batches.
+
+    CSV types are inferred from the first block; a column that a later block does
+    not fit is widened (integer to float64, anything else to string) and the file is
+    re-streamed. Excel workbooks are streamed in batches from the chosen sheet (the
+    first by default, every sheet with "*"), and NDJSON in chunks of lines, both
+    re-streamed the same way when a column changes type or a new key appears. JSON
+    array files are parsed in memory.
+
+    Returns:
+        dict: Row count and cleaned column names
+    """
+    if extension == '.csv':
+        return _csv_to_parquet(path, out_path, block_size)
+
+    if extension in ('.json', '.jsonl', '.ndjson') and _is_ndjson(path, extension):
+        return _ndjson_to_parquet(path, out_path, chunk_rows=max(1, block_size // 1024))
+
+    if extension in ('.xlsx', '.xls'):
+        return _excel_to_parquet(path, extension, out_path, sheet)
+
+    if extension == '.json':
+        df = pd.read_json(path)
+    else:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {extension}")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return _write_batches(iter(table.to_batches()), out_path)
+
+
+def combine_parquet_files(
+    paths: List[str],
+    out_path: str,
+    mode: str = "union",
+    fuzzy_columns: bool = False,
+    batch_rows: int = ROW_GROUP_ROWS
+) -> Dict[str, Any]:
+    """Stack several parquet files into one after reconciling their schemas.
+
+    The schemas are reconciled from the parquet footers, then each file is streamed in
+    batches cast to the combined schema, so only one batch is held in memory at a time.
+    See reconcile_schemas for how columns are matched and which columns each mode keeps.
+
+    Returns:
+        dict: Row count, column names and the schema reconciliation report
+    """
+    mappings, schema, report = reconcile_schemas([pq.read_schema(path) for path in paths], mode=mode, fuzzy_columns=fuzzy_columns)
+    rows = 0
+    with pq.ParquetWriter(out_path, schema) as writer:
+        for path, mapping in zip(paths, mappings):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows):
+                table = align_table(pa.Table.from_batches([batch]), mapping, schema)
+                writer.write_table(table)
+                rows += table.num_rows
+    return {"rows": rows, "columns": schema.names, "reconciliation": report}
@@ -0,0 +1,247 @@
+import os
+import logging
+from typing import Optional, List, Dict, Any, Tuple
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .schema import clean_column_names, column_match_key
+
+logger = logging.getLogger(__name__)
+
+# Share of the smaller side's distinct key values that must appear on the other side
+MIN_KEY_OVERLAP = 0.5
+# Distinct values compared per key candidate; larger columns are sampled
+KEY_SAMPLE_VALUES = 100000
+# Names too generic to join on just because both tables use them (orders.id = customers.id)
+GENERIC_COLUMN_NAMES = {"id", "key", "index", "name", "code", "value", "type", "description"}
+
+
+def table_names(file_names: List[str]) -> List[str]:
+    """Unique, filesystem-safe table names derived from uploaded file names."""
+    stems = [os.path.splitext(os.path.basename(name or ""))[0] for name in file_names]
+    return [name or f"table_{i}" for i, name in enumerate(clean_column_names(stems))]
+
+
+def _key_values(series: pd.Series) -> pd.Series:
+    """Key column with categoricals decoded, so merges compare values rather than codes."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(series.cat.categories.dtype)
+    return series
+
+
+def _is_key_candidate(series: pd.Series) -> bool:
+    dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_float_dtype(dtype):
+        return False
+    return True
+
+
+def _names_match(left_col: str, right_col: str, left_name: str, right_name: str) -> Optional[float]:
+    """Name score of a key pair: 1.0 for the same name, 0.75 for table-prefixed ids, else None."""
+    if column_match_key(left_col) == column_match_key(right_col) and left_col not in GENERIC_COLUMN_NAMES:
+        return 1.0
+    # orders.customer_id = customers.id and the reverse
+    for col, other_col, other_table in ((left_col, right_col, right_name), (right_col, left_col, left_name)):
+        singular = other_table[:-1] if other_table.endswith("s") else other_table
+        references = {column_match_key(f"{singular}_{other_col}"), column_match_key(f"{other_table}_{other_col}")}
+        if column_match_key(col) in references:
+            return 0.75
+    return None
+
+
+def _overlap(left: pd.Series, right: pd.Series) -> float:
+    """Share of the smaller side's distinct values that also appear on the other side."""
+    left_values = pd.Series(_key_values(left).dropna().unique())
+    right_values = pd.Series(_key_values(right).dropna().unique())
+    if left_values.empty or right_values.empty:
+        return 0.0
+    if pd.api.types.is_numeric_dtype(left_values) != pd.api.types.is_numeric_dtype(right_values):
+        left_values, right_values = left_values.astype(str), right_values.astype(str)
+    smaller, larger = sorted((left_values, right_values), key=len)
+    if len(smaller) > KEY_SAMPLE_VALUES:
+        smaller = smaller.sample(KEY_SAMPLE_VALUES, random_state=0)
+    return float(smaller.isin(larger).mean())
+
+
+def infer_join_keys(left: pd.DataFrame, right: pd.DataFrame, left_name: str, right_name: str) -> Optional[Dict[str, Any]]:
+    """Best key pair between two tables, from column names and overlap of their values.
+
+    Candidates are columns with matching names (or ``<table>_id`` style references)
+    whose distinct values overlap by at least MIN_KEY_OVERLAP. Pairs where one side is
+    unique, as in a fact table referencing a dimension table, score higher.
+
+    Returns:
+        dict: left_on, right_on, overlap and score, or None when no key is found
+    """
+    best = None
+    for left_col in left.columns:
+        if not _is_key_candidate(left[left_col]):
+            continue
+        for right_col in right.columns:
+            if not _is_key_candidate(right[right_col]):
+                continue
+            name_score = _names_match(str(left_col), str(right_col), left_name, right_name)
+            if name_score is None:
+                continue
+            overlap = _overlap(left[left_col], right[right_col])
+            if overlap < MIN_KEY_OVERLAP:
+                continue
+            unique = left[left_col].is_unique or right[right_col].is_unique
+            score = overlap + 0.5 * name_score + (0.25 if unique else 0.0)
+            if best is None or score > best["score"]:
+                best = {
+                    "left_on": str(left_col),
+                    "right_on": str(right_col),
+                    "overlap": round(overlap, 4),
+                    "score": round(score, 4)
+                }
+    return best
+
+
+def _unique_keys(series: pd.Series) -> bool:
+    """Whether a right-hand key identifies at most one row per value, so a left join keeps the row count."""
+    return _key_values(series).dropna().is_unique
+
+
+def plan_joins(tables: Dict[str, pd.DataFrame]) -> Tuple[List[Dict[str, Any]], List[str], List[Dict[str, Any]]]:
+    """Pick a join order and keys for a set of named tables.
+
+    The largest table (usually the fact table) is the base; the others are left-joined
+    onto it smallest first, each on the best key it shares with a table already joined.
+    Only many-to-one joins are planned: a key that repeats in the joined table would
+    duplicate base rows, so such a pair is skipped and reported instead.
+
+    Returns:
+        tuple: Join steps in execution order, the names of tables left unjoined and the
+        key pairs skipped because the joined table's key is not unique
+    """
+    if not tables:
+        return [], [], []
+    by_size = sorted(tables, key=lambda name: len(tables[name]), reverse=True)
+    joined = [by_size[0]]
+    remaining = sorted(by_size[1:], key=lambda name: len(tables[name]))
+    steps = []
+    non_unique = {}
+
+    progress = True
+    while remaining and progress:
+        progress = False
+        for right_name in list(remaining):
+            candidates = []
+            for left_name in joined:
+                keys = infer_join_keys(tables[left_name], tables[right_name], left_name, right_name)
+                if keys is None:
+                    continue
+                if not _unique_keys(tables[right_name][keys["right_on"]]):
+                    non_unique[right_name] = {"left": left_name, "right": right_name, **keys, "reason": "duplicate keys"}
+                    continue
+                candidates.append((keys["score"], left_name, keys))
+            if not candidates:
+                continue
+            _, left_name, keys = max(candidates, key=lambda candidate: candidate[0])
+            steps.append({"left": left_name, "right": right_name, "how": "left", **keys})
+            joined.append(right_name)
+            remaining.remove(right_name)
+            non_unique.pop(right_name, None)
+            progress = True
+
+    skipped = [non_unique[name] for name in remaining if name in non_unique]
+    if skipped:
+        logger.warning(f"Skipped joins whose key repeats in the joined table: {skipped}")
+    if remaining:
+        logger.warning(f"Tables left unjoined: {remaining}")
+    return steps, remaining, skipped
+
+
+def join_tables(tables: Dict[str, pd.DataFrame], steps: Optional[List[Dict[str, Any]]] = None) -> pd.DataFrame:
+    """Hash-join named tables following a join plan (inferred with plan_joins when omitted).
+
+    Columns of a joined table that clash with columns already in the result are
+    suffixed with the table name; the right-hand key is dropped when it duplicates
+    the left-hand one. Every join is many-to-one: a step whose right-hand key is not
+    unique, or that builds on a skipped table, is skipped with a warning.
+    """
+    if steps is None:
+        steps, _, _ = plan_joins(tables)
+    if not steps:
+        return max(tables.values(), key=len)
+
+    # Qualified "table.column" names of every column in the result, to find renamed keys
+    base = steps[0]["left"]
+    result = tables[base]
+    locations = {(base, col): col for col in result.columns}
+    for step in steps:
+        right = tables[step["right"]]
+        if (step["left"], step["left_on"]) not in locations or not _unique_keys(right[step["right_on"]]):
+            logger.warning(f"Skipping join of {step['right']} onto {step['left']}: key is not unique or left table is missing")
+            continue
+        left_key = locations[(step["left"], step["left_on"])]
+        renames = {
+            col: f"{col}_{step['right']}" for col in right.columns
+            if col != step["right_on"] and col in result.columns
+        }
+        right = right.rename(columns=renames)
+        right_key = step["right_on"]
+
+        left_values, right_values = _key_values(result[left_key]), _key_values(right[right_key])
+        if pd.api.types.is_numeric_dtype(left_values) != pd.api.types.is_numeric_dtype(right_values):
+            left_values, right_values = left_values.astype(str), right_values.astype(str)
+        left_frame = result.assign(**{left_key: left_values})
+        # Rows without a key never match, and pandas would otherwise join missing keys to each other
+        keyed = right_values.notna()
+        if right_key == left_key:
+            right_frame = right.assign(**{right_key: right_values})[keyed]
+            result = left_frame.merge(right_frame, on=left_key, how=step.get("how", "left"), validate="many_to_one")
+        else:
+            join_column = f"__join_key_{step['right']}"
+            right_frame = right.assign(**{join_column: right_values}).drop(columns=[right_key])[keyed]
+            result = left_frame.merge(
+                right_frame, left_on=left_key, right_on=join_column, how=step.get("how", "left"), validate="many_to_one"
+            )
+            result = result.drop(columns=[join_column])
+
+        for col in tables[step["right"]].columns:
+            locations[(step["right"], col)] = left_key if col == right_key else renames.get(col, col)
+    return result
+
+
+def join_parquet_files(paths: Dict[str, str], out_path: str) -> Dict[str, Any]:
+    """Join named parquet tables into one dataset file.
+
+    Returns:
+        dict: Row count, column names, the join plan, any tables left unjoined and the
+        joins skipped because their key was not unique
+    """
+    tables = {name: pq.read_table(path).to_pandas() for name, path in paths.items()}
+    steps, unjoined, skipped = plan_joins(tables)
+    joined = join_tables(tables, steps)
+    joined.to_parquet(out_path, index=False)
+    logger.info(f"Joined {len(tables)} tables into {len(joined)} rows: {steps}")
+    return {
+        "rows": len(joined),
+        "columns": [str(col) for col in joined.columns],
+        "joins": steps,
+        "unjoined": unjoined,
+        "skipped": skipped
+    }
+
+
+def describe_tables(tables: Dict[str, pd.DataFrame], steps: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Readable summary of named tables and their join keys, appended to the LLM data context."""
+    lines = ["Tables (available as tables['<name>']; df is their joined result):"]
+    for name, table in tables.items():
+        lines.append(f"- {name}: {len(table)} rows, columns: {', '.join(str(col) for col in table.columns)}")
+    if steps is not None:
+        joined = {step["left"] for step in steps} | {step["right"] for step in steps}
+        unjoined = [name for name in tables if name not in joined]
+        if joined and unjoined:
+            lines.append(f"Not joined into df (use tables['<name>'] directly): {', '.join(unjoined)}")
+    if steps:
+        lines.append("Join keys:")
+        for step in steps:
+            lines.append(
+                f"- {step['left']}.{step['left_on']} = {step['right']}.{step['right_on']} "
+                f"({step['how']} join, {step['overlap']:.0%} key overlap)"
+            )
+    return "\n".join(lines)
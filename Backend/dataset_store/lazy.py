@@ -0,0 +1,331 @@
+import logging
+import operator
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+logger = logging.getLogger(__name__)
+
+COMPARISONS = {
+    "==": operator.eq, "!=": operator.ne, ">": operator.gt,
+    ">=": operator.ge, "<": operator.lt, "<=": operator.le
+}
+# Arrow hash aggregations for pandas aggregation names; others are grouped in pandas
+ARROW_AGGREGATIONS = {
+    "sum": "sum", "mean": "mean", "count": "count", "size": "count_all",
+    "min": "min", "max": "max", "std": "stddev", "nunique": "count_distinct"
+}
+
+# (output name, column, pandas aggregation function)
+Aggregation = Tuple[str, Optional[str], str]
+
+
+def _arrow_value(value: Any, field_type: pa.DataType) -> pa.Scalar:
+    if pa.types.is_dictionary(field_type):
+        field_type = field_type.value_type
+    if pa.types.is_temporal(field_type) and isinstance(value, str):
+        value = pd.Timestamp(value).to_pydatetime()
+    return pa.scalar(value).cast(field_type)
+
+
+def condition_expression(condition: Dict[str, Any], schema: pa.Schema) -> pc.Expression:
+    """A filter condition ({"column", "operator", "value"}) as an Arrow expression.
+
+    Null handling follows pandas: rows with a null value pass "!=" and "not_in"
+    and fail every other comparison.
+
+    Raises:
+        ValueError: When the value cannot be compared with the column
+    """
+    comparison, column = condition["operator"], condition["column"]
+    field, field_type = pc.field(column), schema.field(column).type
+    if pa.types.is_dictionary(field_type):
+        # Compare category values, not dictionary indices
+        field = field.cast(field_type.value_type)
+    try:
+        if comparison == "is_null":
+            return field.is_null()
+        if comparison == "not_null":
+            return field.is_valid()
+        if comparison == "contains":
+            if not (pa.types.is_string(field_type) or pa.types.is_large_string(field_type)):
+                field = field.cast(pa.string())
+            return pc.match_substring(field, str(condition["value"]), ignore_case=True)
+        if comparison in ("in", "not_in"):
+            values = pa.array([_arrow_value(value, field_type).as_py() for value in condition["value"]])
+            expression = field.isin(values)
+            return ~expression if comparison == "not_in" else expression
+        expression = COMPARISONS[comparison](field, _arrow_value(condition["value"], field_type))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError, TypeError) as e:
+        raise ValueError(f"Cannot compare column '{column}' with {condition.get('value')!r}: {e}") from e
+    return expression | field.is_null() if comparison == "!=" else expression
+
+
+def filter_expression(conditions: List[Dict[str, Any]], schema: pa.Schema, combine: str = "and") -> pc.Expression:
+    parts = [condition_expression(condition, schema) for condition in conditions]
+    expression = parts[0]
+    for part in parts[1:]:
+        expression = (expression | part) if combine == "or" else (expression & part)
+    return expression
+
+
+def group_frame(df: pd.DataFrame, by: List[str], aggregations: List[Aggregation]) -> pd.DataFrame:
+    """Group a DataFrame and aggregate it, one output column per aggregation."""
+    if not by:
+        row = {}
+        for name, column, function in aggregations:
+            row[name] = len(df) if function == "size" else getattr(df[column], function)()
+        return pd.DataFrame([row])
+    # Named aggregation computes every output in one pass over the groups
+    named = {
+        name: (column if column is not None else by[0], function)
+        for name, column, function in aggregations
+    }
+    return df.groupby(by, as_index=False, observed=True, sort=True).agg(**named)
+
+
+def _sort_table(table: pa.Table, by: List[str]) -> pa.Table:
+    # Dictionary columns cannot be sorted directly; sort on their values
+    keys = pa.table({
+        f"_{i}": pc.cast(table[column], table[column].type.value_type)
+        if pa.types.is_dictionary(table[column].type) else table[column]
+        for i, column in enumerate(by)
+    })
+    return table.take(pc.sort_indices(keys, sort_keys=[(f"_{i}", "ascending") for i in range(len(by))]))
+
+
+def _top_k_table(table: pa.Table, column: str, k: int, descending: bool) -> pa.Table:
+    """Top-k rows of a column, ties broken by row order and nulls last, as pandas nlargest/nsmallest."""
+    keys = pa.table({"value": table[column], "row": pa.array(np.arange(table.num_rows))})
+    valid = keys.filter(pc.is_valid(keys["value"]))
+    order = "descending" if descending else "ascending"
+    selected = valid.take(pc.select_k_unstable(valid, k, sort_keys=[("value", order), ("row", "ascending")]))
+    rows = selected["row"]
+    if len(rows) < k:
+        nulls = keys.filter(pc.is_null(keys["value"]))["row"].slice(0, k - len(rows))
+        rows = pa.chunked_array(rows.chunks + nulls.chunks, type=pa.int64())
+    return table.take(rows)
+
+
+def group_table(table: pa.Table, by: List[str], aggregations: List[Aggregation]) -> pa.Table:
+    """Arrow equivalent of group_frame: null keys are dropped and groups come out sorted.
+
+    Aggregations Arrow cannot compute (median, or min/max of categories) fall back to pandas.
+    """
+    if all(function in ARROW_AGGREGATIONS for _, _, function in aggregations):
+        for column in by:
+            table = table.filter(pc.is_valid(table[column]))
+        specs = []
+        for _, column, function in aggregations:
+            if function == "size":
+                specs.append(([], "count_all"))
+            elif function == "std":
+                specs.append((column, "stddev", pc.VarianceOptions(ddof=1)))
+            else:
+                specs.append((column, ARROW_AGGREGATIONS[function]))
+        try:
+            grouped = table.group_by(by, use_threads=False).aggregate(specs)
+        except (pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            grouped = None
+        if grouped is not None:
+            # Key columns come first or last depending on the Arrow version
+            keys_first = grouped.column_names[:len(by)] == by
+            values = grouped.columns[len(by):] if keys_first else grouped.columns[:len(aggregations)]
+            # Arrow sums of no values are null; pandas sums them to 0
+            values = [
+                pc.fill_null(value, 0) if function == "sum" else value
+                for value, (_, _, function) in zip(values, aggregations)
+            ]
+            result = pa.Table.from_arrays(
+                [grouped[column] for column in by] + values,
+                names=list(by) + [name for name, _, _ in aggregations]
+            )
+            return _sort_table(result, by) if by else result
+    return pa.Table.from_pandas(group_frame(table.to_pandas(), by, aggregations), preserve_index=False)
+
+
+class LazyDataset:
+    """Deferred query over a dataset's parquet file.
+
+    Operations (select, filter, group_by, top_k, head) are recorded on a new handle
+    instead of being run. When the result is materialised only the columns the query
+    needs are read, and leading filters are handed to the parquet scanner, which skips
+    row groups whose statistics rule them out. A handle without operations is loaded
+    through ``loader`` when one is given, so whole datasets still come from the
+    registry cache. content_hash identifies the stored data; handles with operations
+    describe a different result and do not carry it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        loader: Optional[Callable[[], pd.DataFrame]] = None,
+        dtype_backend: Optional[str] = None,
+        operations: Tuple[Tuple[Any, ...], ...] = (),
+        dataset: Optional[ds.Dataset] = None,
+        content_hash: Optional[str] = None
+    ):
+        self.path = path
+        self.loader = loader
+        self.dtype_backend = dtype_backend
+        self.operations = tuple(operations)
+        self._dataset = dataset
+        self.content_hash = content_hash
+
+    @property
+    def dataset(self) -> ds.Dataset:
+        if self._dataset is None:
+            self._dataset = ds.dataset(self.path, format="parquet")
+        return self._dataset
+
+    @property
+    def source_columns(self) -> List[str]:
+        return self.dataset.schema.names
+
+    @property
+    def columns(self) -> List[str]:
+        """Columns of the query result."""
+        columns = self.source_columns
+        for operation in self.operations:
+            if operation[0] == "select":
+                columns = list(operation[1])
+            elif operation[0] == "group":
+                columns = list(operation[1]) + [name for name, _, _ in operation[2]]
+        return columns
+
+    def _derive(self, *operation: Any) -> "LazyDataset":
+        return LazyDataset(self.path, self.loader, self.dtype_backend, self.operations + (operation,), self._dataset)
+
+    def _check_columns(self, names: List[Optional[str]]) -> None:
+        columns = self.columns
+        for name in names:
+            if name is not None and name not in columns:
+                raise KeyError(f"Unknown column: {name}")
+
+    def select(self, columns: List[str]) -> "LazyDataset":
+        self._check_columns(list(columns))
+        return self._derive("select", list(columns))
+
+    def filter(self, conditions: List[Dict[str, Any]], combine: str = "and") -> "LazyDataset":
+        """Keep rows matching the conditions, in the transformation plan condition format."""
+        self._check_columns([condition["column"] for condition in conditions])
+        return self._derive("filter", list(conditions), combine)
+
+    def group_by(self, by: List[str], aggregations: List[Aggregation]) -> "LazyDataset":
+        """Group by columns (none for whole-table totals) and aggregate.
+
+        Args:
+            by: Group key columns
+            aggregations: (output name, column, function) tuples; functions use pandas
+                names (sum, mean, count, size, min, max, median, std, nunique)
+        """
+        self._check_columns(list(by) + [column for _, column, _ in aggregations])
+        return self._derive("group", list(by), list(aggregations))
+
+    def top_k(self, column: str, k: int, descending: bool = True) -> "LazyDataset":
+        """The k rows with the largest (or smallest) values of a column, in order.
+
+        Ties keep their row order and nulls come last, as with a stable pandas sort.
+        """
+        self._check_columns([column])
+        return self._derive("top_k", column, k, descending)
+
+    def head(self, n: int) -> "LazyDataset":
+        return self._derive("head", n)
+
+    def _scan(self) -> Tuple[Optional[List[str]], Optional[pc.Expression], List[Tuple[Any, ...]]]:
+        """Fold the leading filters and selects into one scan.
+
+        Returns:
+            tuple: Columns to read (None for all), the scan filter and the operations left
+        """
+        schema = self.dataset.schema
+        expression, projection, i = None, None, 0
+        while i < len(self.operations) and self.operations[i][0] in ("filter", "select"):
+            operation = self.operations[i]
+            if operation[0] == "filter":
+                part = filter_expression(operation[1], schema, operation[2])
+                expression = part if expression is None else expression & part
+            else:
+                projection = operation[1]
+            i += 1
+        remaining = list(self.operations[i:])
+
+        # Once a select or group runs, later operations only see its output
+        needed = None
+        for operation in remaining:
+            if operation[0] == "filter":
+                referenced = [condition["column"] for condition in operation[1]]
+            elif operation[0] == "top_k":
+                referenced = [operation[1]]
+            elif operation[0] == "select":
+                referenced = operation[1]
+            elif operation[0] == "group":
+                referenced = operation[1] + [column for _, column, _ in operation[2] if column is not None]
+            else:
+                continue
+            needed = (needed or []) + [column for column in referenced if column not in (needed or [])]
+            if operation[0] in ("select", "group"):
+                break
+        else:
+            needed = None
+        if needed is None:
+            return projection, expression, remaining
+        return [column for column in schema.names if column in needed], expression, remaining
+
+    def to_arrow(self) -> pa.Table:
+        """Run the query and return its result as an Arrow table."""
+        columns, expression, remaining = self._scan()
+        if remaining and all(operation[0] == "head" for operation in remaining):
+            # Stop reading once enough rows have been found
+            table = self.dataset.head(min(operation[1] for operation in remaining), columns=columns, filter=expression)
+            remaining = []
+        else:
+            table = self.dataset.to_table(columns=columns, filter=expression)
+        logger.info(
+            f"Lazy scan of {self.path}: {table.num_columns}/{len(self.source_columns)} columns, "
+            f"{table.num_rows} rows, filter {'pushed down' if expression is not None else 'none'}"
+        )
+
+        for operation in remaining:
+            if operation[0] == "filter":
+                table = table.filter(filter_expression(operation[1], table.schema, operation[2]))
+            elif operation[0] == "select":
+                table = table.select(operation[1])
+            elif operation[0] == "group":
+                table = group_table(table, operation[1], operation[2])
+            elif operation[0] == "top_k":
+                table = _top_k_table(table, *operation[1:])
+            elif operation[0] == "head":
+                table = table.slice(0, operation[1])
+        return table
+
+    def collect(self) -> pd.DataFrame:
+        """Run the query and return its result as a DataFrame."""
+        if not self.operations and self.loader is not None:
+            return self.loader()
+        return self._to_pandas(self.to_arrow())
+
+    def _to_pandas(self, table: pa.Table) -> pd.DataFrame:
+        if self.dtype_backend == "pyarrow":
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+        return table.to_pandas()
+
+    def count_rows(self) -> int:
+        """Number of result rows, from parquet metadata when only filters are recorded."""
+        if all(operation[0] in ("filter", "select") for operation in self.operations):
+            _, expression, _ = self._scan()
+            return self.dataset.count_rows(filter=expression)
+        return self.to_arrow().num_rows
+
+    def empty_frame(self) -> pd.DataFrame:
+        """Zero-row DataFrame with the source columns and dtypes, read from the schema alone."""
+        return self._to_pandas(self.dataset.schema.empty_table())
+
+    def __repr__(self) -> str:
+        steps = " -> ".join(operation[0] for operation in self.operations) or "scan"
+        return f"LazyDataset({self.path!r}: {steps})"
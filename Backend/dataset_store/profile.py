@@ -0,0 +1,282 @@
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Union
+
+import pandas as pd
+
+from .lazy import LazyDataset
+
+logger = logging.getLogger(__name__)
+
+# Columns with at most this many distinct values keep full value counts,
+# which keeps their cardinality and top categories exact across appends
+TRACKED_VALUE_LIMIT = 1000
+TOP_CATEGORIES = 5
+SAMPLE_ROWS = 5
+
+
+def frame_content_hash(df: pd.DataFrame) -> str:
+    """Content hash of an in-memory DataFrame (values and column names)."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(col) for col in df.columns]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def _json_value(value: Any) -> Any:
+    """Convert numpy/pandas scalars into JSON-serializable values."""
+    if value is None or (not isinstance(value, (list, dict, str)) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+class DatasetProfile:
+    """Summary statistics of a dataset version, computed once and reused by every prompt.
+
+    Holds dtypes, null counts, cardinality, min/max, top categories and sample rows.
+    Both the LLM data context and the dashboard widget heuristics are built from it
+    instead of rescanning the full DataFrame.
+    """
+
+    def __init__(
+        self,
+        rows: int,
+        dtypes: Dict[str, str],
+        null_counts: Dict[str, int],
+        cardinality: Dict[str, int],
+        minimums: Dict[str, Any],
+        maximums: Dict[str, Any],
+        value_counts: Dict[str, Dict[str, int]],
+        sample_rows: List[Dict[str, Any]],
+        memory_bytes: int,
+        numeric_columns: List[str],
+        datetime_columns: List[str],
+        categorical_columns: List[str],
+        approximate_cardinality: Optional[List[str]] = None,
+        content_hash: Optional[str] = None
+    ):
+        self.rows = rows
+        self.dtypes = dtypes
+        self.null_counts = null_counts
+        self.cardinality = cardinality
+        self.minimums = minimums
+        self.maximums = maximums
+        self.value_counts = value_counts
+        self.sample_rows = sample_rows
+        self.memory_bytes = memory_bytes
+        self.numeric_columns = numeric_columns
+        self.datetime_columns = datetime_columns
+        self.categorical_columns = categorical_columns
+        self.approximate_cardinality = approximate_cardinality or []
+        self.content_hash = content_hash
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.dtypes.keys())
+
+    @property
+    def top_categories(self) -> Dict[str, Dict[str, int]]:
+        """Most frequent values of each tracked categorical column."""
+        return {
+            col: dict(sorted(counts.items(), key=lambda item: item[1], reverse=True)[:TOP_CATEGORIES])
+            for col, counts in self.value_counts.items()
+        }
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, content_hash: Optional[str] = None) -> "DatasetProfile":
+        """Profile a DataFrame with one pass per statistic."""
+        df = df.rename(columns=str)
+        numeric_columns, datetime_columns, categorical_columns = [], [], []
+        for col, dtype in df.dtypes.items():
+            if pd.api.types.is_bool_dtype(dtype):
+                categorical_columns.append(col)
+            elif pd.api.types.is_numeric_dtype(dtype):
+                numeric_columns.append(col)
+            elif pd.api.types.is_datetime64_any_dtype(dtype):
+                datetime_columns.append(col)
+            else:
+                categorical_columns.append(col)
+
+        minimums, maximums = {}, {}
+        ranged_columns = numeric_columns + datetime_columns
+        if ranged_columns and len(df):
+            minimums = {col: _json_value(v) for col, v in df[ranged_columns].min().items()}
+            maximums = {col: _json_value(v) for col, v in df[ranged_columns].max().items()}
+
+        cardinality = {col: int(n) for col, n in df.nunique(dropna=True).items()}
+        value_counts = {}
+        for col in categorical_columns:
+            if cardinality[col] <= TRACKED_VALUE_LIMIT:
+                counts = df[col].value_counts(dropna=True)
+                value_counts[col] = {str(k): int(v) for k, v in counts.items()}
+
+        sample_rows = json.loads(df.head(SAMPLE_ROWS).to_json(orient="records", date_format="iso"))
+
+        return cls(
+            rows=len(df),
+            dtypes={col: str(dtype) for col, dtype in df.dtypes.items()},
+            null_counts={col: int(n) for col, n in df.isna().sum().items()},
+            cardinality=cardinality,
+            minimums=minimums,
+            maximums=maximums,
+            value_counts=value_counts,
+            sample_rows=sample_rows,
+            memory_bytes=int(df.memory_usage(deep=True).sum()),
+            numeric_columns=numeric_columns,
+            datetime_columns=datetime_columns,
+            categorical_columns=categorical_columns,
+            content_hash=content_hash
+        )
+
+    def update(self, appended: pd.DataFrame, content_hash: Optional[str] = None) -> "DatasetProfile":
+        """Fold appended rows into the profile without rescanning the existing rows.
+
+        Cardinality stays exact for columns whose value counts are tracked; for the
+        rest it becomes a lower bound and the column is listed in approximate_cardinality.
+        """
+        addition = DatasetProfile.from_frame(appended)
+        for col, dtype in addition.dtypes.items():
+            if col not in self.dtypes:
+                # New columns are entirely null in the existing rows
+                self.dtypes[col] = dtype
+                self.null_counts[col] = self.rows
+                if col in addition.numeric_columns:
+                    self.numeric_columns.append(col)
+                elif col in addition.datetime_columns:
+                    self.datetime_columns.append(col)
+                else:
+                    self.categorical_columns.append(col)
+        for col in self.dtypes:
+            self.null_counts[col] = self.null_counts.get(col, 0) + addition.null_counts.get(col, len(appended))
+
+        for col in addition.minimums:
+            if addition.minimums[col] is None:
+                continue
+            current = self.minimums.get(col)
+            self.minimums[col] = addition.minimums[col] if current is None else min(current, addition.minimums[col])
+        for col in addition.maximums:
+            if addition.maximums[col] is None:
+                continue
+            current = self.maximums.get(col)
+            self.maximums[col] = addition.maximums[col] if current is None else max(current, addition.maximums[col])
+
+        for col, added_cardinality in addition.cardinality.items():
+            if col in self.value_counts and col in addition.value_counts:
+                merged = self.value_counts[col]
+                for value, count in addition.value_counts[col].items():
+                    merged[value] = merged.get(value, 0) + count
+                if len(merged) > TRACKED_VALUE_LIMIT:
+                    del self.value_counts[col]
+                    self.approximate_cardinality.append(col)
+                self.cardinality[col] = len(merged)
+            else:
+                self.value_counts.pop(col, None)
+                self.cardinality[col] = max(self.cardinality.get(col, 0), added_cardinality)
+                if col not in self.approximate_cardinality:
+                    self.approximate_cardinality.append(col)
+
+        if len(self.sample_rows) < SAMPLE_ROWS:
+            self.sample_rows.extend(addition.sample_rows[:SAMPLE_ROWS - len(self.sample_rows)])
+        self.rows += addition.rows
+        self.memory_bytes += addition.memory_bytes
+        self.content_hash = content_hash
+        return self
+
+    def to_context(self, num_rows: int = SAMPLE_ROWS) -> str:
+        """Readable dataset summary used as the LLM data context."""
+        sample = pd.DataFrame(self.sample_rows[:num_rows], columns=self.columns)
+        missing = [f'- {col}: {count} missing' for col, count in self.null_counts.items() if count > 0]
+        context = f"""
+Dataset Overview:
+- Shape: {self.rows} rows × {len(self.dtypes)} columns
+- Columns: {', '.join(self.columns)}
+
+Data Types:
+{chr(10).join([f'- {col}: {dtype}' for col, dtype in self.dtypes.items()])}
+
+Column Analysis:
+- Numeric columns: {', '.join(self.numeric_columns) if self.numeric_columns else 'None'}
+- Categorical columns: {', '.join(self.categorical_columns) if self.categorical_columns else 'None'}
+- Datetime columns: {', '.join(self.datetime_columns) if self.datetime_columns else 'None'}
+
+Sample Data (first {num_rows} rows):
+{sample.to_string(index=False)}
+
+Missing Values:
+{chr(10).join(missing)}
+"""
+        return context.strip()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "dtypes": self.dtypes,
+            "null_counts": self.null_counts,
+            "cardinality": self.cardinality,
+            "minimums": self.minimums,
+            "maximums": self.maximums,
+            "value_counts": self.value_counts,
+            "sample_rows": self.sample_rows,
+            "memory_bytes": self.memory_bytes,
+            "numeric_columns": self.numeric_columns,
+            "datetime_columns": self.datetime_columns,
+            "categorical_columns": self.categorical_columns,
+            "approximate_cardinality": self.approximate_cardinality,
+            "content_hash": self.content_hash
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DatasetProfile":
+        return cls(**data)
+
+
+class ProfileCache:
+    """Bounded memo of dataset profiles keyed by content hash."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, DatasetProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, content_hash: str) -> Optional[DatasetProfile]:
+        with self._lock:
+            profile = self._entries.get(content_hash)
+            if profile is not None:
+                self._entries.move_to_end(content_hash)
+            return profile
+
+    def put(self, content_hash: str, profile: DatasetProfile) -> None:
+        with self._lock:
+            self._entries[content_hash] = profile
+            self._entries.move_to_end(content_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+profile_cache = ProfileCache()
+
+
+def profile_for_frame(df: Union[pd.DataFrame, LazyDataset], content_hash: Optional[str] = None) -> DatasetProfile:
+    """Return the profile of a dataset, memoised by its content hash.
+
+    The hash is the one stored when the dataset was registered (a registry handle
+    carries it), so nothing is rehashed per request and a memoised lazy dataset is
+    never read. Frames without a known hash are profiled directly, not memoised.
+    """
+    if content_hash is None and isinstance(df, LazyDataset):
+        content_hash = df.content_hash
+    frame = df.collect if isinstance(df, LazyDataset) else lambda: df
+    if content_hash is None:
+        return DatasetProfile.from_frame(frame())
+    profile = profile_cache.get(content_hash)
+    if profile is None:
+        profile = DatasetProfile.from_frame(frame(), content_hash=content_hash)
+        profile_cache.put(content_hash, profile)
+    return profile
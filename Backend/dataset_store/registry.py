@@ -0,0 +1,403 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import functools
+import hashlib
+import logging
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+
+from .cache import DataFrameCache
+from .lazy import LazyDataset
+from .profile import DatasetProfile, profile_cache
+
+logger = logging.getLogger(__name__)
+
+# Dataset ids are uuid4 hex strings; anything else is rejected before touching the filesystem
+DATASET_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Compute the sha256 of a file without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DatasetRegistry:
+    """Upload-once store of parsed datasets, kept as parquet under <base_dir>/<user_id>.
+
+    Each dataset is written as ``<dataset_id>.parquet`` next to a ``<dataset_id>.json``
+    metadata file, so later requests can reference the dataset by id instead of
+    re-uploading and re-parsing the original files. When a cache is given, hot
+    datasets are served from memory and only decoded from parquet on a miss.
+    With ``dtype_backend="pyarrow"`` datasets load into Arrow-backed pandas dtypes
+    instead of NumPy ones.
+
+    Registering data a user already has (same content hash) returns the existing
+    dataset instead of storing a copy, and with ``max_datasets`` only that many
+    datasets are kept per user, the oldest being deleted first.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        cache: Optional[DataFrameCache] = None,
+        dtype_backend: Optional[str] = None,
+        max_datasets: Optional[int] = None
+    ):
+        self.base_dir = base_dir
+        self.cache = cache
+        self.dtype_backend = dtype_backend
+        self.max_datasets = max_datasets
+        os.makedirs(self.base_dir, exist_ok=True)
+
+    def _user_dir(self, user_id: str) -> str:
+        safe_user = re.sub(r'[^\w\-]', '_', user_id or "anonymous")
+        return os.path.join(self.base_dir, safe_user)
+
+    def _validate_id(self, dataset_id: str) -> str:
+        if not dataset_id or not DATASET_ID_PATTERN.match(dataset_id):
+            raise HTTPException(status_code=400, detail=f"Invalid dataset id: {dataset_id}")
+        return dataset_id
+
+    def data_path(self, user_id: str, dataset_id: str) -> str:
+        """Path of the parquet file backing a dataset."""
+        return os.path.join(self._user_dir(user_id), f"{self._validate_id(dataset_id)}.parquet")
+
+    def _meta_path(self, user_id: str, dataset_id: str) -> str:
+        return os.path.join(self._user_dir(user_id), f"{self._validate_id(dataset_id)}.json")
+
+    def _profile_path(self, user_id: str, dataset_id: str) -> str:
+        return os.path.join(self._user_dir(user_id), f"{self._validate_id(dataset_id)}.profile.json")
+
+    def _tables_dir(self, user_id: str, dataset_id: str) -> str:
+        return os.path.join(self._user_dir(user_id), f"{self._validate_id(dataset_id)}_tables")
+
+    def register(
+        self,
+        user_id: str,
+        df: pd.DataFrame,
+        name: str,
+        source_files: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Persist a parsed DataFrame and return its metadata, including the new dataset_id.
+
+        Args:
+            user_id: Owner of the dataset
+            df: Parsed and cleaned DataFrame
+            name: Human readable dataset name (usually the uploaded file name)
+            source_files: Original uploaded file names
+
+        Returns:
+            dict: Dataset metadata as stored next to the parquet file
+        """
+        user_dir = self._user_dir(user_id)
+        os.makedirs(user_dir, exist_ok=True)
+
+        dataset_id = uuid.uuid4().hex
+        data_path = self.data_path(user_id, dataset_id)
+        df.to_parquet(data_path, index=False)
+
+        existing = self._find_duplicate(user_id, hash_file(data_path))
+        if existing is not None:
+            os.remove(data_path)
+            return existing
+
+        metadata = self._write_metadata(user_id, dataset_id, name, df.columns.tolist(), len(df), source_files)
+        self._save_profile(user_id, dataset_id, DatasetProfile.from_frame(df, content_hash=metadata["content_hash"]))
+        self._enforce_quota(user_id)
+        return metadata
+
+    def register_parquet(
+        self,
+        user_id: str,
+        parquet_path: str,
+        name: str,
+        source_files: Optional[List[str]] = None,
+        dtype_report: Optional[List[Dict[str, Any]]] = None,
+        reconciliation: Optional[Dict[str, Any]] = None,
+        tables: Optional[Dict[str, str]] = None,
+        join_plan: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Register a parquet file written by the streaming ingest path.
+
+        The file is moved into the user's directory; the profile is computed lazily on
+        first use so registration never has to load the full dataset. A dtype narrowing
+        report and a schema reconciliation report, when given, are kept in the metadata
+        as ``dtype_savings`` and ``schema_reconciliation``.
+
+        For joined uploads, tables maps each table name to its own parquet file; they are
+        kept next to the dataset (see load_tables) and join_plan is stored with them.
+        """
+        user_dir = self._user_dir(user_id)
+        os.makedirs(user_dir, exist_ok=True)
+
+        table_hashes = {table_name: hash_file(path) for table_name, path in (tables or {}).items()}
+        existing = self._find_duplicate(user_id, hash_file(parquet_path), table_hashes)
+        if existing is not None:
+            for path in [parquet_path, *(tables or {}).values()]:
+                os.remove(path)
+            return existing
+
+        dataset_id = uuid.uuid4().hex
+        os.replace(parquet_path, self.data_path(user_id, dataset_id))
+        table_info = None
+        if tables:
+            tables_dir = self._tables_dir(user_id, dataset_id)
+            os.makedirs(tables_dir, exist_ok=True)
+            table_info = {}
+            for table_name, table_path in tables.items():
+                target = os.path.join(tables_dir, f"{table_name}.parquet")
+                os.replace(table_path, target)
+                table_file = pq.ParquetFile(target)
+                table_info[table_name] = {
+                    "rows": table_file.metadata.num_rows,
+                    "columns": table_file.schema_arrow.names,
+                    "content_hash": table_hashes[table_name]
+                }
+
+        parquet_file = pq.ParquetFile(self.data_path(user_id, dataset_id))
+        metadata = self._write_metadata(
+            user_id, dataset_id, name, parquet_file.schema_arrow.names, parquet_file.metadata.num_rows, source_files,
+            dtype_report=dtype_report, reconciliation=reconciliation, tables=table_info, join_plan=join_plan
+        )
+        self._enforce_quota(user_id)
+        return metadata
+
+    def _find_duplicate(
+        self, user_id: str, content_hash: str, table_hashes: Optional[Dict[str, str]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Metadata of a dataset the user already has with the same content, if any."""
+        for info in self.list(user_id):
+            stored_tables = {
+                table_name: table_info["content_hash"] for table_name, table_info in (info.get("tables") or {}).items()
+            }
+            if info.get("content_hash") == content_hash and stored_tables == (table_hashes or {}):
+                logger.info(f"Reusing dataset {info['dataset_id']} for user {user_id}: identical content")
+                return info
+        return None
+
+    def _enforce_quota(self, user_id: str) -> None:
+        """Delete a user's oldest datasets beyond max_datasets."""
+        if not self.max_datasets:
+            return
+        for info in self.list(user_id)[self.max_datasets:]:
+            self.delete(user_id, info["dataset_id"])
+
+    def _rows_table(self, rows: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+        """Appended rows cast to the stored schema; rows that do not fit a column's type are rejected."""
+        arrays, mismatched = [], []
+        for field in schema:
+            values = rows[field.name]
+            if values.isna().all():
+                arrays.append(pa.nulls(len(rows), type=field.type))
+                continue
+            try:
+                arrays.append(pa.array(values, from_pandas=True).cast(field.type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                mismatched.append(f"{field.name} ({field.type})")
+        if mismatched:
+            raise HTTPException(status_code=400, detail=f"Rows do not fit the column types: {mismatched}")
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def append_rows(self, user_id: str, dataset_id: str, rows: pd.DataFrame) -> Dict[str, Any]:
+        """Append rows to a dataset, updating its profile incrementally instead of re-profiling.
+
+        Rows may leave out columns (they are stored as missing) but not add new ones, and
+        are cast to the stored column types so narrowed dtypes survive the append. They
+        are written as a new row group after the existing ones, which are copied one at a
+        time rather than loaded. Joined datasets are rejected because their source tables
+        would fall out of step.
+        """
+        info = self.get_info(user_id, dataset_id)
+        if info.get("tables"):
+            raise HTTPException(status_code=400, detail="Rows cannot be appended to a joined dataset")
+        unknown = [str(col) for col in rows.columns if str(col) not in info["columns"]]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown columns: {unknown}")
+        rows = rows.rename(columns=str).reindex(columns=info["columns"])
+
+        data_path = self.data_path(user_id, dataset_id)
+        profile = self.get_profile(user_id, dataset_id)
+        tmp_path = f"{data_path}.tmp"
+        with pq.ParquetFile(data_path) as source:
+            appended = self._rows_table(rows, source.schema_arrow)
+            with pq.ParquetWriter(tmp_path, source.schema_arrow) as writer:
+                for i in range(source.num_row_groups):
+                    writer.write_table(source.read_row_group(i))
+                writer.write_table(appended)
+        os.replace(tmp_path, data_path)
+        if self.cache is not None:
+            self.cache.invalidate(dataset_id)
+
+        metadata = self._write_metadata(
+            user_id, dataset_id, info["name"], info["columns"], info["rows"] + appended.num_rows, info.get("source_files"),
+            dtype_report=(info.get("dtype_savings") or {}).get("columns"),
+            reconciliation=info.get("schema_reconciliation"), tables=info.get("tables"), join_plan=info.get("join_plan")
+        )
+        # Profiles are shared through the memo, so update a private copy
+        updated = DatasetProfile.from_dict(json.loads(json.dumps(profile.to_dict())))
+        self._save_profile(user_id, dataset_id, updated.update(appended.to_pandas(), content_hash=metadata["content_hash"]))
+        return metadata
+
+    def _write_metadata(
+        self,
+        user_id: str,
+        dataset_id: str,
+        name: str,
+        columns: List[str],
+        rows: int,
+        source_files: Optional[List[str]] = None,
+        dtype_report: Optional[List[Dict[str, Any]]] = None,
+        reconciliation: Optional[Dict[str, Any]] = None,
+        tables: Optional[Dict[str, Any]] = None,
+        join_plan: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        data_path = self.data_path(user_id, dataset_id)
+        metadata = {
+            "dataset_id": dataset_id,
+            "name": name,
+            "columns": [str(col) for col in columns],
+            "rows": int(rows),
+            "source_files": source_files or [name],
+            "content_hash": hash_file(data_path),
+            "size": os.path.getsize(data_path),
+            "created": datetime.now().isoformat()
+        }
+        if dtype_report:
+            metadata["dtype_savings"] = {
+                "bytes_before": sum(entry["bytes_before"] for entry in dtype_report),
+                "bytes_after": sum(entry["bytes_after"] for entry in dtype_report),
+                "columns": dtype_report
+            }
+        if reconciliation:
+            metadata["schema_reconciliation"] = reconciliation
+        if tables:
+            metadata["tables"] = tables
+            metadata["join_plan"] = join_plan
+        with open(self._meta_path(user_id, dataset_id), 'w') as f:
+            json.dump(metadata, f)
+
+        logger.info(f"Registered dataset {dataset_id} for user {user_id}: {rows} rows, {len(columns)} columns")
+        return metadata
+
+    def _save_profile(self, user_id: str, dataset_id: str, profile: DatasetProfile) -> None:
+        with open(self._profile_path(user_id, dataset_id), 'w') as f:
+            json.dump(profile.to_dict(), f)
+        profile_cache.put(profile.content_hash, profile)
+
+    def get_profile(self, user_id: str, dataset_id: str) -> DatasetProfile:
+        """Return the dataset profile, memoised by content hash and persisted next to the data."""
+        info = self.get_info(user_id, dataset_id)
+        content_hash = info.get("content_hash")
+        profile = profile_cache.get(content_hash)
+        if profile is not None:
+            return profile
+
+        profile_path = self._profile_path(user_id, dataset_id)
+        if os.path.exists(profile_path):
+            with open(profile_path, 'r') as f:
+                profile = DatasetProfile.from_dict(json.load(f))
+            if profile.content_hash == content_hash:
+                profile_cache.put(content_hash, profile)
+                return profile
+
+        profile = DatasetProfile.from_frame(self.load(user_id, dataset_id), content_hash=content_hash)
+        self._save_profile(user_id, dataset_id, profile)
+        return profile
+
+    def get_info(self, user_id: str, dataset_id: str) -> Dict[str, Any]:
+        """Return the stored metadata of a dataset, raising 404 if it does not exist."""
+        meta_path = self._meta_path(user_id, dataset_id)
+        if not os.path.exists(meta_path) or not os.path.exists(self.data_path(user_id, dataset_id)):
+            raise HTTPException(status_code=404, detail=f"Dataset not found: {dataset_id}")
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+
+    def load(self, user_id: str, dataset_id: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read a registered dataset, from the in-memory cache when possible.
+
+        Frames returned from the cache are shared and must not be mutated in place.
+        """
+        info = self.get_info(user_id, dataset_id)
+        data_path = self.data_path(user_id, dataset_id)
+        read_options = {"dtype_backend": self.dtype_backend} if self.dtype_backend else {}
+        if self.cache is None:
+            return pd.read_parquet(data_path, columns=columns, **read_options)
+
+        cache_key = (dataset_id, info.get("content_hash"))
+        df = self.cache.get_or_load(cache_key, lambda: pd.read_parquet(data_path, **read_options))
+        return df[columns] if columns is not None else df
+
+    def lazy(self, user_id: str, dataset_id: str) -> LazyDataset:
+        """Deferred handle on a registered dataset that reads only what its query needs.
+
+        A handle collected without any recorded operations loads through load, and so
+        through the cache.
+        """
+        info = self.get_info(user_id, dataset_id)
+        return LazyDataset(
+            self.data_path(user_id, dataset_id),
+            loader=functools.partial(self.load, user_id, dataset_id),
+            dtype_backend=self.dtype_backend,
+            content_hash=info.get("content_hash")
+        )
+
+    def load_tables(self, user_id: str, dataset_id: str) -> Dict[str, pd.DataFrame]:
+        """Read the named tables a joined dataset was built from (empty for single-table datasets).
+
+        Like load, frames come from the shared cache and must not be mutated in place.
+        """
+        info = self.get_info(user_id, dataset_id)
+        tables_dir = self._tables_dir(user_id, dataset_id)
+        read_options = {"dtype_backend": self.dtype_backend} if self.dtype_backend else {}
+        tables = {}
+        for table_name, table_info in (info.get("tables") or {}).items():
+            path = os.path.join(tables_dir, f"{table_name}.parquet")
+            loader = functools.partial(pd.read_parquet, path, **read_options)
+            if self.cache is None:
+                tables[table_name] = loader()
+            else:
+                tables[table_name] = self.cache.get_or_load((dataset_id, table_info["content_hash"], table_name), loader)
+        return tables
+
+    def list(self, user_id: str) -> List[Dict[str, Any]]:
+        """List metadata of every dataset owned by a user, newest first."""
+        user_dir = self._user_dir(user_id)
+        datasets = []
+        if os.path.exists(user_dir):
+            for filename in os.listdir(user_dir):
+                dataset_id, extension = os.path.splitext(filename)
+                if extension != '.json' or not DATASET_ID_PATTERN.match(dataset_id):
+                    continue
+                try:
+                    datasets.append(self.get_info(user_id, dataset_id))
+                except HTTPException:
+                    logger.warning(f"Skipping incomplete dataset {dataset_id} for user {user_id}")
+        datasets.sort(key=lambda d: d.get("created", ""), reverse=True)
+        return datasets
+
+    def delete(self, user_id: str, dataset_id: str) -> None:
+        """Remove a dataset and its metadata."""
+        self.get_info(user_id, dataset_id)
+        if self.cache is not None:
+            self.cache.invalidate(dataset_id)
+        for path in (
+            self.data_path(user_id, dataset_id),
+            self._meta_path(user_id, dataset_id),
+            self._profile_path(user_id, dataset_id)
+        ):
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(self._tables_dir(user_id, dataset_id), ignore_errors=True)
+        logger.info(f"Deleted dataset {dataset_id} for user {user_id}")
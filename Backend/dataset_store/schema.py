@@ -0,0 +1,320 @@
+import re
+import difflib
+import logging
+from collections import defaultdict
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+import pandas as pd
+import pyarrow as pa
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# How columns of files with different schemas are combined
+SCHEMA_MODES = ("union", "intersection", "strict")
+
+# Precompiled normalisation rules
+PUNCTUATION = re.compile(r'[^\w\s]')
+WHITESPACE = re.compile(r'\s+')
+SEPARATORS = re.compile(r'[_\s-]+')
+DIGITS = re.compile(r'\d+')
+
+# Minimum difflib similarity for two column names to be reported as possibly the same column
+FUZZY_MATCH_THRESHOLD = 0.85
+
+
+def clean_column_name(col: Any) -> str:
+    """Normalise a column name: strip punctuation, lowercase, spaces to underscores."""
+    return WHITESPACE.sub('_', PUNCTUATION.sub('', str(col)).strip().lower())
+
+
+def clean_column_names(names: Iterable[Any]) -> List[str]:
+    """Normalise column names in one vectorized pass: strip punctuation, lowercase, spaces to underscores.
+
+    Names that collide after cleaning get a numeric suffix so the result stays unique.
+    """
+    cleaned = (
+        pd.Index(list(names), dtype=object).astype(str)
+        .str.replace(PUNCTUATION, '', regex=True)
+        .str.strip()
+        .str.lower()
+        .str.replace(WHITESPACE, '_', regex=True)
+    )
+    seen: Dict[str, int] = defaultdict(int)
+    unique = []
+    for name in cleaned:
+        unique.append(f"{name}_{seen[name]}" if seen[name] else name)
+        seen[name] += 1
+    return unique
+
+
+def column_match_key(name: str) -> str:
+    """Column name lowercased with separators removed, so Order_Date and orderdate compare equal."""
+    return SEPARATORS.sub('', name.lower())
+
+
+def _exact_match(name: str, candidates: List[str]) -> Optional[str]:
+    """Candidate equal to a column name up to case and separators, or None."""
+    key = column_match_key(name)
+    for candidate in candidates:
+        if column_match_key(candidate) == key:
+            return candidate
+    return None
+
+
+def _fuzzy_match(name: str, candidates: List[str]) -> Optional[str]:
+    """Most similar candidate to a column name by difflib ratio, or None below the threshold.
+
+    Similar names are often different columns (male_count and female_count), so fuzzy
+    matches are only applied when asked for. Names whose numbers differ never match.
+    """
+    key = column_match_key(name)
+    digits = DIGITS.findall(name)
+    best, best_ratio = None, FUZZY_MATCH_THRESHOLD
+    for candidate in candidates:
+        if DIGITS.findall(candidate) != digits:
+            continue
+        ratio = difflib.SequenceMatcher(None, key, column_match_key(candidate)).ratio()
+        if ratio >= best_ratio:
+            best, best_ratio = candidate, ratio
+    return best
+
+
+# Time units from coarsest to finest
+TIME_UNITS = ("s", "ms", "us", "ns")
+
+
+def _finest_unit(types: List[pa.DataType]) -> str:
+    return max((t.unit for t in types), key=TIME_UNITS.index, default="us")
+
+
+def _unify_timestamp(types: List[pa.DataType]) -> pa.DataType:
+    """Timestamp type holding every value of the given timestamps at the finest unit present.
+
+    Time zones are kept when every column shares one. Otherwise values are converted
+    to UTC, and timezone-naive values are read as UTC.
+    """
+    zones = {t.tz for t in types}
+    tz = zones.pop() if len(zones) == 1 else "UTC"
+    return pa.timestamp(_finest_unit(types), tz=tz)
+
+
+def _unify_type(types: List[pa.DataType]) -> pa.DataType:
+    """Common type of a column across files, without falling back to Python objects."""
+    types = [t.value_type if pa.types.is_dictionary(t) else t for t in types]
+    types = [t for t in types if not pa.types.is_null(t)]
+    if not types:
+        return pa.null()
+    if all(t == types[0] for t in types):
+        return types[0]
+    if all(pa.types.is_integer(t) for t in types):
+        return pa.int64()
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+        return pa.float64()
+    if all(pa.types.is_date(t) for t in types):
+        return pa.date32()
+    if all(pa.types.is_timestamp(t) or pa.types.is_date(t) for t in types):
+        return _unify_timestamp([t for t in types if pa.types.is_timestamp(t)])
+    if all(pa.types.is_duration(t) for t in types):
+        return pa.duration(_finest_unit(types))
+    if all(pa.types.is_boolean(t) for t in types):
+        return pa.bool_()
+    return pa.large_string()
+
+
+class ColumnTypeError(ValueError):
+    """Columns of a later batch do not fit the schema taken from the first one.
+
+    columns maps each such column to the wider type (or, for a column the schema
+    lacks, the type) it should be read as when the file is streamed again.
+    """
+
+    def __init__(self, columns: Dict[str, pa.DataType]):
+        super().__init__(f"Columns changed type: {columns}")
+        self.columns = columns
+
+
+def batch_schema(schema: pa.Schema, column_types: Optional[Dict[str, pa.DataType]] = None) -> pa.Schema:
+    """Schema for a streamed file: the first batch's, with column_types overriding and adding columns."""
+    column_types = column_types or {}
+    fields = [pa.field(field.name, column_types.get(field.name, field.type)) for field in schema]
+    fields += [pa.field(name, column_type) for name, column_type in column_types.items() if name not in schema.names]
+    return pa.schema(fields)
+
+
+def _cast_column(column: pa.ChunkedArray, target: pa.DataType) -> pa.ChunkedArray:
+    if pa.types.is_dictionary(column.type) and not pa.types.is_dictionary(target):
+        column = column.cast(column.type.value_type)
+    return column.cast(target)
+
+
+def conform_table(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Cast a streamed batch to the file's schema, filling missing columns with nulls.
+
+    Raises:
+        ColumnTypeError: When a column needs a wider type or is not in the schema
+    """
+    changed = {}
+    for field in table.schema:
+        if schema.get_field_index(field.name) < 0:
+            changed[field.name] = _unify_type([field.type])
+            continue
+        target = schema.field(field.name).type
+        widened = _unify_type([target, field.type])
+        if widened != target and not (pa.types.is_dictionary(target) and widened == target.value_type):
+            changed[field.name] = widened
+    if changed:
+        raise ColumnTypeError(changed)
+
+    arrays = [
+        _cast_column(table.column(field.name), field.type) if field.name in table.column_names
+        else pa.nulls(table.num_rows, type=field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def reconcile_schemas(
+    schemas: List[pa.Schema],
+    mode: str = "union",
+    fuzzy_columns: bool = False
+) -> Tuple[List[Dict[str, str]], pa.Schema, Dict[str, Any]]:
+    """Match the columns of several files and pick one schema for their combination.
+
+    Column names are matched across files exactly, then ignoring case and separators,
+    and renamed to the name used by the first file that has them. Names that are only
+    similar are reported under "similar" and kept apart, unless fuzzy_columns is set;
+    then they are matched too and reported under "fuzzy_renamed".
+    Each column gets one common Arrow type so nothing is upcast to object.
+
+    Args:
+        schemas: Schemas of the files to combine, in upload order
+        mode: "union" keeps every column (nulls where a file lacks it), "intersection"
+            keeps only columns present in every file, "strict" rejects files whose
+            columns differ
+        fuzzy_columns: Also match column names by fuzzy similarity
+
+    Returns:
+        tuple: Per file, a mapping of its column names to combined names; the combined
+        schema; and a report of renamed, similar, dropped and cast columns
+    """
+    if mode not in SCHEMA_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid schema mode: {mode}, expected one of {list(SCHEMA_MODES)}")
+
+    canonical: List[str] = []
+    renamed: Dict[str, str] = {}
+    fuzzy_renamed: Dict[str, str] = {}
+    similar: Dict[str, str] = {}
+    mappings = []
+    for schema in schemas:
+        # Exact matches first, so a near-miss cannot claim a column another name matches exactly
+        known = list(canonical)
+        mapping = {name: name for name in schema.names if name in known}
+        for name in schema.names:
+            if name in mapping:
+                continue
+            candidates = [c for c in known if c not in mapping.values()]
+            target = _exact_match(name, candidates)
+            if target is not None:
+                renamed[name] = target
+            else:
+                target = _fuzzy_match(name, candidates)
+                if target is not None and fuzzy_columns:
+                    fuzzy_renamed[name] = target
+                else:
+                    if target is not None:
+                        similar[name] = target
+                    target = name
+                    canonical.append(name)
+            mapping[name] = target
+        mappings.append(mapping)
+
+    present = [set(mapping.values()) for mapping in mappings]
+    common = [name for name in canonical if all(name in columns for columns in present)]
+    if mode == "strict" and len(common) != len(canonical):
+        mismatched = sorted(set(canonical) - set(common))
+        raise HTTPException(status_code=400, detail=f"Uploaded files have different columns: {mismatched}")
+    columns = common if mode == "intersection" else canonical
+
+    types = defaultdict(list)
+    for schema, mapping in zip(schemas, mappings):
+        for field in schema:
+            types[mapping[field.name]].append(field.type)
+    unified = pa.schema([(name, _unify_type(types[name])) for name in columns])
+    cast_columns = {
+        field.name: str(field.type) for field in unified
+        if any(column_type != field.type for column_type in types[field.name])
+    }
+
+    report = {
+        "mode": mode,
+        "renamed": renamed,
+        "fuzzy_renamed": fuzzy_renamed,
+        "similar": similar,
+        "dropped": [name for name in canonical if name not in columns],
+        "cast": cast_columns
+    }
+    if similar:
+        logger.warning(f"Kept similarly named columns apart (pass fuzzy_columns to match them): {similar}")
+    if renamed or fuzzy_renamed or report["dropped"] or cast_columns:
+        logger.info(f"Reconciled {len(schemas)} file schemas: {report}")
+    return mappings, unified, report
+
+
+def align_table(table: pa.Table, mapping: Dict[str, str], schema: pa.Schema) -> pa.Table:
+    """Rename a file's columns per reconcile_schemas and cast them to the combined schema."""
+    table = table.rename_columns([mapping[name] for name in table.column_names])
+    arrays = [
+        _cast_column(table.column(field.name), field.type) if field.name in table.column_names
+        else pa.nulls(table.num_rows, type=field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def reconcile_tables(
+    tables: List[pa.Table],
+    mode: str = "union",
+    fuzzy_columns: bool = False
+) -> Tuple[pa.Table, Dict[str, Any]]:
+    """Align the schemas of several tables and stack them.
+
+    See reconcile_schemas for how columns are matched and which columns each mode keeps.
+
+    Returns:
+        tuple: The combined table and a report of renamed, similar, dropped and cast columns
+    """
+    mappings, schema, report = reconcile_schemas([table.schema for table in tables], mode=mode, fuzzy_columns=fuzzy_columns)
+    return pa.concat_tables([align_table(table, mapping, schema) for table, mapping in zip(tables, mappings)]), report
+
+
+def test_unify_temporal_types():
+    """Timestamps of different units and time zones reconcile without losing values."""
+    naive = pa.table({"at": pa.array([1_700_000_000_123_456_789], type=pa.timestamp("ns"))})
+    aware = pa.table({"at": pa.array([1_700_000_000_000_000], type=pa.timestamp("us", tz="Europe/Paris"))})
+    combined, report = reconcile_tables([naive, aware])
+    assert combined.schema.field("at").type == pa.timestamp("ns", tz="UTC"), combined.schema
+    assert combined.column("at").cast(pa.int64()).to_pylist() == [1_700_000_000_123_456_789, 1_700_000_000_000_000_000]
+    assert report["cast"] == {"at": "timestamp[ns, tz=UTC]"}
+
+    same_zone = pa.table({"at": pa.array([0], type=pa.timestamp("s", tz="Europe/Paris"))})
+    combined, _ = reconcile_tables([aware, same_zone])
+    assert combined.schema.field("at").type == pa.timestamp("us", tz="Europe/Paris")
+
+    dates = pa.table({"at": pa.array([19000], type=pa.date32())})
+    combined, _ = reconcile_tables([dates, naive])
+    assert combined.schema.field("at").type == pa.timestamp("ns")
+    assert combined.column("at").to_pylist()[0].date().isoformat() == "2022-01-08"
+
+    schema = batch_schema(naive.schema)
+    try:
+        conform_table(aware, schema)
+    except ColumnTypeError as e:
+        assert e.columns == {"at": pa.timestamp("ns", tz="UTC")}
+    else:
+        raise AssertionError("a time zone change must widen the column")
+    print("test_unify_temporal_types passed")
+
+
+if __name__ == "__main__":
+    test_unify_temporal_types()
@@ -0,0 +1,143 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    """Stable fingerprint of a DataFrame's schema (column names and dtypes, in order).
+
+    Two uploads with the same columns and types share a fingerprint regardless of
+    their row values, which is what makes LLM responses reusable between them.
+    """
+    schema = [[str(col), str(dtype)] for col, dtype in df.dtypes.items()]
+    return hashlib.sha256(json.dumps(schema).encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier cache of LLM responses: an in-memory LRU with an optional SQLite tier.
+
+    Entries expire after ttl_seconds. The memory tier is bounded by max_entries and
+    the SQLite tier by max_disk_entries, both evicting least recently used first.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 24 * 60 * 60,
+        sqlite_path: Optional[str] = None,
+        max_disk_entries: int = 10000
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, latency REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(prompt: str, model: str, temperature: float, json_output: bool = False) -> str:
+        """Cache key for a formatted prompt and the model settings it is sent with.
+
+        json_output is part of the key because JSON mode changes the response format.
+        """
+        payload = json.dumps({"prompt": prompt, "model": model, "temperature": temperature, "json_output": json_output})
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached response, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, expires_at, latency = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.saved_seconds += latency
+                    return response
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT response, expires_at, latency FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._put_memory(key, row[0], row[1], row[2])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self.saved_seconds += row[2]
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: str, latency: float = 0.0) -> None:
+        """Store a response together with the latency it took to produce."""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._put_memory(key, response, expires_at, latency)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, expires_at, latency, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, response, expires_at, latency, now)
+                )
+                self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+                self._db.execute(
+                    "DELETE FROM llm_cache WHERE key NOT IN "
+                    "(SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT ?)",
+                    (self.max_disk_entries,)
+                )
+                self._db.commit()
+
+    def _put_memory(self, key: str, response: str, expires_at: float, latency: float) -> None:
+        self._memory[key] = (response, expires_at, latency)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and the LLM latency saved by cache hits."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "sqlite_enabled": self._db is not None
+            }
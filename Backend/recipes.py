@@ -0,0 +1,183 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+PROMPT_WHITESPACE = re.compile(r'\s+')
+PROMPT_EDGE_PUNCTUATION = re.compile(r'^[\s\.\?!,;:]+|[\s\.\?!,;:]+$')
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Prompt with case, repeated whitespace and surrounding punctuation ignored."""
+    return PROMPT_EDGE_PUNCTUATION.sub('', PROMPT_WHITESPACE.sub(' ', prompt.lower()))
+
+
+class AnalysisRecipe:
+    """Validated output of the agent workflow for one user's prompt against one schema.
+
+    Holds the intent, chart configuration and generated code or transformation plan, so
+    the same analysis can be re-run against any dataset with the same schema fingerprint
+    without LLM calls. Only the user who created a recipe can run or delete it.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        schema_fingerprint: str,
+        prompt: str,
+        intent: str,
+        intent_details: Optional[Dict[str, Any]] = None,
+        chart_config: Optional[Dict[str, Any]] = None,
+        code: Optional[str] = None,
+        transformation_plan: Optional[Dict[str, Any]] = None,
+        created_at: Optional[float] = None,
+        runs: int = 0,
+        user_id: Optional[str] = None
+    ):
+        self.key = key
+        self.schema_fingerprint = schema_fingerprint
+        self.prompt = prompt
+        self.intent = intent
+        self.intent_details = intent_details
+        self.chart_config = chart_config
+        self.code = code
+        self.transformation_plan = transformation_plan
+        self.created_at = created_at or time.time()
+        self.runs = runs
+        self.user_id = user_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "schema_fingerprint": self.schema_fingerprint,
+            "prompt": self.prompt,
+            "intent": self.intent,
+            "intent_details": self.intent_details,
+            "chart_config": self.chart_config,
+            "code": self.code,
+            "transformation_plan": self.transformation_plan,
+            "created_at": self.created_at,
+            "runs": self.runs,
+            "user_id": self.user_id
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AnalysisRecipe":
+        return cls(**data)
+
+
+class RecipeStore:
+    """Analysis recipes keyed by owner, schema fingerprint and normalised prompt.
+
+    Recipes live in an in-memory LRU bounded by max_entries, with an optional SQLite
+    table so they survive restarts, bounded by max_disk_entries. Both evict the least
+    recently used recipes first. Only runs that executed without error are stored.
+    """
+
+    def __init__(self, max_entries: int = 1024, sqlite_path: Optional[str] = None, max_disk_entries: int = 10000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, AnalysisRecipe]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_recipes ("
+                "key TEXT PRIMARY KEY, recipe TEXT NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(user_id: Optional[str], schema_fingerprint: str, prompt: str) -> str:
+        """Recipe key for a user, a schema and a prompt, ignoring cosmetic differences in the prompt."""
+        payload = json.dumps({"user": user_id, "schema": schema_fingerprint, "prompt": normalize_prompt(prompt)})
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, user_id: Optional[str] = None, count: bool = True) -> Optional[AnalysisRecipe]:
+        """Return a recipe stored by user_id, or None when the user has none for the key."""
+        with self._lock:
+            recipe = self._memory.get(key)
+            if recipe is None and self._db is not None:
+                row = self._db.execute("SELECT recipe FROM analysis_recipes WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    recipe = AnalysisRecipe.from_dict(json.loads(row[0]))
+                    self._put_memory(recipe)
+            if recipe is not None and recipe.user_id != user_id:
+                # Another user's recipe counts as missing
+                recipe = None
+            if count:
+                if recipe is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            if recipe is not None:
+                self._memory.move_to_end(key)
+                if self._db is not None:
+                    self._db.execute("UPDATE analysis_recipes SET last_access = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+            return recipe
+
+    def put(self, recipe: AnalysisRecipe) -> None:
+        with self._lock:
+            self._put_memory(recipe)
+            self._write(recipe)
+
+    def record_run(self, recipe: AnalysisRecipe) -> None:
+        """Count a re-run of a recipe."""
+        with self._lock:
+            recipe.runs += 1
+            self._write(recipe)
+
+    def _write(self, recipe: AnalysisRecipe) -> None:
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO analysis_recipes (key, recipe, last_access) VALUES (?, ?, ?)",
+            (recipe.key, json.dumps(recipe.to_dict(), default=str), time.time())
+        )
+        self._db.execute(
+            "DELETE FROM analysis_recipes WHERE key NOT IN "
+            "(SELECT key FROM analysis_recipes ORDER BY last_access DESC LIMIT ?)",
+            (self.max_disk_entries,)
+        )
+        self._db.commit()
+
+    def _put_memory(self, recipe: AnalysisRecipe) -> None:
+        self._memory[recipe.key] = recipe
+        self._memory.move_to_end(recipe.key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def delete(self, key: str, user_id: Optional[str] = None) -> bool:
+        """Delete a recipe stored by user_id; returns False when the user has none for the key."""
+        if self.get(key, user_id=user_id, count=False) is None:
+            return False
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM analysis_recipes WHERE key = ?", (key,))
+                self._db.commit()
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Recipe hit rate; every hit is a prompt answered without calling the LLM."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "sqlite_enabled": self._db is not None
+            }
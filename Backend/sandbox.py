@@ -0,0 +1,436 @@
+import os
+import time
+import uuid
+import queue
+import atexit
+import shutil
+import signal
+import asyncio
+import logging
+import resource
+import tempfile
+import functools
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple, Union
+
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+from scipy import stats
+
+from dataset_store import LazyDataset, join_tables
+
+logger = logging.getLogger(__name__)
+
+# Datasets kept loaded inside each worker between executions
+WORKER_FRAME_CACHE = 4
+# Seconds a freshly spawned worker may take to import its libraries
+WORKER_STARTUP_SECONDS = 60
+# Compiled code objects kept per process, so re-run recipes skip parsing and compiling
+COMPILED_CODE_CACHE_SIZE = 256
+
+
+def enable_copy_on_write() -> None:
+    """Turn on pandas copy-on-write, so generated code can be handed shallow copies.
+
+    With copy-on-write a shallow copy shares every column with the original and only
+    the columns the code modifies are copied. It is always on from pandas 3.0.
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+enable_copy_on_write()
+
+
+@functools.lru_cache(maxsize=COMPILED_CODE_CACHE_SIZE)
+def compile_generated_code(code: str):
+    """Compile generated code once per process; raises SyntaxError for invalid code."""
+    return compile(code, "<generated>", "exec")
+
+
+class CPUTimeExceeded(Exception):
+    """Raised inside a worker when generated code uses up its CPU time budget."""
+
+
+def execute_generated_code(
+    code: str,
+    intent: str,
+    df: pd.DataFrame,
+    tables: Optional[Dict[str, pd.DataFrame]] = None
+) -> Dict[str, Any]:
+    """Run generated code against a DataFrame and extract its result for the given intent.
+
+    Transformations must leave a 'transformed_df' and statistical code a 'stat_result';
+    when they do not, a basic fallback result is produced instead.
+
+    Returns:
+        dict: The JSON-serializable result and an error message (None on success)
+    """
+    # Shallow copies: with copy-on-write, columns are only copied when the code modifies them
+    local_vars = {
+        'pd': pd,
+        'np': np,
+        'stats': stats,
+        'df': df.copy(deep=False),
+        'tables': {name: table.copy(deep=False) for name, table in (tables or {}).items()},
+        'join_tables': join_tables
+    }
+    exec(compile_generated_code(code), {}, local_vars)
+
+    result, error = None, None
+    if intent == "transformation":
+        if "transformed_df" in local_vars:
+            transformed_df = local_vars["transformed_df"]
+            if isinstance(transformed_df, pd.DataFrame):
+                result = transformed_df.to_dict('records')
+            else:
+                try:
+                    result = pd.DataFrame(transformed_df).to_dict('records')
+                except Exception:
+                    error = "Transformation result is not a valid DataFrame"
+        else:
+            logger.warning("Transformation code did not create 'transformed_df', using fallback")
+            try:
+                result = local_vars["df"].to_dict('records')
+            except Exception as fallback_error:
+                error = f"Transformation failed and fallback also failed: {str(fallback_error)}"
+
+    elif intent == "statistical":
+        if "stat_result" in local_vars:
+            stat_result = local_vars["stat_result"]
+            if isinstance(stat_result, pd.DataFrame):
+                result = stat_result.to_dict('records')
+            elif isinstance(stat_result, dict):
+                result = stat_result
+            else:
+                result = str(stat_result)
+        else:
+            logger.warning("Statistical code did not create 'stat_result', using fallback")
+            try:
+                fallback_result = local_vars["df"].describe()
+                if isinstance(fallback_result, pd.DataFrame):
+                    result = fallback_result.to_dict('records')
+                else:
+                    result = str(fallback_result)
+            except Exception as fallback_error:
+                error = f"Statistical analysis failed and fallback also failed: {str(fallback_error)}"
+
+    return {"result": result, "error": error}
+
+
+def _reset_peak_rss() -> None:
+    # Writing 5 to clear_refs resets VmHWM so each execution reports its own peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _load_frame(frames: "OrderedDict[str, pd.DataFrame]", path: str) -> pd.DataFrame:
+    """Map an Arrow IPC file into memory, keeping the last few datasets loaded."""
+    df = frames.get(path)
+    if df is None:
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        df = table.to_pandas(split_blocks=True)
+        frames[path] = df
+        while len(frames) > WORKER_FRAME_CACHE:
+            frames.popitem(last=False)
+    frames.move_to_end(path)
+    return df
+
+
+def _raise_cpu_exceeded(signum, frame):
+    raise CPUTimeExceeded()
+
+
+def _worker_main(conn, cpu_seconds: int, memory_bytes: int) -> None:
+    """Worker loop: execute tasks from the pipe under CPU time and address space limits."""
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    signal.signal(signal.SIGXCPU, _raise_cpu_exceeded)
+    _, cpu_hard_limit = resource.getrlimit(resource.RLIMIT_CPU)
+    frames: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+    # Libraries are imported by now; tell the pool the worker is warm
+    conn.send("ready")
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # SIGXCPU once this execution has used cpu_seconds; the pool's wall-clock timeout
+        # kills the worker if the code never gets back to the interpreter to handle it.
+        # Only the soft limit moves, since an unprivileged process cannot raise a hard limit.
+        resource.setrlimit(resource.RLIMIT_CPU, (int(usage.ru_utime + usage.ru_stime) + cpu_seconds, cpu_hard_limit))
+        _reset_peak_rss()
+        start = time.perf_counter()
+        recycle = False
+        try:
+            df = _load_frame(frames, task["data_path"])
+            tables = {name: _load_frame(frames, path) for name, path in task["table_paths"].items()}
+            outcome = execute_generated_code(task["code"], task["intent"], df, tables)
+        except CPUTimeExceeded:
+            outcome = {"result": None, "error": f"Code execution exceeded the {cpu_seconds}s CPU time limit"}
+            recycle = True
+        except MemoryError:
+            outcome = {"result": None, "error": "Code execution exceeded the memory limit"}
+            recycle = True
+        except Exception as e:
+            outcome = {"result": None, "error": f"Code execution failed: {str(e)}"}
+        finally:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_hard_limit, cpu_hard_limit))
+
+        outcome.update({
+            "elapsed_seconds": round(time.perf_counter() - start, 4),
+            "peak_memory_bytes": _peak_rss_bytes(),
+            "worker_pid": os.getpid(),
+            "recycle": recycle
+        })
+        try:
+            conn.send(outcome)
+        except Exception as e:
+            conn.send({**outcome, "result": None, "error": f"Result could not be returned: {str(e)}"})
+        if recycle:
+            break
+
+
+class SandboxWorker:
+    """Handle on one pre-warmed worker process and the pipe used to talk to it."""
+
+    def __init__(self, context, cpu_seconds: int, memory_bytes: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, cpu_seconds, memory_bytes), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.tasks = 0
+
+    def wait_ready(self) -> bool:
+        """Wait for a freshly spawned worker to finish importing, outside the execution timeout."""
+        if not self.ready:
+            try:
+                self.ready = self.conn.poll(WORKER_STARTUP_SECONDS) and self.conn.recv() == "ready"
+            except (EOFError, OSError):
+                return False
+        return self.ready
+
+    def run(self, task: Dict[str, Any], timeout: float) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Send a task and wait for its outcome.
+
+        Returns:
+            tuple: The outcome (None if the worker died or timed out) and whether it timed out
+        """
+        self.tasks += 1
+        try:
+            if not self.wait_ready():
+                return None, False
+            self.conn.send(task)
+            if not self.conn.poll(timeout):
+                return None, True
+            return self.conn.recv(), False
+        except (EOFError, OSError, BrokenPipeError):
+            return None, False
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self, kill: bool = False) -> None:
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class SandboxPool:
+    """Pool of pre-warmed worker processes that run generated code in isolation.
+
+    Each worker runs under an address space limit and a per-execution CPU time limit;
+    executions that exceed the wall-clock timeout or either limit are killed and the
+    worker is replaced, so a runaway loop or merge never blocks the API process.
+    Datasets are handed over as Arrow IPC files (in /dev/shm when available) that
+    workers memory-map instead of receiving pickled copies.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        timeout_seconds: float = 30.0,
+        cpu_seconds: int = 30,
+        memory_bytes: int = 4 * 1024 * 1024 * 1024,
+        max_tasks_per_worker: int = 100,
+        data_dir: Optional[str] = None,
+        max_data_files: int = 16
+    ):
+        self.timeout_seconds = timeout_seconds
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_data_files = max_data_files
+        base_dir = data_dir or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+        self.data_dir = os.path.join(base_dir, f"zenith_sandbox_{os.getpid()}_{uuid.uuid4().hex[:8]}")
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[SandboxWorker]" = queue.Queue()
+        self._data_files: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sandbox")
+        self.executions = 0
+        self.timeouts = 0
+        self.limit_kills = 0
+        self.recycled = 0
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+        atexit.register(self.shutdown)
+
+    def _spawn(self) -> SandboxWorker:
+        return SandboxWorker(self._context, self.cpu_seconds, self.memory_bytes)
+
+    def publish(self, key: str, df: Union[pd.DataFrame, LazyDataset]) -> str:
+        """Write a DataFrame once as an Arrow IPC file for workers to map, returning its path.
+
+        A lazy dataset is read straight into Arrow, without building a DataFrame first.
+        """
+        with self._lock:
+            path = self._data_files.get(key)
+            if path is not None:
+                self._data_files.move_to_end(key)
+                return path
+
+        path = os.path.join(self.data_dir, f"{key}.arrow")
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        table = df.to_arrow() if isinstance(df, LazyDataset) else pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._data_files[key] = path
+            while len(self._data_files) > self.max_data_files:
+                # Workers that still map an evicted file keep their mapping
+                _, evicted = self._data_files.popitem(last=False)
+                if os.path.exists(evicted):
+                    os.remove(evicted)
+        return path
+
+    async def apublish(self, key: str, df: Union[pd.DataFrame, LazyDataset]) -> str:
+        """Async wrapper of publish that converts and writes the Arrow file off the event loop.
+
+        Uses the loop's default executor so publishing never queues behind running sandboxes.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.publish, key, df)
+
+    def execute(
+        self,
+        code: str,
+        intent: str,
+        data_path: str,
+        table_paths: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """Run generated code in a worker, blocking until it finishes, fails or times out.
+
+        Returns:
+            dict: result, error, elapsed_seconds, peak_memory_bytes and worker_pid
+        """
+        task = {"code": code, "intent": intent, "data_path": data_path, "table_paths": table_paths or {}}
+        worker = self._idle.get()
+        worker.wait_ready()
+        start = time.perf_counter()
+        outcome, timed_out = worker.run(task, self.timeout_seconds)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.executions += 1
+            if outcome is None:
+                if timed_out:
+                    self.timeouts += 1
+                    error = f"Code execution timed out after {self.timeout_seconds}s"
+                else:
+                    self.limit_kills += 1
+                    error = "Code execution was killed for exceeding its resource limits"
+            elif outcome.get("recycle"):
+                self.limit_kills += 1
+
+        if outcome is None:
+            logger.warning(f"Sandbox worker {worker.process.pid} failed: {error}, replacing it")
+            worker.stop(kill=True)
+            self._idle.put(self._spawn())
+            return {
+                "result": None,
+                "error": error,
+                "elapsed_seconds": round(elapsed, 4),
+                "peak_memory_bytes": None,
+                "worker_pid": worker.process.pid
+            }
+
+        if outcome.pop("recycle", False) or worker.tasks >= self.max_tasks_per_worker:
+            with self._lock:
+                self.recycled += 1
+            worker.stop(kill=not worker.alive())
+            worker = self._spawn()
+        self._idle.put(worker)
+        return outcome
+
+    async def aexecute(
+        self,
+        code: str,
+        intent: str,
+        data_path: str,
+        table_paths: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """Async wrapper of execute that waits on a sandbox thread, keeping the event loop free."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.execute, code, intent, data_path, table_paths)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "timeouts": self.timeouts,
+                "limit_kills": self.limit_kills,
+                "recycled": self.recycled,
+                "idle_workers": self._idle.qsize(),
+                "data_files": len(self._data_files)
+            }
+
+    def shutdown(self) -> None:
+        """Stop every idle worker and remove the published datasets."""
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+        self._executor.shutdown(wait=False)
+        shutil.rmtree(self.data_dir, ignore_errors=True)